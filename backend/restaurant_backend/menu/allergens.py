@@ -0,0 +1,103 @@
+"""
+Allergen taxonomy and bitmasks.
+
+``MenuItem.allergens`` stays free text for display; ``MenuItem.allergen_mask``
+holds the allergens it names as one bit each of the fixed ``ALLERGENS``
+taxonomy (the 14 EU-declared allergens), derived from the text on save. The
+bit positions are stored, so new allergens may only be appended.
+
+``?exclude_allergens=nuts,gluten`` on the menu endpoints drops every item
+whose mask shares a bit with the excluded ones: ``allergen_mask & mask = 0``
+in the database, the same test on rendered items for cached menus.
+"""
+import re
+
+from django.db.models import F
+
+ALLERGENS = (
+    'gluten', 'crustaceans', 'eggs', 'fish', 'peanuts', 'soy', 'milk',
+    'nuts', 'celery', 'mustard', 'sesame', 'sulphites', 'lupin', 'molluscs',
+)
+BITS = {name: 1 << index for index, name in enumerate(ALLERGENS)}
+
+# Other words for the taxonomy entries, as they turn up in menu texts.
+SYNONYMS = {
+    'wheat': 'gluten', 'barley': 'gluten', 'rye': 'gluten', 'oats': 'gluten', 'spelt': 'gluten',
+    'crustacean': 'crustaceans', 'shellfish': 'crustaceans', 'shrimp': 'crustaceans',
+    'prawn': 'crustaceans', 'prawns': 'crustaceans', 'crab': 'crustaceans', 'lobster': 'crustaceans',
+    'egg': 'eggs',
+    'peanut': 'peanuts', 'groundnut': 'peanuts', 'groundnuts': 'peanuts',
+    'soya': 'soy', 'soybean': 'soy', 'soybeans': 'soy',
+    'dairy': 'milk', 'lactose': 'milk', 'cheese': 'milk', 'butter': 'milk', 'cream': 'milk',
+    'nut': 'nuts', 'almond': 'nuts', 'almonds': 'nuts', 'hazelnut': 'nuts', 'hazelnuts': 'nuts',
+    'walnut': 'nuts', 'walnuts': 'nuts', 'cashew': 'nuts', 'cashews': 'nuts', 'pecan': 'nuts',
+    'pecans': 'nuts', 'pistachio': 'nuts', 'pistachios': 'nuts', 'macadamia': 'nuts',
+    'sesame seeds': 'sesame',
+    'sulphite': 'sulphites', 'sulfite': 'sulphites', 'sulfites': 'sulphites',
+    'sulphur dioxide': 'sulphites', 'sulfur dioxide': 'sulphites',
+    'lupine': 'lupin',
+    'mollusc': 'molluscs', 'mollusk': 'molluscs', 'mollusks': 'molluscs', 'mussels': 'molluscs',
+    'oysters': 'molluscs', 'squid': 'molluscs', 'clams': 'molluscs',
+}
+
+# Whole words only: "nutmeg" or "coconut" never match "nut". Hyphens split
+# words, so "nut-free" still reads as nuts, the safe side for an allergen filter.
+_words = re.compile(r'[a-z]+')
+
+
+def canonical(word):
+    word = ' '.join(word.lower().split())
+    return word if word in BITS else SYNONYMS.get(word)
+
+
+def parse(text):
+    """Mask of the allergens named in free ``text``; unrecognised words are ignored."""
+    words = _words.findall((text or '').lower())
+    mask = 0
+    for index, word in enumerate(words):
+        # Two-word names first ("sulphur dioxide"), then the word on its own.
+        for phrase in (' '.join(words[index:index + 2]), word):
+            name = canonical(phrase)
+            if name is not None:
+                mask |= BITS[name]
+                break
+    return mask
+
+
+def mask_of(names):
+    """Mask of taxonomy ``names`` (synonyms accepted); ``ValueError`` on anything else."""
+    mask = 0
+    for word in names:
+        name = canonical(word)
+        if name is None:
+            raise ValueError(f'Unknown allergen {word!r}; expected one of {", ".join(ALLERGENS)}')
+        mask |= BITS[name]
+    return mask
+
+
+def names(mask):
+    return [name for name in ALLERGENS if mask & BITS[name]]
+
+
+def excluded_mask(params):
+    """Mask of ``?exclude_allergens=`` (comma-separated names); ``ValueError`` if one is unknown."""
+    return mask_of(part for part in (params.get('exclude_allergens') or '').split(',') if part.strip())
+
+
+def exclude(queryset, mask):
+    """``queryset`` without items containing any allergen in ``mask``."""
+    if not mask:
+        return queryset
+    return queryset.alias(excluded_allergens=F('allergen_mask').bitand(mask)).filter(excluded_allergens=0)
+
+
+def is_free_of(item, mask):
+    """``exclude`` for a rendered item, which lists its ``allergen_codes``."""
+    return not mask or not mask_of(item['allergen_codes']) & mask
+
+
+def exclude_from_menu(menu, mask):
+    """Rendered ``menu`` without the items containing any allergen in ``mask``."""
+    if not mask:
+        return menu
+    return [dict(category, items=[item for item in category['items'] if is_free_of(item, mask)]) for category in menu]
@@ -0,0 +1,201 @@
+"""
+Versioned cache of the rendered public menu, one snapshot per restaurant.
+
+Snapshots live in a size-bounded in-process LRU and, when
+``MENU_CACHE['SHARED_CACHE_ALIAS']`` names a Django cache, in that shared tier
+as well. Each restaurant has a version token; every write to the restaurant,
+its categories or its items replaces the token (see ``menu.signals``), so a
+stale snapshot can never be served under the current version.
+
+Without a shared tier the versions are per process: an edit handled by one
+worker is invisible to the others. Their local entries then expire after
+``MENU_CACHE['LOCAL_TTL']`` seconds, which bounds how stale another worker's
+menu can get. Configure the shared tier for multi-worker deployments.
+"""
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from restaurant_backend.caching import LRUCache
+from restaurant_backend.images import variant_urls
+from restaurant_backend.routing import use_primary
+from .fieldsets import DEFAULT
+from .models import Category
+from .serializers import CategorySerializer
+
+_local = None
+_versions = {}
+
+
+def _settings():
+    return getattr(settings, 'MENU_CACHE', {})
+
+
+def _local_cache():
+    global _local
+    if _local is None:
+        _local = LRUCache(max_bytes=_settings().get('MAX_BYTES', 32 * 1024 * 1024))
+    return _local
+
+
+def _shared_cache():
+    alias = _settings().get('SHARED_CACHE_ALIAS')
+    return caches[alias] if alias else None
+
+
+def _local_ttl():
+    """Lifetime of local entries: unbounded when versions are shared, else ``LOCAL_TTL``."""
+    if _shared_cache() is not None:
+        return None
+    return _settings().get('LOCAL_TTL', 30)
+
+
+def _version_key(restaurant_id):
+    return f'menu:version:{restaurant_id}'
+
+
+def _snapshot_key(restaurant_id, version):
+    return f'menu:snapshot:{restaurant_id}:{version}'
+
+
+def get_version(restaurant_id):
+    shared = _shared_cache()
+    if shared is None:
+        return _versions.setdefault(restaurant_id, uuid.uuid4().hex)
+    key = _version_key(restaurant_id)
+    version = shared.get(key)
+    if version is None:
+        shared.add(key, uuid.uuid4().hex, None)
+        version = shared.get(key)
+    return version
+
+
+async def aget_version(restaurant_id):
+    shared = _shared_cache()
+    if shared is None:
+        return _versions.setdefault(restaurant_id, uuid.uuid4().hex)
+    key = _version_key(restaurant_id)
+    version = await shared.aget(key)
+    if version is None:
+        await shared.aadd(key, uuid.uuid4().hex, None)
+        version = await shared.aget(key)
+    return version
+
+
+def _bump_version(restaurant_id):
+    version = uuid.uuid4().hex
+    shared = _shared_cache()
+    if shared is None:
+        _versions[restaurant_id] = version
+    else:
+        shared.set(_version_key(restaurant_id), version, None)
+    _local_cache().delete_many(lambda key, value: key[0] == restaurant_id)
+
+
+def invalidate_menu(restaurant_id):
+    """Drop the snapshot now and again once the surrounding transaction commits.
+
+    The second bump discards anything cached by a concurrent request that read
+    the pre-commit rows in between.
+    """
+    _bump_version(restaurant_id)
+    transaction.on_commit(lambda: _bump_version(restaurant_id))
+
+
+def build_menu_snapshot(restaurant):
+    categories = Category.objects.filter(
+        restaurant=restaurant,
+        is_active=True
+    ).prefetch_related('items')
+
+    return {
+        'restaurant': {
+            'id': restaurant.id,
+            'name': restaurant.name,
+            'description': restaurant.description,
+            'logo': restaurant.logo.url if restaurant.logo else None,
+            'logo_variants': variant_urls(restaurant.logo_variants, restaurant.logo.storage),
+        },
+        # Every field, expandable ones included; views project per request.
+        'menu': CategorySerializer(categories, many=True, context={'fieldset': DEFAULT}).data,
+    }
+
+
+def get_menu_snapshot(restaurant):
+    """Return the rendered ``restaurant``/``menu`` payload, building it on a miss."""
+    version = get_version(restaurant.id)
+    local = _local_cache()
+    local_key = (restaurant.id, version)
+
+    snapshot = local.get(local_key)
+    if snapshot is not None:
+        return snapshot
+
+    shared = _shared_cache()
+    if shared is not None:
+        snapshot = shared.get(_snapshot_key(restaurant.id, version))
+
+    if snapshot is None:
+        # Never from a replica: a lagging one would cache pre-edit rows under the new version.
+        with use_primary():
+            snapshot = build_menu_snapshot(restaurant)
+        if shared is not None:
+            shared.set(
+                _snapshot_key(restaurant.id, version),
+                snapshot,
+                _settings().get('TIMEOUT', 3600)
+            )
+
+    size = len(json.dumps(snapshot, cls=JSONEncoder))
+    local.set(local_key, snapshot, size=size, ttl=_local_ttl())
+    return snapshot
+
+
+def _derived_key(restaurant_id, version, key):
+    return (restaurant_id, version) + tuple(key)
+
+
+def _encoded_key(restaurant_id, version, key):
+    return _derived_key(restaurant_id, version, ('encoded', *key))
+
+
+def get_derived(restaurant, key, build, size):
+    """Return ``build()`` cached under ``key`` for the current menu version.
+
+    For anything computed from the menu (encoded bodies, the search index);
+    like snapshots it is dropped whenever the menu changes. ``size(value)``
+    is its approximate size in bytes.
+    """
+    local = _local_cache()
+    local_key = _derived_key(restaurant.id, get_version(restaurant.id), key)
+    value = local.get(local_key)
+    if value is None:
+        value = build()
+        local.set(local_key, value, size=size(value), ttl=_local_ttl())
+    return value
+
+
+def get_encoded(restaurant, key, encode):
+    """Return bytes cached under ``key`` for the current menu version, calling ``encode()`` on a miss.
+
+    For fully rendered (and compressed) response bodies.
+    """
+    return get_derived(restaurant, ('encoded', *key), encode, size=len)
+
+
+async def aget_encoded(restaurant, key, encode):
+    """``get_encoded`` for async views; a miss is handled in a worker thread."""
+    body = _local_cache().get(_encoded_key(restaurant.id, await aget_version(restaurant.id), key))
+    if body is None:
+        body = await sync_to_async(get_encoded)(restaurant, key, encode)
+    return body
+
+
+def clear():
+    _versions.clear()
+    _local_cache().clear()
@@ -0,0 +1,83 @@
+"""
+Sparse fieldsets for menu items.
+
+``?fields=name,price,image_variants.thumb`` keeps only the listed item fields
+(``id`` always stays, a dotted name keeps one key of a nested object).
+Serializers render every field by default. The public menu is slim instead
+(``Fieldset(slim=True)``): it leaves out the heavier ``EXPANDABLE`` fields
+unless ``?expand=ingredients,allergens`` asks for them. Projection works on
+rendered dicts, so the cached menu snapshot (rendered once with every field)
+and the serializers share it.
+"""
+EXPANDABLE = ('ingredients', 'allergens')
+
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+class Fieldset:
+    def __init__(self, fields=None, expand=(), slim=False):
+        # None, or {field: None for the whole value | set of nested keys}.
+        self.fields = fields
+        self.expand = frozenset(expand)
+        self.slim = slim
+
+    @classmethod
+    def from_request(cls, request, slim=False):
+        params = getattr(request, 'query_params', request.GET)
+        fields = None
+        if params.get('fields'):
+            fields = {}
+            for name in _split(params['fields']):
+                top, _, nested = name.partition('.')
+                if not nested:
+                    fields[top] = None
+                elif fields.get(top, set()) is not None:
+                    fields[top] = fields.get(top, set()) | {nested}
+        return cls(fields, _split(params.get('expand')), slim)
+
+    @property
+    def key(self):
+        """Hashable identity, for caching projected output."""
+        fields = None if self.fields is None else tuple(sorted(
+            (name, None if nested is None else tuple(sorted(nested))) for name, nested in self.fields.items()
+        ))
+        return fields, tuple(sorted(self.expand)), self.slim
+
+    def project(self, item):
+        if self.fields is None:
+            if not self.slim:
+                return item
+            return {name: value for name, value in item.items() if name not in EXPANDABLE or name in self.expand}
+        projected = {}
+        for name, value in item.items():
+            if name != 'id' and name not in self.fields:
+                continue
+            nested = self.fields.get(name)
+            if nested and isinstance(value, dict):
+                value = {key: nested_value for key, nested_value in value.items() if key in nested}
+            projected[name] = value
+        return projected
+
+    def project_menu(self, menu):
+        return [dict(category, items=[self.project(item) for item in category['items']]) for category in menu]
+
+
+DEFAULT = Fieldset()
+
+
+class FieldsetSerializerMixin:
+    """Apply ``context['fieldset']`` (default: every field) to the output."""
+
+    def to_representation(self, instance):
+        return self.context.get('fieldset', DEFAULT).project(super().to_representation(instance))
+
+
+class FieldsetViewMixin:
+    """Take the serializer fieldset from ``?fields=``/``?expand=``."""
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = Fieldset.from_request(self.request)
+        return context
@@ -0,0 +1,49 @@
+# menu/management/commands/backfill_image_variants.py
+from django.core.management.base import BaseCommand
+
+from menu.cache import invalidate_menu
+from menu.models import MenuItem
+from restaurant_backend import images
+from restaurants.models import Restaurant
+from restaurants.resolver import invalidate_restaurant
+
+
+class Command(BaseCommand):
+    help = "Generate resized variants for menu item images and restaurant logos that lack up-to-date ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate variants even if they look current')
+        parser.add_argument('--retry-failed', action='store_true', help='Try again images that failed to render')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default IMAGE_VARIANTS_WORKERS)')
+        parser.add_argument('--restaurant', action='append', default=None, help='Restaurant id (repeatable); default all')
+
+    def handle(self, *args, **options):
+        targets = [
+            (MenuItem.objects.select_related(None), 'image', 'image_variants', 'restaurant_id'),
+            (Restaurant.objects.all(), 'logo', 'logo_variants', 'id'),
+        ]
+        touched = set()
+        with images.new_executor(options['workers']) as executor:
+            for queryset, field_name, variants_field, restaurant_attr in targets:
+                if options['restaurant']:
+                    queryset = queryset.filter(**{f'{restaurant_attr}__in': options['restaurant']})
+                queryset = queryset.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                stale = (
+                    instance for instance in queryset.iterator()
+                    if options['force'] or images.is_stale(instance, field_name, variants_field, options['retry_failed'])
+                )
+                done = failed = 0
+                for instance, recorded in images.generate_many(stale, field_name, variants_field, executor):
+                    if recorded:
+                        done += 1
+                        touched.add(getattr(instance, restaurant_attr))
+                    else:
+                        failed += 1
+                self.stdout.write(
+                    f"{queryset.model._meta.verbose_name_plural}: {done} updated, {failed} failed or changed meanwhile"
+                )
+
+        for restaurant_id in touched:
+            invalidate_restaurant(restaurant_id)
+            invalidate_menu(restaurant_id)
+        self.stdout.write(self.style.SUCCESS(f"Variants refreshed for {len(touched)} restaurants."))
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# PostgreSQL only (menu.search): a generated, GIN-indexed tsvector over the
+# searchable text, and a trigram index on names for typo-tolerant matches.
+# Other databases search an in-memory index instead. The column is not on the
+# model; the database maintains it.
+FORWARDS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE menu_menuitem ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(ingredients, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX menu_item_search_idx ON menu_menuitem USING gin (search_vector)",
+    "CREATE INDEX menu_item_name_trgm_idx ON menu_menuitem USING gin (name gin_trgm_ops)",
+]
+
+BACKWARDS = [
+    "DROP INDEX IF EXISTS menu_item_name_trgm_idx",
+    "DROP INDEX IF EXISTS menu_item_search_idx",
+    "ALTER TABLE menu_menuitem DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARDS), _run(BACKWARDS)),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:42
+
+import re
+
+from django.db import migrations, models
+
+# A frozen copy of menu.allergens as of this migration, so later changes to
+# the live taxonomy or parser never change what it does.
+ALLERGENS = (
+    'gluten', 'crustaceans', 'eggs', 'fish', 'peanuts', 'soy', 'milk',
+    'nuts', 'celery', 'mustard', 'sesame', 'sulphites', 'lupin', 'molluscs',
+)
+BITS = {name: 1 << index for index, name in enumerate(ALLERGENS)}
+
+# Other words for the taxonomy entries, as they turn up in menu texts.
+SYNONYMS = {
+    'wheat': 'gluten', 'barley': 'gluten', 'rye': 'gluten', 'oats': 'gluten', 'spelt': 'gluten',
+    'crustacean': 'crustaceans', 'shellfish': 'crustaceans', 'shrimp': 'crustaceans',
+    'prawn': 'crustaceans', 'prawns': 'crustaceans', 'crab': 'crustaceans', 'lobster': 'crustaceans',
+    'egg': 'eggs',
+    'peanut': 'peanuts', 'groundnut': 'peanuts', 'groundnuts': 'peanuts',
+    'soya': 'soy', 'soybean': 'soy', 'soybeans': 'soy',
+    'dairy': 'milk', 'lactose': 'milk', 'cheese': 'milk', 'butter': 'milk', 'cream': 'milk',
+    'nut': 'nuts', 'almond': 'nuts', 'almonds': 'nuts', 'hazelnut': 'nuts', 'hazelnuts': 'nuts',
+    'walnut': 'nuts', 'walnuts': 'nuts', 'cashew': 'nuts', 'cashews': 'nuts', 'pecan': 'nuts',
+    'pecans': 'nuts', 'pistachio': 'nuts', 'pistachios': 'nuts', 'macadamia': 'nuts',
+    'sesame seeds': 'sesame',
+    'sulphite': 'sulphites', 'sulfite': 'sulphites', 'sulfites': 'sulphites',
+    'sulphur dioxide': 'sulphites', 'sulfur dioxide': 'sulphites',
+    'lupine': 'lupin',
+    'mollusc': 'molluscs', 'mollusk': 'molluscs', 'mollusks': 'molluscs', 'mussels': 'molluscs',
+    'oysters': 'molluscs', 'squid': 'molluscs', 'clams': 'molluscs',
+}
+
+_words = re.compile(r'[a-z]+')
+
+
+def parse(text):
+    words = _words.findall((text or '').lower())
+    mask = 0
+    for index, word in enumerate(words):
+        for phrase in (' '.join(words[index:index + 2]), word):
+            name = phrase if phrase in BITS else SYNONYMS.get(phrase)
+            if name is not None:
+                mask |= BITS[name]
+                break
+    return mask
+
+
+def parse_existing_allergens(apps, schema_editor):
+    MenuItem = apps.get_model('menu', 'MenuItem')
+    items = MenuItem.objects.exclude(allergens='').only('id', 'allergens')
+    batch = []
+    for item in items.iterator(chunk_size=1000):
+        item.allergen_mask = parse(item.allergens)
+        if item.allergen_mask:
+            batch.append(item)
+        if len(batch) >= 1000:
+            MenuItem.objects.bulk_update(batch, ['allergen_mask'])
+            batch = []
+    MenuItem.objects.bulk_update(batch, ['allergen_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_menu_search_index'),
+        ('restaurants', '0002_logo_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='allergen_mask',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['restaurant', 'is_available', 'allergen_mask'], name='menu_item_allergens_idx'),
+        ),
+        migrations.RunPython(parse_existing_allergens, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
-from django.db import models
 from restaurants.models import Restaurant
+from .allergens import parse as parse_allergens
 import uuid
 
 class Category(models.Model):
@@ -20,6 +20,7 @@ class Category(models.Model):
         return f"{self.restaurant.name} - {self.name}"
 
 class MenuItem(models.Model):
+    # On PostgreSQL the table also has a generated ``search_vector`` column (menu.search).
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='menu_items')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='items')
@@ -27,8 +28,12 @@ class MenuItem(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='menu_items/', blank=True, null=True)
+    # Resized copies of ``image`` (restaurant_backend.images), filled in after upload.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     ingredients = models.TextField(blank=True)
     allergens = models.TextField(blank=True)
+    # One bit per entry of menu.allergens.ALLERGENS named in ``allergens``; set on save.
+    allergen_mask = models.PositiveIntegerField(default=0, editable=False)
     is_available = models.BooleanField(default=True)
     is_vegetarian = models.BooleanField(default=False)
     is_vegan = models.BooleanField(default=False)
@@ -39,6 +44,17 @@ class MenuItem(models.Model):
 
     class Meta:
         ordering = ['category__order_index', 'order_index', 'name']
+        indexes = [
+            # ?exclude_allergens= tests the mask on the index entries of a restaurant's items.
+            models.Index(fields=['restaurant', 'is_available', 'allergen_mask'], name='menu_item_allergens_idx'),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.name}"
+
+    def save(self, *args, **kwargs):
+        self.allergen_mask = parse_allergens(self.allergens)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'allergens' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'allergen_mask'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,333 @@
+"""
+Ranked, faceted search over a restaurant's public menu.
+
+``search`` matches every word of the query, by prefix, against item names,
+descriptions and ingredients (in that order of weight), filters on the
+vegetarian/vegan flags, categories and a price range, and counts each facet
+over the matches with every *other* filter applied, so a selected facet still
+shows its alternatives. Only available items in active categories are found,
+as on the menu itself.
+
+On PostgreSQL the ``menu_menuitem.search_vector`` column (migration 0003) is
+a generated ``tsvector`` behind a GIN index, so the database keeps it current
+on every write; names that are trigram-similar to the query (``pg_trgm``, also
+GIN-indexed) match too, which catches typos. Elsewhere, e.g. SQLite test runs,
+an inverted index is built from the cached menu snapshot and cached next to
+it, so like the snapshot it is rebuilt after any menu write.
+"""
+import bisect
+import difflib
+import re
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Count, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from . import allergens
+from . import cache as menu_cache
+from .fieldsets import DEFAULT
+from .models import MenuItem
+from .serializers import MenuItemSerializer
+
+# Field weights; ts_rank's defaults for the A/B/C labels of the tsvector.
+WEIGHTS = (('name', 1.0), ('description', 0.4), ('ingredients', 0.2))
+# Below this difflib ratio a word is not taken as a misspelling (pg_trgm's default threshold is 0.3).
+FUZZY_CUTOFF = 0.75
+FUZZY_PENALTY = 0.5
+
+_word = re.compile(r'\w+')
+
+
+def _settings():
+    return getattr(settings, 'MENU_SEARCH', {})
+
+
+def tokenize(text):
+    return _word.findall((text or '').lower())
+
+
+def backend():
+    configured = _settings().get('BACKEND', 'auto')
+    if configured == 'auto':
+        return 'database' if connection.vendor == 'postgresql' else 'memory'
+    return configured
+
+
+def price_buckets():
+    """``(low, high)`` ranges between the configured edges; open-ended at both ends."""
+    edges = sorted(Decimal(str(edge)) for edge in _settings().get('PRICE_BUCKETS', (10, 20, 30)))
+    return list(zip([None, *edges], [*edges, None]))
+
+
+def _parse_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f'Expected true or false, got {value!r}')
+
+
+def _parse_price(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'Invalid price {value!r}') from None
+
+
+class SearchFilters:
+    """Facet filters from ``?vegetarian=``, ``?vegan=``, ``?category=`` (ids, comma-separated),
+    ``?min_price=`` and ``?max_price=``, plus ``?exclude_allergens=`` (not a facet).
+    Unparseable values raise ``ValueError``."""
+
+    def __init__(self, is_vegetarian=None, is_vegan=None, categories=(), min_price=None, max_price=None,
+                 excluded_allergens=0):
+        self.is_vegetarian = is_vegetarian
+        self.is_vegan = is_vegan
+        self.categories = frozenset(str(category) for category in categories)
+        self.min_price = min_price
+        self.max_price = max_price
+        self.excluded_allergens = excluded_allergens
+
+    @classmethod
+    def from_params(cls, params):
+        def get(name, parse):
+            value = params.get(name)
+            return parse(value) if value else None
+
+        categories = []
+        for value in (params.get('category') or '').split(','):
+            if value.strip():
+                try:
+                    categories.append(uuid.UUID(value.strip()))
+                except ValueError:
+                    raise ValueError(f'Invalid category {value.strip()!r}') from None
+        return cls(
+            is_vegetarian=get('vegetarian', _parse_bool),
+            is_vegan=get('vegan', _parse_bool),
+            categories=categories,
+            min_price=get('min_price', _parse_price),
+            max_price=get('max_price', _parse_price),
+            excluded_allergens=allergens.excluded_mask(params),
+        )
+
+    def q(self, exclude=None):
+        """The filters as a ``Q``, leaving out facet ``exclude``."""
+        q = Q()
+        for flag in ('is_vegetarian', 'is_vegan'):
+            if exclude != flag and getattr(self, flag) is not None:
+                q &= Q(**{flag: getattr(self, flag)})
+        if exclude != 'category' and self.categories:
+            q &= Q(category_id__in=self.categories)
+        if exclude != 'price':
+            if self.min_price is not None:
+                q &= Q(price__gte=self.min_price)
+            if self.max_price is not None:
+                q &= Q(price__lte=self.max_price)
+        return q
+
+    def matches(self, item, exclude=None):
+        """``q`` for a rendered item (see ``MemoryIndex``)."""
+        for flag in ('is_vegetarian', 'is_vegan'):
+            if exclude != flag and getattr(self, flag) is not None and item[flag] != getattr(self, flag):
+                return False
+        if exclude != 'category' and self.categories and str(item['category']) not in self.categories:
+            return False
+        if exclude != 'price':
+            price = Decimal(item['price'])
+            if self.min_price is not None and price < self.min_price:
+                return False
+            if self.max_price is not None and price > self.max_price:
+                return False
+        return True
+
+
+def _in_bucket(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def _bucket(low, high, count):
+    return {
+        'min': None if low is None else str(low),
+        'max': None if high is None else str(high),
+        'count': count,
+    }
+
+
+def _count(q):
+    # An empty Q is not a valid aggregate filter.
+    return Count('pk', filter=q) if q else Count('pk')
+
+
+def _database_search(restaurant, query, filters, limit, offset, fieldset):
+    items = allergens.exclude(
+        MenuItem.objects.filter(restaurant=restaurant, is_available=True, category__is_active=True),
+        filters.excluded_allergens,
+    )
+    rank = None
+    terms = tokenize(query)
+    if terms:
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        phrase = ' '.join(terms)
+        items = items.filter(RawSQL(
+            "menu_menuitem.search_vector @@ to_tsquery('simple', %s) OR menu_menuitem.name %% %s",
+            (tsquery, phrase), output_field=BooleanField(),
+        ))
+        rank = RawSQL(
+            "ts_rank_cd(menu_menuitem.search_vector, to_tsquery('simple', %s)) + similarity(menu_menuitem.name, %s)",
+            (tsquery, phrase), output_field=FloatField(),
+        )
+    # Default ordering (menu order) without a query.
+    page = items.filter(filters.q())
+    if rank is not None:
+        page = page.annotate(rank=rank).order_by('-rank', *MenuItem._meta.ordering)
+
+    buckets = price_buckets()
+    aggregates = {'total': _count(filters.q())}
+    for flag in ('is_vegetarian', 'is_vegan'):
+        for value in (True, False):
+            aggregates[f'{flag}_{value}'] = _count(Q(**{flag: value}) & filters.q(exclude=flag))
+    for index, (low, high) in enumerate(buckets):
+        aggregates[f'price_{index}'] = _count(_in_bucket(low, high) & filters.q(exclude='price'))
+    counts = items.aggregate(**aggregates)
+
+    categories = (
+        items.filter(filters.q(exclude='category'))
+        .values('category_id', 'category__name')
+        .annotate(count=Count('pk'))
+        .order_by('category__order_index', 'category__name')
+    )
+
+    return {
+        'count': counts['total'],
+        'results': MenuItemSerializer(page[offset:offset + limit], many=True, context={'fieldset': fieldset}).data,
+        'facets': {
+            **{
+                flag: {'true': counts[f'{flag}_True'], 'false': counts[f'{flag}_False']}
+                for flag in ('is_vegetarian', 'is_vegan')
+            },
+            'category': [
+                {'id': str(row['category_id']), 'name': row['category__name'], 'count': row['count']}
+                for row in categories
+            ],
+            'price': [_bucket(low, high, counts[f'price_{index}']) for index, (low, high) in enumerate(buckets)],
+        },
+    }
+
+
+class MemoryIndex:
+    """Inverted index over the rendered items of a menu snapshot."""
+
+    def __init__(self, menu):
+        self.items = []
+        self.category_names = {}
+        self.postings = {}
+        self.size = 0
+        for category in menu:
+            self.category_names[str(category['id'])] = category['name']
+            for item in category['items']:
+                if not item['is_available']:
+                    continue
+                position = len(self.items)
+                self.items.append(item)
+                for field, weight in WEIGHTS:
+                    text = item.get(field) or ''
+                    self.size += len(text)
+                    for token in tokenize(text):
+                        postings = self.postings.setdefault(token, {})
+                        postings[position] = max(postings.get(position, 0), weight)
+        self.vocabulary = sorted(self.postings)
+        self.size += 64 * len(self.items) + sum(32 + 16 * len(postings) for postings in self.postings.values())
+
+    def _term_scores(self, term):
+        """Best weight per item among the words starting with ``term``, or close to it."""
+        scores = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            for position, weight in self.postings[token].items():
+                scores[position] = max(scores.get(position, 0), weight)
+        if scores:
+            return scores
+        for token in difflib.get_close_matches(term, self.vocabulary, n=3, cutoff=FUZZY_CUTOFF):
+            for position, weight in self.postings[token].items():
+                scores[position] = max(scores.get(position, 0), weight * FUZZY_PENALTY)
+        return scores
+
+    def match(self, query):
+        """``[(position, score)]`` of the items matching every term, best first, menu order otherwise."""
+        terms = tokenize(query)
+        if not terms:
+            return [(position, 0) for position in range(len(self.items))]
+        totals = None
+        for term in terms:
+            scores = self._term_scores(term)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {position: totals[position] + score for position, score in scores.items() if position in totals}
+            if not totals:
+                return []
+        return sorted(totals.items(), key=lambda entry: (-entry[1], entry[0]))
+
+    def search(self, query, filters, limit, offset, fieldset):
+        matched = [
+            self.items[position] for position, _ in self.match(query)
+            if allergens.is_free_of(self.items[position], filters.excluded_allergens)
+        ]
+        results = [item for item in matched if filters.matches(item)]
+
+        facets = {}
+        for flag in ('is_vegetarian', 'is_vegan'):
+            values = [item[flag] for item in matched if filters.matches(item, exclude=flag)]
+            facets[flag] = {'true': values.count(True), 'false': values.count(False)}
+
+        category_counts = {}
+        for item in matched:
+            if filters.matches(item, exclude='category'):
+                category = str(item['category'])
+                category_counts[category] = category_counts.get(category, 0) + 1
+        # category_names is in menu order.
+        facets['category'] = [
+            {'id': category, 'name': name, 'count': category_counts[category]}
+            for category, name in self.category_names.items() if category in category_counts
+        ]
+
+        prices = [Decimal(item['price']) for item in matched if filters.matches(item, exclude='price')]
+        facets['price'] = [
+            _bucket(low, high, sum(
+                1 for price in prices if (low is None or price >= low) and (high is None or price < high)
+            ))
+            for low, high in price_buckets()
+        ]
+
+        return {
+            'count': len(results),
+            'results': [fieldset.project(item) for item in results[offset:offset + limit]],
+            'facets': facets,
+        }
+
+
+def memory_index(restaurant):
+    snapshot = menu_cache.get_menu_snapshot(restaurant)
+    return menu_cache.get_derived(
+        restaurant, ('search',), lambda: MemoryIndex(snapshot['menu']), size=lambda index: index.size
+    )
+
+
+def search(restaurant, query='', filters=None, limit=20, offset=0, fieldset=None):
+    """``{'count', 'results', 'facets'}`` for ``query`` on ``restaurant``'s menu."""
+    filters = filters or SearchFilters()
+    fieldset = fieldset or DEFAULT
+    if backend() == 'database':
+        return _database_search(restaurant, query, filters, limit, offset, fieldset)
+    return memory_index(restaurant).search(query, filters, limit, offset, fieldset)
@@ -1,11 +1,24 @@
 from rest_framework import serializers
+from restaurant_backend.images import variant_urls
+from .allergens import names as allergen_names
+from .fieldsets import FieldsetSerializerMixin
 from .models import Category, MenuItem
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+    # The allergens named in the text, from the fixed taxonomy (menu.allergens).
+    allergen_codes = serializers.SerializerMethodField()
+
     class Meta:
         model = MenuItem
-        fields = ['id', 'name', 'description', 'price', 'image', 'category', 'is_available', 
-                 'is_vegetarian', 'is_vegan', 'preparation_time']
+        fields = ['id', 'name', 'description', 'price', 'image', 'image_variants', 'category', 'is_available', 
+                 'is_vegetarian', 'is_vegan', 'preparation_time', 'ingredients', 'allergens', 'allergen_codes']
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants, obj.image.storage, self.context.get('request'))
+
+    def get_allergen_codes(self, obj):
+        return allergen_names(obj.allergen_mask)
 
 class CategorySerializer(serializers.ModelSerializer):
     items = MenuItemSerializer(many=True, read_only=True)
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from restaurant_backend import images
+from restaurants.models import Restaurant, Table
+from restaurants.resolver import invalidate_restaurant
+from .cache import invalidate_menu
+from .models import Category, MenuItem
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def restaurant_changed(sender, instance, **kwargs):
+    invalidate_menu(instance.id)
+
+
+@receiver(post_save, sender=Restaurant)
+def restaurant_logo_changed(sender, instance, **kwargs):
+    def variants_saved():
+        # Recorded with update(), so no post_save: drop the cached restaurant too.
+        invalidate_restaurant(instance.id)
+        invalidate_menu(instance.id)
+    images.schedule(instance, 'logo', 'logo_variants', on_update=variants_saved)
+
+
+@receiver(post_save, sender=MenuItem)
+def menu_item_image_changed(sender, instance, **kwargs):
+    images.schedule(instance, 'image', 'image_variants', on_update=lambda: invalidate_menu(instance.restaurant_id))
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=MenuItem)
+def menu_changed(sender, instance, **kwargs):
+    invalidate_menu(instance.restaurant_id)
+
+
+@receiver([post_save, post_delete], sender=Table)
+def table_changed(sender, instance, **kwargs):
+    # Encoded menu bodies embed the table, so a table edit drops them with the menu version.
+    invalidate_menu(instance.restaurant_id)
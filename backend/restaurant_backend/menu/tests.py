@@ -1,3 +1,437 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+
+from restaurant_backend import renderers
+from restaurant_backend.instrumentation import QueryBudgetTestMixin
+from restaurants import resolver
+from restaurants.models import Restaurant, Table
+from .models import Category, MenuItem
+from . import allergens
+from . import cache as menu_cache
+from . import views
+
+
+class MenuFixtureMixin:
+    def setUp(self):
+        menu_cache.clear()
+        resolver.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.restaurant = Restaurant.objects.create(
+            owner=self.owner, name='Demo', address='Main St', phone='000', email='demo@example.com'
+        )
+        self.table = Table.objects.create(restaurant=self.restaurant, table_number='1', capacity=4)
+        self.category = Category.objects.create(restaurant=self.restaurant, name='Pizza')
+        self.item = MenuItem.objects.create(
+            restaurant=self.restaurant, category=self.category, name='Margherita',
+            description='Tomato, mozzarella', price=Decimal('12.50'), preparation_time=15
+        )
+        self.menu_url = reverse('menu-by-qr', args=[self.table.qr_code])
+
+
+class MenuSnapshotCacheTests(MenuFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def test_cold_menu_within_budget(self):
+        self.assertWithinQueryBudget(self.client.get(self.menu_url))
+
+    def test_second_request_served_from_snapshot(self):
+        first = self.client.get(self.menu_url)
+        self.assertEqual(first.status_code, 200)
+
+        # Table and menu both come from cache on a repeat scan.
+        with self.assertNumQueries(0):
+            second = self.client.get(self.menu_url)
+        self.assertEqual(first.json(), second.json())
+
+    def test_item_change_invalidates_snapshot(self):
+        self.client.get(self.menu_url)
+        self.item.price = Decimal('13.00')
+        self.item.save()
+
+        data = self.client.get(self.menu_url).json()
+        self.assertEqual(data['menu'][0]['items'][0]['price'], '13.00')
+
+    def test_deactivated_category_disappears(self):
+        self.client.get(self.menu_url)
+        self.category.is_active = False
+        self.category.save()
+
+        self.assertEqual(self.client.get(self.menu_url).json()['menu'], [])
+
+    def test_restaurant_change_invalidates_snapshot(self):
+        self.client.get(self.menu_url)
+        self.restaurant.name = 'Renamed'
+        self.restaurant.save()
+
+        self.assertEqual(self.client.get(self.menu_url).json()['restaurant']['name'], 'Renamed')
+
+    def test_table_change_invalidates_encoded_menu(self):
+        self.client.get(self.menu_url)
+        self.table.table_number = '99'
+        self.table.save()
+
+        self.assertEqual(self.client.get(self.menu_url).json()['table']['table_number'], '99')
+        self.assertEqual(
+            self.client.get(reverse('table-by-qr', args=[self.table.qr_code])).json()['table']['table_number'], '99'
+        )
+
+    def test_local_snapshot_expires_without_shared_versions(self):
+        self.client.get(self.menu_url)
+        # An edit made by another worker: no signal reaches this process.
+        MenuItem.objects.filter(id=self.item.id).update(price=Decimal('14.00'))
+        self.assertEqual(self.client.get(self.menu_url).json()['menu'][0]['items'][0]['price'], '12.50')
+
+        later = time.monotonic() + 31
+        with mock.patch('restaurant_backend.caching.time.monotonic', return_value=later):
+            data = self.client.get(self.menu_url).json()
+        self.assertEqual(data['menu'][0]['items'][0]['price'], '14.00')
+
+    @override_settings(MENU_CACHE={'MAX_BYTES': 10})
+    def test_oversized_snapshot_is_not_kept(self):
+        menu_cache._local = None
+        try:
+            self.client.get(self.menu_url)
+            self.assertEqual(len(menu_cache._local_cache()), 0)
+        finally:
+            menu_cache._local = None
+
+
+class MenuPayloadTests(MenuFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item.ingredients = 'Tomato, mozzarella, basil'
+        self.item.allergens = 'Milk, gluten'
+        self.item.save()
+
+    def test_heavy_fields_only_when_expanded(self):
+        item = self.client.get(self.menu_url).json()['menu'][0]['items'][0]
+        self.assertNotIn('ingredients', item)
+        self.assertIn('description', item)
+
+        item = self.client.get(self.menu_url, {'expand': 'ingredients'}).json()['menu'][0]['items'][0]
+        self.assertEqual(item['ingredients'], 'Tomato, mozzarella, basil')
+        self.assertNotIn('allergens', item)
+
+    def test_sparse_fields(self):
+        variants = {'source': 'x.jpg', 'thumb': {'width': 1, 'height': 1, 'webp': 'a.webp', 'jpeg': 'a.jpg'}}
+        MenuItem.objects.filter(pk=self.item.pk).update(image_variants=variants)
+        menu_cache.clear()
+
+        data = self.client.get(self.menu_url, {'fields': 'name,price,image_variants.thumb'}).json()
+        item = data['menu'][0]['items'][0]
+        self.assertEqual(set(item), {'id', 'name', 'price', 'image_variants'})
+        self.assertEqual(set(item['image_variants']), {'thumb'})
+        self.assertEqual(data['restaurant']['name'], 'Demo')
+
+    def test_precompressed_bodies(self):
+        plain = self.client.get(self.menu_url).content
+        response = self.client.get(self.menu_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain)
+
+        # The compressed body is cached alongside the snapshot.
+        with self.assertNumQueries(0):
+            again = self.client.get(self.menu_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(again.content, response.content)
+
+        self.assertFalse(self.client.get(self.menu_url, HTTP_ACCEPT_ENCODING='gzip;q=0').has_header('Content-Encoding'))
+
+    def test_cached_bodies_follow_menu_changes(self):
+        self.client.get(self.menu_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.item.name = 'Marinara'
+        self.item.save()
+
+        body = gzip.decompress(self.client.get(self.menu_url, HTTP_ACCEPT_ENCODING='gzip').content)
+        self.assertEqual(json.loads(body)['menu'][0]['items'][0]['name'], 'Marinara')
+
+    @unittest.skipUnless(renderers.brotli, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        response = self.client.get(self.menu_url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(renderers.brotli.decompress(response.content), self.client.get(self.menu_url).content)
+
+    @unittest.skipUnless(renderers.msgpack, 'msgpack is not installed')
+    def test_msgpack(self):
+        response = self.client.get(self.menu_url, {'fields': 'name,price'}, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        data = renderers.msgpack.unpackb(response.content)
+        self.assertEqual(data['menu'][0]['items'][0], {'id': str(self.item.id), 'name': 'Margherita', 'price': '12.50'})
+
+    def test_async_view_matches_sync_view(self):
+        factory = APIRequestFactory()
+        async_view = views.MenuByQRView.as_view()
+        for params, headers in (({}, {}), ({'fields': 'name'}, {'HTTP_ACCEPT_ENCODING': 'gzip'})):
+            expected = views.get_menu_by_qr(factory.get('/', params, **headers), qr_code=self.table.qr_code)
+            response = async_to_sync(async_view)(factory.get('/', params, **headers), qr_code=self.table.qr_code)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response.get('Content-Encoding'), expected.get('Content-Encoding'))
+
+        # Browsable API responses still go through the renderer.
+        html = async_to_sync(AsyncClient().get)(self.menu_url, HTTP_ACCEPT='text/html')
+        self.assertContains(html, 'Margherita')
+
+    def test_item_list_honours_fieldset(self):
+        self.client.force_authenticate(self.owner)
+        url = reverse('menuitem-list', args=[self.restaurant.id])
+        data = self.client.get(url, {'fields': 'name', 'expand': 'allergens'}).json()
+        items = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(items[0], {'id': str(self.item.id), 'name': 'Margherita'})
+
+    def test_owner_endpoints_render_every_field_by_default(self):
+        self.client.force_authenticate(self.owner)
+        url = reverse('menuitem-list', args=[self.restaurant.id])
+        data = self.client.get(url).json()
+        item = (data['results'] if isinstance(data, dict) else data)[0]
+        self.assertEqual(item['ingredients'], 'Tomato, mozzarella, basil')
+        self.assertEqual(item['allergens'], 'Milk, gluten')
+
+        created = self.client.post(url, {
+            'name': 'Marinara', 'description': 'Tomato, garlic, oregano', 'price': '9.00',
+            'category': str(self.category.id), 'preparation_time': 10,
+            'ingredients': 'Tomato, garlic', 'allergens': 'Gluten',
+        }).json()
+        self.assertEqual(created['ingredients'], 'Tomato, garlic')
+        self.assertEqual(created['allergens'], 'Gluten')
+
+
+class MenuSearchTests(MenuFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item.ingredients = 'tomato, mozzarella, basil'
+        self.item.is_vegetarian = True
+        self.item.save()
+        self.salads = Category.objects.create(restaurant=self.restaurant, name='Salads', order_index=1)
+        self.soup = MenuItem.objects.create(
+            restaurant=self.restaurant, category=self.salads, name='Tomato Soup', description='Roasted',
+            price=Decimal('7.00'), preparation_time=5, is_vegetarian=True, is_vegan=True,
+        )
+        self.salad = MenuItem.objects.create(
+            restaurant=self.restaurant, category=self.salads, name='Caesar Salad', description='Anchovy dressing',
+            ingredients='romaine, parmesan', price=Decimal('24.00'), preparation_time=5,
+        )
+        MenuItem.objects.create(
+            restaurant=self.restaurant, category=self.salads, name='Tomato Tart', description='Sold out',
+            price=Decimal('9.00'), preparation_time=5, is_available=False,
+        )
+        self.url = reverse('menu-search', args=[self.restaurant.id])
+
+    def names(self, response):
+        return [item['name'] for item in response.json()['results']]
+
+    def test_ranked_prefix_and_fuzzy_matches(self):
+        response = self.client.get(self.url, {'q': 'tomato'})
+        self.assertWithinQueryBudget(response)
+        # Name matches outrank description/ingredient ones; unavailable items are left out.
+        self.assertEqual(self.names(response), ['Tomato Soup', 'Margherita'])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'marg'})), ['Margherita'])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'margarita'})), ['Margherita'])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'tomato roasted'})), ['Tomato Soup'])
+
+    def test_facets_count_without_their_own_filter(self):
+        data = self.client.get(self.url, {'vegan': 'true', 'max_price': '20'}).json()
+        self.assertEqual([item['name'] for item in data['results']], ['Tomato Soup'])
+        self.assertEqual(data['facets']['is_vegan'], {'true': 1, 'false': 1})
+        self.assertEqual(data['facets']['is_vegetarian'], {'true': 1, 'false': 0})
+        self.assertEqual(data['facets']['category'], [{'id': str(self.salads.id), 'name': 'Salads', 'count': 1}])
+        self.assertEqual([bucket['count'] for bucket in data['facets']['price']], [1, 0, 0, 0])
+
+    def test_index_follows_menu_writes(self):
+        self.client.get(self.url, {'q': 'caesar'})
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {'q': 'caesar'})
+
+        self.salad.name = 'Greek Salad'
+        self.salad.save()
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'caesar'})), [])
+        self.assertEqual(self.names(self.client.get(self.url, {'q': 'greek'})), ['Greek Salad'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'vegan': 'maybe'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'category': 'pizza'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('menu-search', args=[self.table.qr_code])).status_code, 404)
+
+    def test_database_backend_matches_memory_backend(self):
+        # Without a query the database backend runs no PostgreSQL-only SQL.
+        params = {'vegetarian': 'true', 'category': f'{self.category.id},{self.salads.id}', 'fields': 'name'}
+        memory = self.client.get(self.url, params).json()
+        with override_settings(MENU_SEARCH={'BACKEND': 'database', 'PRICE_BUCKETS': [10, 20, 30]}):
+            database = self.client.get(self.url, params).json()
+        self.assertEqual(database, memory)
+        self.assertEqual(memory['count'], 2)
+
+
+class AllergenTests(MenuFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item.allergens = 'Milk, gluten'
+        self.item.save()
+        self.salad = MenuItem.objects.create(
+            restaurant=self.restaurant, category=self.category, name='Nut Salad', description='Crunchy',
+            allergens='May contain tree nuts and sesame seeds', price=Decimal('9.00'), preparation_time=5,
+        )
+
+    def test_mask_derived_from_text(self):
+        self.assertEqual(allergens.names(self.item.allergen_mask), ['gluten', 'milk'])
+        self.assertEqual(allergens.names(self.salad.allergen_mask), ['nuts', 'sesame'])
+
+        self.salad.allergens = 'Shrimp'
+        self.salad.save(update_fields=['allergens'])
+        self.salad.refresh_from_db()
+        self.assertEqual(allergens.names(self.salad.allergen_mask), ['crustaceans'])
+
+    def test_parser_matches_whole_words(self):
+        self.assertEqual(allergens.parse('Nutmeg, coconut and doughnut glaze; eggplant'), 0)
+        self.assertEqual(
+            allergens.names(allergens.parse('Contains: milk (skimmed), nut-free? No. Sulphur dioxide.')),
+            ['milk', 'nuts', 'sulphites'],
+        )
+
+    def test_migration_parses_existing_text(self):
+        from django.apps import apps
+        migration = import_module('menu.migrations.0004_allergen_mask')
+
+        MenuItem.objects.update(allergen_mask=0)
+        migration.parse_existing_allergens(apps, None)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.allergen_mask, allergens.BITS['milk'] | allergens.BITS['gluten'])
+
+    def test_menu_excludes_allergens(self):
+        names = lambda data: [item['name'] for item in data['menu'][0]['items']]
+        self.assertEqual(names(self.client.get(self.menu_url).json()), ['Margherita', 'Nut Salad'])
+
+        data = self.client.get(self.menu_url, {'exclude_allergens': 'nuts'}).json()
+        self.assertEqual(names(data), ['Margherita'])
+        self.assertEqual(data['menu'][0]['items'][0]['allergen_codes'], ['gluten', 'milk'])
+        self.assertEqual(names(self.client.get(self.menu_url, {'exclude_allergens': 'dairy,sesame'}).json()), [])
+        self.assertEqual(self.client.get(self.menu_url, {'exclude_allergens': 'kale'}).status_code, 400)
+
+    def test_item_list_filters_in_the_database(self):
+        self.client.force_authenticate(self.owner)
+        url = reverse('menuitem-list', args=[self.restaurant.id])
+        data = self.client.get(url, {'exclude_allergens': 'gluten', 'fields': 'name'}).json()
+        items = data['results'] if isinstance(data, dict) else data
+        self.assertEqual([item['name'] for item in items], ['Nut Salad'])
+        self.assertEqual(self.client.get(url, {'exclude_allergens': 'kale'}).status_code, 400)
+
+    def test_search_excludes_allergens(self):
+        url = reverse('menu-search', args=[self.restaurant.id])
+        data = self.client.get(url, {'exclude_allergens': 'milk'}).json()
+        self.assertEqual([item['name'] for item in data['results']], ['Nut Salad'])
+        with override_settings(MENU_SEARCH={'BACKEND': 'database'}):
+            self.assertEqual(self.client.get(url, {'exclude_allergens': 'milk'}).json()['count'], 1)
+
+def _photo(size=(300, 200), color=(200, 40, 40)):
+    from PIL import Image
+
+    out = BytesIO()
+    Image.new('RGB', size, color).save(out, 'JPEG')
+    return SimpleUploadedFile('photo.jpg', out.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(IMAGE_VARIANTS={'SIZES': {'thumb': 32, 'card': 64}, 'QUALITY': 70, 'WORKERS': 0})
+class ImageVariantTests(MenuFixtureMixin, TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        super().setUp()
+
+    def test_upload_generates_variants_and_refreshes_menu(self):
+        self.client.get(self.menu_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.image = _photo()
+            self.item.save()
+
+        self.item.refresh_from_db()
+        variants = self.item.image_variants
+        self.assertEqual(variants['source'], self.item.image.name)
+        self.assertEqual((variants['thumb']['width'], variants['thumb']['height']), (32, 21))
+        self.assertTrue(self.item.image.storage.exists(variants['card']['webp']))
+        self.assertIn('-card.webp', variants['card']['webp'])
+
+        served = self.client.get(self.menu_url).json()['menu'][0]['items'][0]['image_variants']
+        self.assertEqual(set(served), {'thumb', 'card'})
+        self.assertTrue(served['card']['jpeg'].endswith(variants['card']['jpeg']))
+
+    def test_same_content_reuses_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.image = _photo()
+            self.item.save()
+        first = MenuItem.objects.get(id=self.item.id).image_variants
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.image = _photo()
+            self.item.save()
+        second = MenuItem.objects.get(id=self.item.id).image_variants
+
+        self.assertNotEqual(first['source'], second['source'])
+        self.assertEqual(first['card'], second['card'])
+
+    def test_replaced_image_deletes_unshared_variant_files(self):
+        twin = MenuItem.objects.create(
+            restaurant=self.restaurant, category=self.category, name='Marinara',
+            description='', price=Decimal('9.00'), preparation_time=10
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.image = _photo()
+            self.item.save()
+            twin.image = _photo()
+            twin.save()
+        self.item.refresh_from_db()
+        twin.refresh_from_db()
+        shared = self.item.image_variants
+        storage = self.item.image.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.image = _photo(color=(40, 200, 40))
+            self.item.save()
+        # The twin still shows the same picture.
+        self.assertTrue(storage.exists(shared['card']['webp']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            twin.image = _photo(color=(40, 40, 200))
+            twin.save()
+        self.assertFalse(storage.exists(shared['card']['webp']))
+        self.item.refresh_from_db()
+        self.assertTrue(storage.exists(self.item.image_variants['card']['webp']))
+
+    def test_failed_render_is_recorded_and_not_retried(self):
+        with self.assertLogs('restaurant_backend.images', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            self.item.image = SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+            self.item.save()
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.image_variants, {'source': self.item.image.name, 'failed': True})
+        self.assertEqual(self.client.get(self.menu_url).json()['menu'][0]['items'][0]['image_variants'], {})
+
+        out = StringIO()
+        call_command('backfill_image_variants', '--workers', '1', stdout=out)
+        self.assertIn('menu items: 0 updated, 0 failed', out.getvalue())
+        with self.assertLogs('restaurant_backend.images', 'WARNING'):
+            call_command('backfill_image_variants', '--workers', '1', '--retry-failed', stdout=out)
+        self.assertIn('menu items: 0 updated, 1 failed', out.getvalue())
+
+    def test_backfill_command_uses_process_pool(self):
+        self.item.image.save('photo.jpg', _photo(), save=False)
+        MenuItem.objects.filter(id=self.item.id).update(image=self.item.image.name)
+
+        call_command('backfill_image_variants', '--workers', '1', stdout=StringIO())
+
+        self.assertEqual(MenuItem.objects.get(id=self.item.id).image_variants['source'], self.item.image.name)
@@ -1,8 +1,10 @@
 from django.urls import path
+from restaurant_backend.asyncviews import public_view
 from . import views
 
 urlpatterns = [
     path('restaurants/<uuid:restaurant_id>/categories/', views.CategoryListCreateView.as_view(), name='category-list'),
     path('restaurants/<uuid:restaurant_id>/menu-items/', views.MenuItemListCreateView.as_view(), name='menuitem-list'),
-    path('qr/<uuid:qr_code>/menu/', views.get_menu_by_qr, name='menu-by-qr'),
+    path('restaurants/<uuid:restaurant_id>/search/', views.search_menu, name='menu-search'),
+    path('qr/<uuid:qr_code>/menu/', public_view(views.get_menu_by_qr, views.MenuByQRView.as_view()), name='menu-by-qr'),
 ]
\ No newline at end of file
@@ -1,54 +1,172 @@
+import logging
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from rest_framework import generics, permissions, viewsets
-from rest_framework.decorators import api_view, permission_classes
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.settings import api_settings
 from django.shortcuts import get_object_or_404
 from restaurants.models import Restaurant, Table
+from restaurants.resolver import aresolve_table, resolve_table
 from .models import Category, MenuItem
+from .fieldsets import Fieldset, FieldsetViewMixin
 from .serializers import CategorySerializer, MenuItemSerializer
+from restaurant_backend.asyncviews import AsyncAPIView
+from restaurant_backend.instrumentation import query_budget
+from restaurant_backend.renderers import accepted_encoding, compact_renderers, compress
+from restaurant_backend.routing import read_replica
+from . import allergens
+from . import cache as menu_cache
+from .search import SearchFilters, search
+
+logger = logging.getLogger(__name__)
+
+def _menu_payload(table, fieldset, excluded_allergens=0):
+    snapshot = menu_cache.get_menu_snapshot(table.restaurant)
+    return {
+        'restaurant': snapshot['restaurant'],
+        'table': {
+            'id': table.id,
+            'table_number': table.table_number,
+            'qr_code': str(table.qr_code)
+        },
+        'menu': fieldset.project_menu(allergens.exclude_from_menu(snapshot['menu'], excluded_allergens))
+    }
+
+def _is_encodable(request):
+    return request.accepted_renderer.format in ('json', 'msgpack')
+
+def _menu_body(request, table, fieldset, excluded_allergens):
+    """Cache key and encoder of the negotiated (and compressed) menu body."""
+    renderer = request.accepted_renderer
+    coding = accepted_encoding(request)
+
+    def encode():
+        body = renderer.render(
+            _menu_payload(table, fieldset, excluded_allergens), request.accepted_media_type, {'request': request}
+        )
+        return compress(body, coding) if coding else body
+
+    return (table.id, fieldset.key, excluded_allergens, request.accepted_media_type, coding), encode
 
+def _encoded_response(request, body):
+    renderer = request.accepted_renderer
+    coding = accepted_encoding(request)
+    content_type = renderer.media_type + ('; charset=utf-8' if renderer.charset else '')
+    response = HttpResponse(body, content_type=content_type)
+    if coding:
+        response['Content-Encoding'] = coding
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return response
+
+MENU_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, *compact_renderers()]
+
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes(MENU_RENDERERS)
 def get_menu_by_qr(request, qr_code):
-    print(f"[Django][menu.views] get_menu_by_qr called with qr_code={qr_code}, REMOTE_ADDR={request.META.get('REMOTE_ADDR')}")
+    """Public menu for the table behind ``qr_code``.
+
+    Supports ``?fields=``/``?expand=`` (menu.fieldsets) and
+    ``?exclude_allergens=`` (menu.allergens). JSON and MessagePack
+    bodies are encoded, and compressed when the client accepts gzip or br,
+    once per menu version, table and fieldset, then served from cache.
+    """
+    logger.info('menu.by_qr', extra={'fields': {'qr_code': str(qr_code)}})
     try:
-        table = Table.objects.select_related('restaurant').get(
-            qr_code=qr_code,
-            is_active=True,
-            restaurant__is_active=True
-        )
-        
-        categories = Category.objects.filter(
-            restaurant=table.restaurant,
-            is_active=True
-        ).prefetch_related('items')
-        
-        serializer = CategorySerializer(categories, many=True)
-        
-        return Response({
-            'restaurant': {
-                'id': table.restaurant.id,
-                'name': table.restaurant.name,
-                'description': table.restaurant.description,
-                'logo': table.restaurant.logo.url if table.restaurant.logo else None
-            },
-            'table': {
-                'id': table.id,
-                'table_number': table.table_number,
-                'qr_code': str(table.qr_code)
-            },
-            'menu': serializer.data
-        })
+        table = resolve_table(qr_code)
     except Table.DoesNotExist:
         return Response(
             {'error': 'Invalid QR code'}, 
             status=404
         )
 
+    try:
+        excluded = allergens.excluded_mask(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
+    fieldset = Fieldset.from_request(request, slim=True)
+    if not _is_encodable(request):
+        return Response(_menu_payload(table, fieldset, excluded))
+
+    key, encode = _menu_body(request, table, fieldset, excluded)
+    return _encoded_response(request, menu_cache.get_encoded(table.restaurant, key, encode))
+
+class MenuByQRView(AsyncAPIView):
+    """Async ``get_menu_by_qr``; a cached menu is served without leaving the event loop."""
+    permission_classes = [AllowAny]
+    renderer_classes = MENU_RENDERERS
+    query_budget = 3
+
+    async def get(self, request, qr_code):
+        logger.info('menu.by_qr', extra={'fields': {'qr_code': str(qr_code)}})
+        try:
+            table = await aresolve_table(qr_code)
+        except Table.DoesNotExist:
+            return Response(
+                {'error': 'Invalid QR code'},
+                status=404
+            )
+
+        try:
+            excluded = allergens.excluded_mask(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+        fieldset = Fieldset.from_request(request, slim=True)
+        if not _is_encodable(request):
+            return Response(await sync_to_async(_menu_payload)(table, fieldset, excluded))
+
+        key, encode = _menu_body(request, table, fieldset, excluded)
+        return _encoded_response(request, await menu_cache.aget_encoded(table.restaurant, key, encode))
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+@read_replica
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes(MENU_RENDERERS)
+def search_menu(request, restaurant_id):
+    """Ranked search over a restaurant's menu with facet counts (menu.search).
+
+    ``?q=`` matches names, descriptions and ingredients; ``?vegetarian=``,
+    ``?vegan=``, ``?category=``, ``?min_price=`` and ``?max_price=`` filter;
+    ``?limit=``/``?offset=`` page; ``?fields=``/``?expand=`` and
+    ``?exclude_allergens=`` as on the menu.
+    """
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id, is_active=True)
+    params = request.query_params
+    try:
+        filters = SearchFilters.from_params(params)
+        limit = min(int(params.get('limit', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+        offset = int(params.get('offset', 0))
+        if limit < 1 or offset < 0:
+            raise ValueError('limit must be positive and offset not negative')
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
+
+    return Response(search(
+        restaurant, params.get('q', ''), filters, limit=limit, offset=offset,
+        fieldset=Fieldset.from_request(request),
+    ))
+
+def _without_excluded_allergens(request, items):
+    try:
+        return allergens.exclude(items, allergens.excluded_mask(request.query_params))
+    except ValueError as exc:
+        raise ValidationError({'exclude_allergens': [str(exc)]})
+
 class CategoryListCreateView(generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
         restaurant_id = self.kwargs['restaurant_id']
@@ -66,16 +184,17 @@ class CategoryListCreateView(generics.ListCreateAPIView):
         )
         serializer.save(restaurant=restaurant)
 
-class MenuItemListCreateView(generics.ListCreateAPIView):
+class MenuItemListCreateView(FieldsetViewMixin, generics.ListCreateAPIView):
     serializer_class = MenuItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
         restaurant_id = self.kwargs['restaurant_id']
-        return MenuItem.objects.filter(
+        return _without_excluded_allergens(self.request, MenuItem.objects.filter(
             restaurant_id=restaurant_id,
             restaurant__owner=self.request.user
-        )
+        ))
 
     def perform_create(self, serializer):
         restaurant_id = self.kwargs['restaurant_id']
@@ -94,18 +213,23 @@ class MenuItemListCreateView(generics.ListCreateAPIView):
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
+    read_replica = True
     serializer_class = CategorySerializer
 
     def get_queryset(self):
         restaurant_id = self.request.query_params.get('restaurant_id')
         return Category.objects.filter(restaurant_id=restaurant_id, is_active=True)
 
-class MenuItemViewSet(viewsets.ReadOnlyModelViewSet):
+class MenuItemViewSet(FieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
+    read_replica = True
     serializer_class = MenuItemSerializer
+    renderer_classes = MENU_RENDERERS
 
     def get_queryset(self):
         restaurant_id = self.request.query_params.get('restaurant_id')
-        return MenuItem.objects.filter(restaurant_id=restaurant_id, is_available=True)
+        return _without_excluded_allergens(
+            self.request, MenuItem.objects.filter(restaurant_id=restaurant_id, is_available=True)
+        )
 
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import DailyItemSales, HourlySales, Order, OrderHistory, OrderIntake, OrderItem, OrderItemHistory
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -10,4 +10,53 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'customer_name', 'restaurant', 'table', 'status', 'total_amount', 'created_at']
     list_filter = ['status', 'restaurant', 'created_at']
     search_fields = ['customer_name', 'restaurant__name', 'table__table_number']
-    inlines = [OrderItemInline]
\ No newline at end of file
+    inlines = [OrderItemInline]
+
+@admin.register(HourlySales)
+class HourlySalesAdmin(admin.ModelAdmin):
+    list_display = ['restaurant', 'hour', 'orders', 'served', 'cancelled', 'revenue']
+    list_filter = ['restaurant']
+    date_hierarchy = 'hour'
+
+@admin.register(DailyItemSales)
+class DailyItemSalesAdmin(admin.ModelAdmin):
+    list_display = ['restaurant', 'date', 'menu_item', 'quantity', 'revenue']
+    list_filter = ['restaurant']
+    date_hierarchy = 'date'
+
+@admin.register(OrderIntake)
+class OrderIntakeAdmin(admin.ModelAdmin):
+    list_display = ['id', 'restaurant', 'table', 'status', 'created_at', 'processed_at']
+    list_filter = ['status', 'restaurant']
+    readonly_fields = ['payload', 'error']
+
+class OrderItemHistoryInline(admin.TabularInline):
+    model = OrderItemHistory
+    extra = 0
+    can_delete = False
+    fields = ['menu_item', 'quantity', 'unit_price', 'special_instructions', 'created_at']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(OrderHistory)
+class OrderHistoryAdmin(admin.ModelAdmin):
+    """Live and archived orders together; read-only."""
+    list_display = ['id', 'customer_name', 'restaurant', 'table', 'status', 'total_amount', 'created_at', 'archived']
+    list_filter = ['archived', 'status', 'restaurant', 'created_at']
+    search_fields = ['customer_name', 'restaurant__name', 'table__table_number']
+    date_hierarchy = 'created_at'
+    inlines = [OrderItemHistoryInline]
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,91 @@
+"""
+Order history archival.
+
+Served and cancelled orders older than ``ORDER_ARCHIVE['AFTER_DAYS']`` are
+moved, with their lines, from ``Order`` / ``OrderItem`` into ``ArchivedOrder``
+/ ``ArchivedOrderItem`` so the hot tables and their indexes only hold recent
+and open orders. Each chunk of ``ORDER_ARCHIVE['CHUNK_SIZE']`` orders is one
+short transaction: claim the oldest finished orders (skipping rows another
+archiver holds), copy them and delete the originals, so no lock is held for
+longer than a chunk takes.
+
+Archived orders keep their ids and timestamps. ``OrderHistory`` and
+``OrderItemHistory`` read both tables through ``UNION ALL`` views, which is
+what the admin history and ``rollups.rebuild`` use; live endpoints keep
+reading ``Order`` and so only see orders that are still live.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+FINAL_STATUSES = ('served', 'cancelled')
+
+ORDER_FIELDS = (
+    'id', 'restaurant_id', 'table_id', 'customer_name', 'status', 'total_amount',
+    'special_instructions', 'idempotency_key', 'estimated_ready_at', 'created_at', 'updated_at',
+)
+ITEM_FIELDS = ('id', 'order_id', 'menu_item_id', 'quantity', 'unit_price', 'special_instructions', 'created_at')
+
+
+def _settings():
+    return getattr(settings, 'ORDER_ARCHIVE', {})
+
+
+def cutoff_for(days=None, now=None):
+    """Orders created before this moment are old enough to archive."""
+    days = _settings().get('AFTER_DAYS', 90) if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def archivable(cutoff):
+    """Finished orders created before ``cutoff``, oldest first (``order_status_created_idx``)."""
+    return Order.objects.filter(status__in=FINAL_STATUSES, created_at__lt=cutoff).order_by('created_at', 'id')
+
+
+def _claim(cutoff, size):
+    candidates = archivable(cutoff)
+    if connection.features.has_select_for_update_skip_locked:
+        # Orders being updated, or claimed by another archiver, wait for the next run.
+        candidates = candidates.select_for_update(skip_locked=True)
+    return list(candidates.values_list('id', flat=True)[:size])
+
+
+def archive_chunk(cutoff, size=None, now=None):
+    """Move up to ``size`` finished orders created before ``cutoff``; returns ``(orders, items)``."""
+    size = size or _settings().get('CHUNK_SIZE', 500)
+    now = now or timezone.now()
+    with transaction.atomic():
+        order_ids = _claim(cutoff, size)
+        if not order_ids:
+            return 0, 0
+        orders = Order.objects.filter(id__in=order_ids).values(*ORDER_FIELDS)
+        items = OrderItem.objects.filter(order_id__in=order_ids).values(*ITEM_FIELDS)
+        ArchivedOrder.objects.bulk_create(ArchivedOrder(archived_at=now, **row) for row in orders)
+        archived_items = ArchivedOrderItem.objects.bulk_create(ArchivedOrderItem(**row) for row in items)
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).delete()
+    return len(order_ids), len(archived_items)
+
+
+def archive(days=None, size=None, pause=0, max_chunks=None, now=None):
+    """Archive chunk by chunk until nothing is left; returns ``(orders, items)`` moved.
+
+    ``pause`` seconds between chunks leave the database room for live traffic.
+    """
+    cutoff = cutoff_for(days, now)
+    moved_orders = moved_items = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        orders, items = archive_chunk(cutoff, size, now)
+        if not orders:
+            break
+        moved_orders += orders
+        moved_items += items
+        chunks += 1
+        if pause:
+            time.sleep(pause)
+    return moved_orders, moved_items
@@ -0,0 +1,134 @@
+"""
+Estimated ready times for new orders.
+
+An order is ready once the kitchen has worked through the queue ahead of it
+and then cooked its own slowest line:
+
+    ready = now + backlog / ORDER_ETA['STATIONS'] + max(preparation_time of its lines)
+
+where the backlog is the preparation minutes (``preparation_time`` times
+quantity) of every open order of the restaurant. The estimate is stored on the
+order (``Order.estimated_ready_at``) when it is written, so reads cost nothing.
+
+Each process keeps the backlog per restaurant in memory: loaded with one
+grouped query on first use, then updated from ``order_created`` (once the
+order's transaction commits) and ``order_status_changed`` rather than
+rescanned. ``estimate`` itself never changes the queue. Orders written by other
+processes only show up when the queue is reloaded, every
+``ORDER_ETA['RESYNC_SECONDS']``.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.dispatch import receiver
+from django.utils import timezone
+
+from restaurant_backend.routing import use_primary
+from .models import OrderItem
+from .signals import order_created, order_status_changed
+
+OPEN_STATUSES = ('pending', 'confirmed', 'preparing')
+
+_queues = {}
+_lock = threading.Lock()
+
+
+def _settings():
+    return getattr(settings, 'ORDER_ETA', {})
+
+
+class KitchenQueue:
+    """Preparation minutes of a restaurant's open orders."""
+
+    def __init__(self, work):
+        self.work = dict(work)
+        self.backlog = sum(self.work.values())
+        self.loaded_at = time.monotonic()
+
+    def add(self, order_id, minutes):
+        self.backlog += minutes - self.work.get(order_id, 0)
+        self.work[order_id] = minutes
+
+    def remove(self, order_ids):
+        for order_id in order_ids:
+            self.backlog -= self.work.pop(order_id, 0)
+
+    def is_stale(self):
+        return time.monotonic() - self.loaded_at >= _settings().get('RESYNC_SECONDS', 60)
+
+
+def load_queue(restaurant_id):
+    # Kept across requests, so read from the primary like the other in-process caches.
+    with use_primary():
+        rows = (
+            OrderItem.objects
+            .filter(order__restaurant_id=restaurant_id, order__status__in=OPEN_STATUSES)
+            .values('order_id')
+            .annotate(minutes=Sum(F('quantity') * F('menu_item__preparation_time')))
+            .order_by()
+        )
+        return KitchenQueue((row['order_id'], row['minutes']) for row in rows)
+
+
+def get_queue(restaurant_id):
+    with _lock:
+        queue = _queues.get(restaurant_id)
+    if queue is None or queue.is_stale():
+        queue = load_queue(restaurant_id)
+        with _lock:
+            _queues[restaurant_id] = queue
+    return queue
+
+
+def order_minutes(lines):
+    """``(total, longest)`` preparation minutes of ``(preparation_time, quantity)`` lines."""
+    lines = list(lines)
+    return sum(minutes * quantity for minutes, quantity in lines), max((minutes for minutes, _ in lines), default=0)
+
+
+def estimate(restaurant_id, lines, now=None, ahead=0):
+    """Ready time for a new order of ``(preparation_time, quantity)`` lines.
+
+    ``ahead`` adds the minutes of orders not in the queue yet, for batches of
+    orders written in one transaction.
+    """
+    queue = get_queue(restaurant_id)
+    _, longest = order_minutes(lines)
+    stations = max(_settings().get('STATIONS', 3), 1)
+    with _lock:
+        ready_in = (queue.backlog + ahead) / stations + longest
+    return (now or timezone.now()) + timedelta(minutes=ready_in)
+
+
+def clear():
+    with _lock:
+        _queues.clear()
+
+
+def _enqueue(restaurant_id, order_id, minutes):
+    with _lock:
+        queue = _queues.get(restaurant_id)
+        if queue is not None:
+            queue.add(order_id, minutes)
+
+
+@receiver(order_created)
+def queue_order(sender, order, **kwargs):
+    # order.items are prefetched with their menu items by the senders.
+    total, _ = order_minutes((line.menu_item.preparation_time, line.quantity) for line in order.items.all())
+    # A rolled back order must not hold a place in the queue.
+    transaction.on_commit(lambda: _enqueue(order.restaurant_id, order.id, total))
+
+
+@receiver(order_status_changed)
+def dequeue_orders(sender, restaurant_id, order_ids, status, **kwargs):
+    if status in OPEN_STATUSES:
+        return
+    with _lock:
+        queue = _queues.get(restaurant_id)
+        if queue is not None:
+            queue.remove(order_ids)
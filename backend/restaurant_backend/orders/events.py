@@ -0,0 +1,199 @@
+"""
+Per-restaurant order event stream for kitchen screens.
+
+Views announce changes through ``orders.signals``; the receivers below turn
+them into compact events and hand them to the configured broker once the
+transaction commits. ``InMemoryBroker`` fans out inside the current process
+and keeps a short history per restaurant so reconnecting clients can resume
+from the last event id they saw. Another broker (Redis, Postgres
+LISTEN/NOTIFY, ...) can be plugged in through ``ORDER_EVENTS['BROKER']`` as
+long as it implements ``publish`` and ``subscribe``.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+from .signals import order_created, order_status_changed
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+# Sent when the requested history is gone; the client should refetch orders.
+STREAM_RESET = 'stream.reset'
+
+
+def _settings():
+    return getattr(settings, 'ORDER_EVENTS', {})
+
+
+class Subscription:
+    def __init__(self, broker, restaurant_id, backlog, loop=None, maxsize=1000):
+        self.broker = broker
+        self.restaurant_id = restaurant_id
+        self.backlog = backlog
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize) if loop is not None else None
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The event loop is gone; the client disconnected.
+            self.close()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryBroker:
+    def __init__(self, history=500):
+        self.history_size = history
+        # Ids start from the clock so they keep increasing across restarts and
+        # ids handed out by a previous process are recognisably stale.
+        self._first_id = time.time_ns() // 1000
+        self._last_id = self._first_id - 1
+        self._ids = itertools.count(self._first_id)
+        self._history = {}
+        self._trimmed = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, restaurant_id, event_type, data):
+        restaurant_id = str(restaurant_id)
+        with self._lock:
+            self._last_id = next(self._ids)
+            event = {'id': self._last_id, 'type': event_type, 'data': data}
+            history = self._history.setdefault(restaurant_id, deque(maxlen=self.history_size))
+            if len(history) == history.maxlen:
+                self._trimmed[restaurant_id] = history[0]['id']
+            history.append(event)
+            subscribers = list(self._subscribers.get(restaurant_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+        return event
+
+    def subscribe(self, restaurant_id, last_event_id=None, live=True):
+        """Return a subscription whose ``backlog`` holds events after ``last_event_id``.
+
+        With ``live=False`` only the backlog is returned, which is what
+        synchronous (WSGI) clients get.
+        """
+        restaurant_id = str(restaurant_id)
+        loop = asyncio.get_running_loop() if live else None
+        with self._lock:
+            backlog = self._replay(restaurant_id, last_event_id)
+            subscription = Subscription(self, restaurant_id, backlog, loop=loop)
+            if live:
+                self._subscribers.setdefault(restaurant_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.restaurant_id)
+            if subscribers:
+                subscribers.discard(subscription)
+
+    def _replay(self, restaurant_id, last_event_id):
+        if last_event_id is None:
+            return []
+        if (
+            not self._first_id - 1 <= last_event_id <= self._last_id
+            or last_event_id < self._trimmed.get(restaurant_id, 0)
+        ):
+            # Part of what the client missed was trimmed or came from another process.
+            return [{'id': self._last_id, 'type': STREAM_RESET, 'data': {}}]
+        history = self._history.get(restaurant_id, ())
+        return [event for event in history if event['id'] > last_event_id]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                options = _settings()
+                broker_class = import_string(options.get('BROKER', 'orders.events.InMemoryBroker'))
+                _broker = broker_class(history=options.get('HISTORY', 500))
+    return _broker
+
+
+def format_event(event):
+    data = json.dumps(event['data'], cls=JSONEncoder, separators=(',', ':'))
+    event_id = f"id: {event['id']}\n" if event['id'] is not None else ''
+    return f"{event_id}event: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream_events(restaurant_id, last_event_id=None):
+    """Async iterator of server-sent events for one restaurant."""
+    keepalive = _settings().get('KEEPALIVE', 15)
+    subscription = get_broker().subscribe(restaurant_id, last_event_id)
+    try:
+        yield f"retry: {_settings().get('RETRY_MS', 3000)}\n\n"
+        for event in subscription.backlog:
+            yield format_event(event)
+        while not subscription.overflowed:
+            try:
+                event = await subscription.get(timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event)
+        yield format_event({'id': None, 'type': STREAM_RESET, 'data': {}})
+    finally:
+        subscription.close()
+
+
+def replay_events(restaurant_id, last_event_id=None):
+    """Synchronous fallback: send what was missed and let the client reconnect."""
+    subscription = get_broker().subscribe(restaurant_id, last_event_id, live=False)
+    yield f"retry: {_settings().get('RETRY_MS', 3000)}\n\n"
+    for event in subscription.backlog:
+        yield format_event(event)
+
+
+def _publish_on_commit(restaurant_id, event_type, data):
+    transaction.on_commit(lambda: get_broker().publish(restaurant_id, event_type, data))
+
+
+@receiver(order_created)
+def publish_order_created(sender, order, **kwargs):
+    _publish_on_commit(order.restaurant_id, ORDER_CREATED, {
+        'id': order.id,
+        'status': order.status,
+        'table_number': order.table.table_number,
+        'customer_name': order.customer_name,
+        'total_amount': str(order.total_amount),
+        'created_at': order.created_at,
+    })
+
+
+@receiver(order_status_changed)
+def publish_status_changed(sender, restaurant_id, order_ids, status, updated_at, **kwargs):
+    for order_id in order_ids:
+        _publish_on_commit(restaurant_id, ORDER_STATUS_CHANGED, {
+            'id': order_id,
+            'status': status,
+            'updated_at': updated_at,
+        })
@@ -0,0 +1,57 @@
+"""
+``Idempotency-Key`` support for ``create_order``.
+
+A key is scoped to the QR code it was sent with. The first successful response
+is remembered in a Django cache for ``IDEMPOTENCY['TTL']`` seconds together
+with a fingerprint of the request body, and replayed as is for retries. The
+cache is only a fast path: orders and intake entries also store the key, under
+a unique (table, key) constraint, and the fingerprint, so when two requests
+race, or the cache has forgotten the key, the losing insert fails and the
+original is replayed from the database, or refused if the body differs.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.utils.encoders import JSONEncoder
+
+HEADER = 'Idempotency-Key'
+MAX_LENGTH = 255
+
+
+def _settings():
+    return getattr(settings, 'IDEMPOTENCY', {})
+
+
+def _cache():
+    return caches[_settings().get('CACHE_ALIAS', 'default')]
+
+
+def _cache_key(qr_code, key):
+    return f"idempotency:{qr_code}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def get_key(request):
+    """The request's key, ``''`` when absent, or ``None`` when it is invalid."""
+    key = request.headers.get(HEADER, '').strip()
+    return key if len(key) <= MAX_LENGTH else None
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def lookup(qr_code, key):
+    """``(status_code, data, fingerprint)`` of the remembered response, or None."""
+    return _cache().get(_cache_key(qr_code, key))
+
+
+async def alookup(qr_code, key):
+    return await _cache().aget(_cache_key(qr_code, key))
+
+
+def remember(qr_code, key, status_code, data, request_fingerprint):
+    # Encode as the JSON renderer would so replays are byte-for-byte the same.
+    data = json.loads(json.dumps(data, cls=JSONEncoder))
+    _cache().set(_cache_key(qr_code, key), (status_code, data, request_fingerprint), _settings().get('TTL', 86400))
@@ -0,0 +1,242 @@
+"""
+Write-ahead order intake for traffic spikes.
+
+With ``ORDER_INTAKE['MODE'] = 'queue'`` the create endpoint validates the
+order, prices it from the menu and appends it to ``OrderIntake`` with a single
+INSERT, answering 202 with the reference the order will be stored under.
+``drain`` (run by ``manage.py drain_order_intake``) claims queued entries
+oldest first and writes them as orders in one transaction per batch; entries
+whose menu items disappeared or became unavailable meanwhile, or that fail to
+insert, are marked failed without holding back the rest of the batch. ``stats`` reports the
+queue depth, age of the oldest entry and the recent drain rate.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+
+from menu.models import MenuItem
+from . import eta
+from .models import Order, OrderIntake, OrderItem
+from .signals import order_created
+
+logger = logging.getLogger(__name__)
+
+
+def _settings():
+    return getattr(settings, 'ORDER_INTAKE', {})
+
+
+def is_enabled():
+    return _settings().get('MODE', 'direct') == 'queue'
+
+
+def enqueue(serializer, idempotency_key=None, idempotency_fingerprint=''):
+    """Queue the order validated by an ``OrderCreateSerializer``."""
+    table = serializer.context['table']
+    data = serializer.validated_data
+    items = []
+    for item in data['items']:
+        menu_item = serializer.menu_items[item['menu_item_id']]
+        items.append({
+            'menu_item_id': str(menu_item.id),
+            'quantity': item['quantity'],
+            'unit_price': str(menu_item.price),
+            'special_instructions': item.get('special_instructions', ''),
+        })
+    # A savepoint, so a duplicate Idempotency-Key leaves the connection usable.
+    with transaction.atomic():
+        return OrderIntake.objects.create(
+            restaurant_id=table.restaurant_id,
+            table=table,
+            idempotency_key=idempotency_key,
+            idempotency_fingerprint=idempotency_fingerprint,
+            payload={
+                'customer_name': data['customer_name'],
+                'special_instructions': data.get('special_instructions', ''),
+                'items': items,
+            },
+        )
+
+
+def _claim(batch_size):
+    queued = OrderIntake.objects.filter(status='queued').order_by('created_at')
+    if connection.features.has_select_for_update_skip_locked:
+        # Several drain workers can run side by side without double writes.
+        queued = queued.select_for_update(skip_locked=True)
+    return list(queued[:batch_size])
+
+
+def _unorderable(entry, menu_items):
+    """Why ``entry`` can no longer be written, or ``None``."""
+    lines = [line['menu_item_id'] for line in entry.payload['items']]
+    missing = [pk for pk in lines if pk not in menu_items or menu_items[pk][0] != entry.restaurant_id]
+    if missing:
+        return f"Menu items no longer exist: {', '.join(sorted(missing))}"
+    unavailable = [pk for pk in lines if not menu_items[pk][1]]
+    if unavailable:
+        return f"Menu items are no longer available: {', '.join(sorted(unavailable))}"
+    return None
+
+
+def _write(orders, lines):
+    Order.objects.bulk_create(orders)
+    OrderItem.objects.bulk_create(lines)
+    # Foreign keys are checked at commit; check them now so a menu item deleted
+    # since it was read fails this savepoint rather than the whole batch.
+    connection.check_constraints(table_names=[OrderItem._meta.db_table])
+
+
+def drain(batch_size=None):
+    """Write one batch of queued orders; returns ``(processed, failed)``."""
+    batch_size = batch_size or _settings().get('BATCH_SIZE', 100)
+    with transaction.atomic():
+        entries = _claim(batch_size)
+        if not entries:
+            return 0, 0
+
+        menu_item_ids = {line['menu_item_id'] for entry in entries for line in entry.payload['items']}
+        menu_items = {
+            str(pk): (restaurant_id, is_available, minutes)
+            for pk, restaurant_id, is_available, minutes in MenuItem.objects.filter(id__in=menu_item_ids).values_list(
+                'id', 'restaurant_id', 'is_available', 'preparation_time'
+            )
+        }
+        keys = {entry.idempotency_key for entry in entries if entry.idempotency_key}
+        duplicates = set(
+            Order.objects.filter(idempotency_key__in=keys).values_list('table_id', 'idempotency_key')
+        ) if keys else set()
+
+        built, failed = [], []
+        # Minutes of this batch's orders per restaurant: they only join the ETA queue once committed.
+        ahead = defaultdict(int)
+        for entry in entries:
+            if (entry.table_id, entry.idempotency_key) in duplicates:
+                # Retried after the first entry was drained and pruned.
+                entry.error = 'An order with this Idempotency-Key already exists.'
+                failed.append(entry)
+                continue
+            error = _unorderable(entry, menu_items)
+            if error:
+                entry.error = error
+                failed.append(entry)
+                continue
+            order = Order(
+                id=entry.id,
+                restaurant_id=entry.restaurant_id,
+                table_id=entry.table_id,
+                customer_name=entry.payload['customer_name'],
+                special_instructions=entry.payload['special_instructions'],
+                idempotency_key=entry.idempotency_key,
+                idempotency_fingerprint=entry.idempotency_fingerprint,
+            )
+            order_lines = [
+                OrderItem(
+                    order=order,
+                    menu_item_id=line['menu_item_id'],
+                    quantity=line['quantity'],
+                    unit_price=Decimal(line['unit_price']),
+                    special_instructions=line['special_instructions'],
+                )
+                for line in entry.payload['items']
+            ]
+            order.total_amount = sum(line.subtotal for line in order_lines)
+            work = [(menu_items[line['menu_item_id']][2], line['quantity']) for line in entry.payload['items']]
+            order.estimated_ready_at = eta.estimate(entry.restaurant_id, work, ahead=ahead[entry.restaurant_id])
+            ahead[entry.restaurant_id] += eta.order_minutes(work)[0]
+            built.append((entry, order, order_lines))
+
+        try:
+            with transaction.atomic():
+                _write([order for _, order, _ in built], [line for _, _, lines in built for line in lines])
+            written = built
+        except IntegrityError:
+            # One bad entry must not hold the batch back forever: write the
+            # entries one savepoint each and fail only those that still conflict.
+            written = []
+            for entry, order, order_lines in built:
+                try:
+                    with transaction.atomic():
+                        _write([order], order_lines)
+                except IntegrityError as exc:
+                    logger.warning('order_intake.write_failed', extra={'fields': {
+                        'entry': str(entry.id),
+                        'error': str(exc),
+                    }})
+                    entry.error = f'The order could not be written: {exc}'
+                    failed.append(entry)
+                else:
+                    written.append((entry, order, order_lines))
+        done = [entry for entry, _, _ in written]
+        orders = [order for _, order, _ in written]
+
+        now = timezone.now()
+        for entry in done:
+            entry.status, entry.processed_at = 'processed', now
+        for entry in failed:
+            entry.status, entry.processed_at = 'failed', now
+        OrderIntake.objects.bulk_update(done + failed, ['status', 'error', 'processed_at'])
+
+        if orders:
+            prefetch_related_objects(orders, Prefetch('items', queryset=OrderItem.objects.select_related('menu_item')))
+            for order in orders:
+                order_created.send(sender=Order, order=order)
+    return len(done), len(failed)
+
+
+def prune(retention=None):
+    """Delete processed entries older than ``retention`` seconds."""
+    retention = _settings().get('RETENTION', 86400) if retention is None else retention
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    deleted, _ = OrderIntake.objects.filter(status='processed', processed_at__lt=cutoff).delete()
+    return deleted
+
+
+def stats(window=60):
+    """Queue depth, age of the oldest queued entry and orders drained per second over ``window`` seconds."""
+    now = timezone.now()
+    queued = OrderIntake.objects.filter(status='queued')
+    oldest = queued.order_by('created_at').values_list('created_at', flat=True).first()
+    drained = OrderIntake.objects.filter(
+        status='processed', processed_at__gte=now - timedelta(seconds=window)
+    ).count()
+    return {
+        'depth': queued.count(),
+        'oldest_age_s': round((now - oldest).total_seconds(), 3) if oldest else 0.0,
+        'drained_per_s': round(drained / window, 3),
+        'failed': OrderIntake.objects.filter(status='failed').count(),
+    }
+
+
+def run(batch_size=None, interval=None, once=False, stdout=None):
+    """Drain until stopped (or, with ``once``, until the queue is empty)."""
+    interval = _settings().get('POLL_INTERVAL', 0.5) if interval is None else interval
+    pruned_at = 0.0
+    while True:
+        started = time.perf_counter()
+        processed, failed = drain(batch_size)
+        elapsed = time.perf_counter() - started
+        if processed or failed:
+            depth = OrderIntake.objects.filter(status='queued').count()
+            logger.info('order_intake.drained', extra={'fields': {
+                'processed': processed,
+                'failed': failed,
+                'duration_ms': round(elapsed * 1000, 2),
+                'rate_per_s': round((processed + failed) / elapsed, 1) if elapsed else None,
+                'depth': depth,
+            }})
+            if stdout is not None:
+                stdout(processed, failed, elapsed, depth)
+            continue
+        if once:
+            return
+        if time.monotonic() - pruned_at > 60:
+            prune()
+            pruned_at = time.monotonic()
+        time.sleep(interval)
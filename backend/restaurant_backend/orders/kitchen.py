@@ -0,0 +1,120 @@
+"""
+"Cook now" totals for the kitchen display.
+
+``cook_now`` sums the lines of a restaurant's open orders (pending, confirmed
+and preparing) per menu item: quantities by status, how many tickets ask for
+the item, the oldest of them and the preparation minutes of the whole batch,
+in one grouped query over the ``order_rest_status_recent_idx`` index.
+
+Results are kept per restaurant for ``KITCHEN['CACHE_SECONDS']``, so a wall
+of kitchen screens polling every second costs one query per interval. New
+orders and status changes drop the entry in this process; other workers
+catch up within the TTL. Ticket ages are computed when the response is built,
+so they keep counting while an entry is cached.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.dispatch import receiver
+from django.utils import timezone
+
+from restaurant_backend.caching import LRUCache
+from restaurant_backend.routing import use_primary
+from .models import OrderItem
+from .signals import order_created, order_status_changed
+
+KITCHEN_STATUSES = ('pending', 'confirmed', 'preparing')
+
+_cache = None
+
+
+def _settings():
+    return getattr(settings, 'KITCHEN', {})
+
+
+def _kitchen_cache():
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(max_entries=_settings().get('MAX_ENTRIES', 1000), ttl=_settings().get('CACHE_SECONDS', 2))
+    return _cache
+
+
+def aggregate_open_items(restaurant_id):
+    """One row per menu item on an open ticket, oldest ticket first."""
+    status_sums = {
+        status: Sum('quantity', filter=Q(order__status=status), default=0) for status in KITCHEN_STATUSES
+    }
+    rows = (
+        OrderItem.objects
+        .filter(order__restaurant_id=restaurant_id, order__status__in=KITCHEN_STATUSES)
+        .values('menu_item_id', 'menu_item__name', 'menu_item__preparation_time')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            **status_sums,
+            tickets=Count('order_id', distinct=True),
+            oldest_ticket_at=Min('order__created_at'),
+            preparation_minutes=Sum(F('quantity') * F('menu_item__preparation_time')),
+        )
+        .order_by('oldest_ticket_at', 'menu_item__name')
+    )
+    return [
+        {
+            'menu_item': str(row['menu_item_id']),
+            'name': row['menu_item__name'],
+            'quantity': row['total_quantity'],
+            'by_status': {status: row[status] for status in KITCHEN_STATUSES},
+            'tickets': row['tickets'],
+            'oldest_ticket_at': row['oldest_ticket_at'],
+            'preparation_time': row['menu_item__preparation_time'],
+            'preparation_minutes': row['preparation_minutes'],
+        }
+        for row in rows
+    ]
+
+
+def cook_now(restaurant_id, now=None):
+    """Per-item totals and overall figures for the open tickets of ``restaurant_id``."""
+    cache = _kitchen_cache()
+    items = cache.get(restaurant_id)
+    if items is None:
+        # Cached until the next order change, so never from a lagging replica.
+        with use_primary():
+            items = aggregate_open_items(restaurant_id)
+        cache.set(restaurant_id, items)
+
+    now = now or timezone.now()
+
+    def age(created_at):
+        return max(int((now - created_at).total_seconds()), 0) if created_at else None
+
+    oldest = min((item['oldest_ticket_at'] for item in items), default=None)
+    return {
+        'generated_at': now,
+        'items': [dict(item, oldest_ticket_age_seconds=age(item['oldest_ticket_at'])) for item in items],
+        'totals': {
+            'quantity': sum(item['quantity'] for item in items),
+            'preparation_minutes': sum(item['preparation_minutes'] for item in items),
+            'oldest_ticket_at': oldest,
+            'oldest_ticket_age_seconds': age(oldest),
+        },
+    }
+
+
+def invalidate(restaurant_id):
+    """Drop the cached totals now and again once the surrounding transaction commits."""
+    _kitchen_cache().delete(restaurant_id)
+    transaction.on_commit(lambda: _kitchen_cache().delete(restaurant_id))
+
+
+def clear():
+    _kitchen_cache().clear()
+
+
+@receiver(order_created)
+def order_created_invalidates(sender, order, **kwargs):
+    invalidate(order.restaurant_id)
+
+
+@receiver(order_status_changed)
+def order_status_changed_invalidates(sender, restaurant_id, **kwargs):
+    invalidate(restaurant_id)
@@ -0,0 +1,42 @@
+# orders/management/commands/drain_order_intake.py
+from django.core.management.base import BaseCommand
+
+from orders import intake
+
+
+class Command(BaseCommand):
+    help = (
+        "Write queued orders (ORDER_INTAKE_MODE=queue) in batched transactions. "
+        "Runs until interrupted; several workers may run at once on PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Orders per transaction')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as the queue is empty')
+
+    def handle(self, *args, **options):
+        stats = intake.stats()
+        self.stdout.write(self.style.NOTICE(
+            f"Draining order intake: {stats['depth']} queued, oldest {stats['oldest_age_s']}s"
+        ))
+        try:
+            intake.run(
+                batch_size=options['batch_size'],
+                interval=options['interval'],
+                once=options['once'],
+                stdout=self.log_batch,
+            )
+        except KeyboardInterrupt:
+            pass
+        stats = intake.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stopped with {stats['depth']} queued, {stats['failed']} failed in total."
+        ))
+
+    def log_batch(self, processed, failed, elapsed, depth):
+        rate = (processed + failed) / elapsed if elapsed else 0
+        self.stdout.write(
+            f"  wrote {processed} orders, {failed} failed in {elapsed * 1000:.0f} ms "
+            f"({rate:.0f}/s), {depth} still queued"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_listing_indexes'),
+        ('restaurants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'updated_at', 'id'], name='order_restaurant_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_updated_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='orderitem',
+            options={'ordering': ['created_at', 'id']},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='estimated_ready_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
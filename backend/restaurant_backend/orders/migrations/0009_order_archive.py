@@ -0,0 +1,142 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Read-only history over live and archived orders (orders.archive). Both
+# tables have the same columns, so a plain UNION ALL view works everywhere;
+# OrderHistory / OrderItemHistory are unmanaged models on top of them.
+ORDER_COLUMNS = (
+    'id, restaurant_id, table_id, customer_name, status, total_amount, special_instructions, '
+    'idempotency_key, estimated_ready_at, created_at, updated_at'
+)
+ITEM_COLUMNS = 'id, order_id, menu_item_id, quantity, unit_price, special_instructions, created_at'
+
+CREATE_VIEWS = [
+    f"""
+    CREATE VIEW orders_order_history AS
+    SELECT {ORDER_COLUMNS}, FALSE AS archived FROM orders_order
+    UNION ALL
+    SELECT {ORDER_COLUMNS}, TRUE AS archived FROM orders_archivedorder
+    """,
+    f"""
+    CREATE VIEW orders_orderitem_history AS
+    SELECT {ITEM_COLUMNS} FROM orders_orderitem
+    UNION ALL
+    SELECT {ITEM_COLUMNS} FROM orders_archivedorderitem
+    """,
+]
+
+DROP_VIEWS = [
+    "DROP VIEW IF EXISTS orders_orderitem_history",
+    "DROP VIEW IF EXISTS orders_order_history",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0004_allergen_mask'),
+        ('orders', '0008_order_estimated_ready_at'),
+        ('restaurants', '0002_logo_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistory',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('customer_name', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('served', 'Served'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('special_instructions', models.TextField(blank=True)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True)),
+                ('estimated_ready_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived', models.BooleanField()),
+            ],
+            options={
+                'verbose_name_plural': 'order history',
+                'db_table': 'orders_order_history',
+                'ordering': ['-created_at', '-id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderItemHistory',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('special_instructions', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'order item history',
+                'db_table': 'orders_orderitem_history',
+                'ordering': ['created_at', 'id'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('customer_name', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('preparing', 'Preparing'), ('ready', 'Ready'), ('served', 'Served'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('special_instructions', models.TextField(blank=True)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True)),
+                ('estimated_ready_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('special_instructions', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='restaurant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='restaurants.restaurant'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='table',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='restaurants.table'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='menu_item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_order_items', to='menu.menuitem'),
+        ),
+        migrations.AddField(
+            model_name='archivedorderitem',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['restaurant', '-created_at', '-id'], name='archived_order_recent_idx'),
+        ),
+        migrations.RunSQL(CREATE_VIEWS, DROP_VIEWS),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+# SQLite adds the column by rebuilding orders_order, which a view on it does
+# not survive: the history views (0009) are dropped around the change.
+ORDER_COLUMNS = (
+    'id, restaurant_id, table_id, customer_name, status, total_amount, special_instructions, '
+    'idempotency_key, estimated_ready_at, created_at, updated_at'
+)
+ITEM_COLUMNS = 'id, order_id, menu_item_id, quantity, unit_price, special_instructions, created_at'
+
+CREATE_VIEWS = [
+    f"""
+    CREATE VIEW orders_order_history AS
+    SELECT {ORDER_COLUMNS}, FALSE AS archived FROM orders_order
+    UNION ALL
+    SELECT {ORDER_COLUMNS}, TRUE AS archived FROM orders_archivedorder
+    """,
+    f"""
+    CREATE VIEW orders_orderitem_history AS
+    SELECT {ITEM_COLUMNS} FROM orders_orderitem
+    UNION ALL
+    SELECT {ITEM_COLUMNS} FROM orders_archivedorderitem
+    """,
+]
+
+DROP_VIEWS = [
+    "DROP VIEW IF EXISTS orders_orderitem_history",
+    "DROP VIEW IF EXISTS orders_order_history",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_VIEWS, CREATE_VIEWS),
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='orderintake',
+            name='idempotency_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunSQL(CREATE_VIEWS, DROP_VIEWS),
+    ]
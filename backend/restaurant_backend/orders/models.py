@@ -1,9 +1,23 @@
 from django.db import models
-from django.db import models
+from django.utils import timezone
 from restaurants.models import Restaurant, Table
 from menu.models import MenuItem
 import uuid
 
+
+class OrderQuerySet(models.QuerySet):
+    def transition(self, status, expected=None, timestamp=None):
+        """Move the matching orders to ``status`` in one conditional UPDATE.
+
+        Only rows currently in ``expected`` (or, without it, in any status that
+        may move to ``status``) are touched, so a concurrent change makes the
+        row drop out instead of being overwritten. Returns the number of rows
+        updated; only ``status`` and ``updated_at`` are written.
+        """
+        sources = [expected] if expected is not None else Order.sources_for(status)
+        return self.filter(status__in=sources).update(status=status, updated_at=timestamp or timezone.now())
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -14,6 +28,16 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
 
+    # Allowed moves; served and cancelled are final.
+    TRANSITIONS = {
+        'pending': ('confirmed', 'cancelled'),
+        'confirmed': ('preparing', 'cancelled'),
+        'preparing': ('ready', 'cancelled'),
+        'ready': ('served',),
+        'served': (),
+        'cancelled': (),
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='orders')
     table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='orders')
@@ -21,15 +45,46 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     special_instructions = models.TextField(blank=True)
+    # Client supplied Idempotency-Key, unique per table, and the body it came with (see orders.idempotency).
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    idempotency_fingerprint = models.CharField(max_length=64, blank=True, editable=False)
+    # Estimated when the order is written (orders.eta).
+    estimated_ready_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Kitchen and history listings seek on (created_at, id) per restaurant.
+            models.Index(fields=['restaurant', '-created_at', '-id'], name='order_restaurant_recent_idx'),
+            models.Index(fields=['restaurant', 'status', '-created_at', '-id'], name='order_rest_status_recent_idx'),
+            # Incremental sync reads everything touched after a watermark.
+            models.Index(fields=['restaurant', 'updated_at', 'id'], name='order_restaurant_updated_idx'),
+            # The archiver walks finished orders oldest first (orders.archive).
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['table', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='order_table_idempotency_key',
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.customer_name} - Table {self.table.table_number}"
 
+    @classmethod
+    def can_transition(cls, current, new):
+        return new in cls.TRANSITIONS.get(current, ())
+
+    @classmethod
+    def sources_for(cls, status):
+        return [current for current, targets in cls.TRANSITIONS.items() if status in targets]
+
     def calculate_total(self):
         total = sum(item.subtotal for item in self.items.all())
         self.total_amount = total
@@ -45,6 +100,9 @@ class OrderItem(models.Model):
     special_instructions = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['created_at', 'id']
+
     def __str__(self):
         return f"{self.quantity}x {self.menu_item.name}"
 
@@ -55,4 +113,173 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         if not self.unit_price:
             self.unit_price = self.menu_item.price
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class HourlySales(models.Model):
+    """Orders placed per restaurant and hour, kept up to date by ``orders.rollups``."""
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='hourly_sales')
+    hour = models.DateTimeField()
+    orders = models.PositiveIntegerField(default=0)
+    served = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    # Value of the orders placed in this hour that were not cancelled.
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['restaurant', 'hour']
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'hour'], name='hourly_sales_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant_id} {self.hour:%Y-%m-%d %H:00} - {self.orders} orders"
+
+
+class DailyItemSales(models.Model):
+    """Quantity and revenue per restaurant, day and menu item, kept up to date by ``orders.rollups``."""
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='daily_item_sales')
+    date = models.DateField()
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['restaurant', 'date', 'menu_item']
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'date', 'menu_item'], name='daily_item_sales_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant_id} {self.date} {self.menu_item_id} x{self.quantity}"
+
+
+class OrderIntake(models.Model):
+    """A validated order waiting to be written by ``drain_order_intake``.
+
+    The id is handed to the customer as the order reference and becomes the
+    ``Order`` id once drained.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='order_intake')
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='order_intake')
+    payload = models.JSONField()
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    idempotency_fingerprint = models.CharField(max_length=64, blank=True, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_intake_queue_idx'),
+            models.Index(fields=['status', 'processed_at'], name='order_intake_done_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['table', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='order_intake_idempotency_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Intake {self.id} - {self.status}"
+
+
+class ArchivedOrder(models.Model):
+    """A served or cancelled order moved out of ``Order`` by ``orders.archive``; the same columns."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='archived_orders')
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='archived_orders')
+    customer_name = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    special_instructions = models.TextField(blank=True)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    estimated_ready_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['restaurant', '-created_at', '-id'], name='archived_order_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id} - {self.customer_name}"
+
+
+class ArchivedOrderItem(models.Model):
+    """A line of an ``ArchivedOrder``."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='archived_order_items')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    special_instructions = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.menu_item_id}"
+
+
+class OrderHistory(models.Model):
+    """Live and archived orders together, read-only.
+
+    Backed by the ``orders_order_history`` view (``UNION ALL`` of both tables,
+    migration 0009) for the admin and reporting reads that span all history.
+    """
+    id = models.UUIDField(primary_key=True)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    table = models.ForeignKey(Table, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    customer_name = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    special_instructions = models.TextField(blank=True)
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    estimated_ready_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'orders_order_history'
+        ordering = ['-created_at', '-id']
+        verbose_name_plural = 'order history'
+
+    def __str__(self):
+        return f"Order {self.id} - {self.customer_name}"
+
+
+class OrderItemHistory(models.Model):
+    """Lines of ``OrderHistory`` (the ``orders_orderitem_history`` view)."""
+    id = models.UUIDField(primary_key=True)
+    order = models.ForeignKey(OrderHistory, on_delete=models.DO_NOTHING, related_name='items', db_constraint=False)
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    special_instructions = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'orders_orderitem_history'
+        ordering = ['created_at', 'id']
+        verbose_name_plural = 'order item history'
+
+    def __str__(self):
+        return f"{self.quantity}x {self.menu_item_id}"
@@ -0,0 +1,19 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils import json
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets ``Accept: text/event-stream`` through content negotiation.
+
+    The stream itself is a ``StreamingHttpResponse``; this renderer only
+    renders error responses (401/404) for EventSource clients.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f"event: error\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n".encode(self.charset)
@@ -0,0 +1,100 @@
+"""
+Read-only rendering of orders without the nested ModelSerializer machinery.
+
+``OrderSerializer`` walks ``OrderItemSerializer`` and ``MenuItemSerializer``
+field by field for every line of every order. For list pages the same JSON is
+built here from ``values()`` rows: the order rows come from the (paginated)
+queryset and all of their lines from a single joined query. The output must
+stay identical to ``OrderSerializer(many=True).data``; ``orders.tests`` keeps
+the two in step, so add fields to both.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from menu.allergens import names as allergen_names
+from menu.models import MenuItem
+from restaurant_backend.images import variant_urls
+from .models import OrderItem
+
+ORDER_VALUES = (
+    'id', 'customer_name', 'status', 'total_amount', 'special_instructions',
+    'table__table_number', 'estimated_ready_at', 'created_at', 'updated_at',
+)
+
+ORDER_ITEM_VALUES = (
+    'order_id', 'id', 'quantity', 'unit_price', 'special_instructions',
+    'menu_item__id', 'menu_item__name', 'menu_item__description', 'menu_item__price',
+    'menu_item__image', 'menu_item__image_variants', 'menu_item__category_id', 'menu_item__is_available',
+    'menu_item__is_vegetarian', 'menu_item__is_vegan', 'menu_item__preparation_time',
+    'menu_item__ingredients', 'menu_item__allergens', 'menu_item__allergen_mask',
+)
+
+# Unbound DRF fields, used only for their to_representation so numbers and
+# timestamps are formatted exactly as the serializers format them.
+_money = serializers.DecimalField(max_digits=10, decimal_places=2)
+_timestamp = serializers.DateTimeField()
+
+
+_image_storage = MenuItem._meta.get_field('image').storage
+
+
+def _image_url(name, request):
+    if not name:
+        return None
+    url = _image_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def render_order_items(order_ids, request=None):
+    """Map order id -> rendered lines for ``order_ids``, in one query."""
+    lines = defaultdict(list)
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values_list(*ORDER_ITEM_VALUES)
+    for (order_id, pk, quantity, unit_price, special_instructions,
+         menu_item_id, name, description, price, image, image_variants, category_id,
+         is_available, is_vegetarian, is_vegan, preparation_time, ingredients, allergens, allergen_mask) in rows:
+        lines[order_id].append({
+            'id': str(pk),
+            'menu_item': {
+                'id': str(menu_item_id),
+                'name': name,
+                'description': description,
+                'price': _money.to_representation(price),
+                'image': _image_url(image, request),
+                'image_variants': variant_urls(image_variants, _image_storage, request),
+                'category': category_id,
+                'is_available': is_available,
+                'is_vegetarian': is_vegetarian,
+                'is_vegan': is_vegan,
+                'preparation_time': preparation_time,
+                'ingredients': ingredients,
+                'allergens': allergens,
+                'allergen_codes': allergen_names(allergen_mask),
+            },
+            'quantity': quantity,
+            'unit_price': _money.to_representation(unit_price),
+            'subtotal': quantity * unit_price,
+            'special_instructions': special_instructions,
+        })
+    return lines
+
+
+def render_orders(rows, request=None):
+    """Render ``rows`` (dicts with ``ORDER_VALUES`` keys) as ``OrderSerializer`` would."""
+    rows = list(rows)
+    lines = render_order_items([row['id'] for row in rows], request) if rows else {}
+    return [
+        {
+            'id': str(row['id']),
+            'customer_name': row['customer_name'],
+            'status': row['status'],
+            'total_amount': _money.to_representation(row['total_amount']),
+            'special_instructions': row['special_instructions'],
+            'table_number': row['table__table_number'],
+            'items': lines.get(row['id'], []),
+            'estimated_ready_at': _timestamp.to_representation(row['estimated_ready_at']),
+            'created_at': _timestamp.to_representation(row['created_at']),
+            'updated_at': _timestamp.to_representation(row['updated_at']),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,272 @@
+"""
+Incrementally maintained sales rollups.
+
+``HourlySales`` (restaurant x hour) and ``DailyItemSales`` (restaurant x day x
+menu item) are bumped from the ``order_created`` and ``order_status_changed``
+signals with one ``INSERT ... ON CONFLICT DO UPDATE`` per table, so dashboard
+reads never scan raw orders. Orders count in the hour and day they were placed,
+in the current time zone; a cancellation takes their revenue back out of the
+buckets they were counted in. The upserts run once the order's transaction
+commits; one that fails is logged rather than failing the request, and
+``rebuild`` recomputes the rollups from raw orders after backfills or if they
+ever drift (``rebuild_sales_rollups``).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractHour, TruncDate, TruncHour
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import DailyItemSales, HourlySales, Order, OrderHistory, OrderItem, OrderItemHistory
+from .signals import order_created, order_status_changed
+
+HOURLY_KEYS = ('restaurant', 'hour')
+HOURLY_COUNTERS = ('orders', 'served', 'cancelled', 'revenue')
+ITEM_KEYS = ('restaurant', 'date', 'menu_item')
+ITEM_COUNTERS = ('quantity', 'revenue')
+
+logger = logging.getLogger(__name__)
+
+_money = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+def hour_bucket(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    return timezone.localtime(moment).date()
+
+
+def day_range(start, end):
+    """Aware datetimes bounding the local days ``start`` to ``end`` inclusive."""
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    )
+
+
+def increment(model, keys, counters, deltas, batch_size=500):
+    """Add ``deltas`` (key tuple -> {counter: delta}) onto the rows of ``model``.
+
+    Missing rows are created. On PostgreSQL and SQLite every batch is a single
+    upsert, so concurrent writers add up instead of overwriting each other.
+    """
+    # A stable order keeps concurrent upserts from deadlocking on PostgreSQL.
+    rows = [
+        key + tuple(delta.get(name, 0) for name in counters)
+        for key, delta in sorted(deltas.items(), key=lambda item: str(item[0]))
+    ]
+    if not rows:
+        return
+    fields = [model._meta.get_field(name) for name in keys + counters]
+
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        with transaction.atomic():
+            for row in rows:
+                lookup = dict(zip(keys, row))
+                values = dict(zip(counters, row[len(keys):]))
+                updated = model.objects.filter(**lookup).update(
+                    **{name: F(name) + value for name, value in values.items()}
+                )
+                if not updated:
+                    model.objects.create(**{field.attname: value for field, value in zip(fields, row)})
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ', '.join(qn(field.column) for field in fields)
+    conflict = ', '.join(qn(field.column) for field in fields[:len(keys)])
+    assignments = ', '.join(
+        f'{qn(field.column)} = {table}.{qn(field.column)} + EXCLUDED.{qn(field.column)}'
+        for field in fields[len(keys):]
+    )
+    placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = [
+                field.get_db_prep_save(value, connection)
+                for row in batch for field, value in zip(fields, row)
+            ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([placeholder] * len(batch))} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {assignments}',
+                params
+            )
+
+
+def _apply(hourly, items):
+    # Each upsert is atomic on its own; the two tables are independent totals.
+    try:
+        increment(HourlySales, HOURLY_KEYS, HOURLY_COUNTERS, hourly)
+        increment(DailyItemSales, ITEM_KEYS, ITEM_COUNTERS, items)
+    except DatabaseError:
+        # The order stands either way; rebuild_sales_rollups repairs the totals.
+        logger.warning('sales_rollups.failed', exc_info=True, extra={'fields': {
+            'restaurants': sorted({str(key[0]) for key in [*hourly, *items]}),
+        }})
+
+
+def _record(hourly, items=None):
+    # After commit, so the upserts never hold rollup rows locked for the length
+    # of an order transaction, nor fail it.
+    hourly, items = dict(hourly), dict(items or {})
+    transaction.on_commit(lambda: _apply(hourly, items))
+
+
+@receiver(order_created)
+def record_order_created(sender, order, **kwargs):
+    hourly = {(order.restaurant_id, hour_bucket(order.created_at)): {'orders': 1, 'revenue': order.total_amount}}
+    items = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0')})
+    day = day_bucket(order.created_at)
+    for line in order.items.all():
+        delta = items[(order.restaurant_id, day, line.menu_item_id)]
+        delta['quantity'] += line.quantity
+        delta['revenue'] += line.subtotal
+    _record(hourly, items)
+
+
+@receiver(order_status_changed)
+def record_status_changed(sender, restaurant_id, order_ids, status, **kwargs):
+    if status == 'served':
+        hourly = defaultdict(lambda: {'served': 0})
+        for created_at in Order.objects.filter(id__in=order_ids).values_list('created_at', flat=True):
+            hourly[(restaurant_id, hour_bucket(created_at))]['served'] += 1
+        _record(hourly)
+    elif status == 'cancelled':
+        # Orders always have lines, so one query over the lines covers both tables.
+        hourly = defaultdict(lambda: {'cancelled': 0, 'revenue': Decimal('0')})
+        items = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0')})
+        seen = set()
+        lines = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+            'order_id', 'order__created_at', 'order__total_amount', 'menu_item_id', 'quantity', 'unit_price'
+        )
+        for order_id, created_at, total_amount, menu_item_id, quantity, unit_price in lines:
+            if order_id not in seen:
+                seen.add(order_id)
+                delta = hourly[(restaurant_id, hour_bucket(created_at))]
+                delta['cancelled'] += 1
+                delta['revenue'] -= total_amount
+            delta = items[(restaurant_id, day_bucket(created_at), menu_item_id)]
+            delta['quantity'] -= quantity
+            delta['revenue'] -= quantity * unit_price
+        _record(hourly, items)
+
+
+def rebuild(restaurant_ids=None, since=None, batch_size=2000):
+    """Recompute the rollups from raw orders, archived ones included; ``since`` is a local date.
+
+    Returns the number of hourly and item rows written.
+    """
+    orders = OrderHistory.objects.all()
+    lines = OrderItemHistory.objects.exclude(order__status='cancelled')
+    hourly_rows = HourlySales.objects.all()
+    item_rows = DailyItemSales.objects.all()
+    if restaurant_ids is not None:
+        orders = orders.filter(restaurant_id__in=restaurant_ids)
+        lines = lines.filter(order__restaurant_id__in=restaurant_ids)
+        hourly_rows = hourly_rows.filter(restaurant_id__in=restaurant_ids)
+        item_rows = item_rows.filter(restaurant_id__in=restaurant_ids)
+    if since is not None:
+        start = day_range(since, since)[0]
+        orders = orders.filter(created_at__gte=start)
+        lines = lines.filter(order__created_at__gte=start)
+        hourly_rows = hourly_rows.filter(hour__gte=start)
+        item_rows = item_rows.filter(date__gte=since)
+
+    hours = orders.annotate(bucket=TruncHour('created_at')).values('restaurant_id', 'bucket').annotate(
+        placed=Count('id'),
+        served_count=Count('id', filter=Q(status='served')),
+        cancelled_count=Count('id', filter=Q(status='cancelled')),
+        sales=Sum('total_amount', filter=~Q(status='cancelled'), default=0),
+    ).order_by()
+    days = lines.annotate(day=TruncDate('order__created_at')).values(
+        'order__restaurant_id', 'day', 'menu_item_id'
+    ).annotate(
+        sold=Sum('quantity'),
+        sales=Sum(F('quantity') * F('unit_price')),
+    ).order_by()
+
+    with transaction.atomic():
+        hourly_rows.delete()
+        item_rows.delete()
+        HourlySales.objects.bulk_create(
+            (
+                HourlySales(
+                    restaurant_id=row['restaurant_id'], hour=row['bucket'], orders=row['placed'],
+                    served=row['served_count'], cancelled=row['cancelled_count'], revenue=row['sales'],
+                )
+                for row in hours.iterator()
+            ),
+            batch_size=batch_size
+        )
+        DailyItemSales.objects.bulk_create(
+            (
+                DailyItemSales(
+                    restaurant_id=row['order__restaurant_id'], date=row['day'], menu_item_id=row['menu_item_id'],
+                    quantity=row['sold'], revenue=row['sales'],
+                )
+                for row in days.iterator()
+            ),
+            batch_size=batch_size
+        )
+    return hourly_rows.count(), item_rows.count()
+
+
+def sales_summary(restaurant, start, end, top=10):
+    """Per-day totals, orders per hour of day and the best sellers between two local dates."""
+    lower, upper = day_range(start, end)
+    hours = HourlySales.objects.filter(restaurant=restaurant, hour__gte=lower, hour__lt=upper)
+    totals = dict(placed=Sum('orders'), served_count=Sum('served'), cancelled_count=Sum('cancelled'), sales=Sum('revenue'))
+
+    days = [
+        {
+            'date': row['day'],
+            'orders': row['placed'],
+            'served': row['served_count'],
+            'cancelled': row['cancelled_count'],
+            'revenue': _money.to_representation(row['sales']),
+        }
+        for row in hours.annotate(day=TruncDate('hour')).values('day').annotate(**totals).order_by('day')
+    ]
+    by_hour = {
+        row['hour_of_day']: row
+        for row in hours.annotate(hour_of_day=ExtractHour('hour')).values('hour_of_day').annotate(
+            placed=Sum('orders'), sales=Sum('revenue')
+        ).order_by()
+    }
+    top_items = DailyItemSales.objects.filter(
+        restaurant=restaurant, date__gte=start, date__lte=end
+    ).values('menu_item_id', 'menu_item__name').annotate(
+        sold=Sum('quantity'), sales=Sum('revenue')
+    ).filter(sold__gt=0).order_by('-sold', '-sales', 'menu_item__name')[:top]
+
+    return {
+        'from': start,
+        'to': end,
+        'days': days,
+        'hours': [
+            {
+                'hour': hour,
+                'orders': by_hour[hour]['placed'] if hour in by_hour else 0,
+                'revenue': _money.to_representation(by_hour[hour]['sales'] if hour in by_hour else 0),
+            }
+            for hour in range(24)
+        ],
+        'top_items': [
+            {
+                'menu_item_id': row['menu_item_id'],
+                'name': row['menu_item__name'],
+                'quantity': row['sold'],
+                'revenue': _money.to_representation(row['sales']),
+            }
+            for row in top_items
+        ],
+    }
@@ -1,5 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
+from . import eta
 from .models import Order, OrderItem
+from menu.models import MenuItem
 from menu.serializers import MenuItemSerializer
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -23,9 +26,10 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = [
             'id', 'customer_name', 'status', 'total_amount', 'special_instructions',
-            'table_number', 'items', 'created_at', 'updated_at'
+            'table_number', 'items', 'estimated_ready_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'total_amount', 'created_at', 'updated_at']
+        # Status only moves through the status endpoints, which enforce Order.TRANSITIONS.
+        read_only_fields = ['id', 'status', 'total_amount', 'estimated_ready_at', 'created_at', 'updated_at']
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
@@ -42,31 +46,74 @@ class OrderSerializer(serializers.ModelSerializer):
         order.calculate_total()
         return order
 
+class OrderStatusSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    # The status the client last saw; the update only applies if it still holds.
+    expected_status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+
+    def validate(self, data):
+        expected = data.get('expected_status')
+        if expected is not None and not Order.can_transition(expected, data['status']):
+            raise serializers.ValidationError(f"Cannot move an order from {expected} to {data['status']}.")
+        if expected is None and not Order.sources_for(data['status']):
+            raise serializers.ValidationError(f"Orders cannot be moved to {data['status']}.")
+        return data
+
+class OrderStatusBulkSerializer(OrderStatusSerializer):
+    order_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=200)
+
 class OrderCreateSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    # Orders always have lines; the sales rollups count cancellations through them.
+    items = OrderItemSerializer(many=True, allow_empty=False)
     
     class Meta:
         model = Order
         fields = ['customer_name', 'special_instructions', 'items']
 
+    def validate_items(self, items):
+        """Check every menu item in one query and keep them for pricing."""
+        table = self.context['table']
+        menu_item_ids = {item['menu_item_id'] for item in items}
+        self.menu_items = MenuItem.objects.filter(
+            id__in=menu_item_ids,
+            restaurant_id=table.restaurant_id,
+            is_available=True
+        ).in_bulk()
+
+        missing = menu_item_ids - set(self.menu_items)
+        if missing:
+            raise serializers.ValidationError([
+                f"Menu item {menu_item_id} is not available." for menu_item_id in sorted(map(str, missing))
+            ])
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         table = self.context['table']
         restaurant = table.restaurant
-        
-        order = Order.objects.create(
-            restaurant=restaurant,
-            table=table,
-            **validated_data
-        )
-        
+
+        order_items = []
         for item_data in items_data:
-            menu_item_id = item_data.pop('menu_item_id')
-            OrderItem.objects.create(
-                order=order,
-                menu_item_id=menu_item_id,
+            menu_item = self.menu_items[item_data.pop('menu_item_id')]
+            order_items.append(OrderItem(
+                menu_item=menu_item,
+                unit_price=menu_item.price,
                 **item_data
+            ))
+
+        estimated_ready_at = eta.estimate(
+            restaurant.id, [(item.menu_item.preparation_time, item.quantity) for item in order_items]
+        )
+        with transaction.atomic():
+            order = Order.objects.create(
+                restaurant=restaurant,
+                table=table,
+                total_amount=sum(item.subtotal for item in order_items),
+                estimated_ready_at=estimated_ready_at,
+                **validated_data
             )
-        
-        order.calculate_total()
-        return order
\ No newline at end of file
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+
+        return order
@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# Sent once an order and its lines have been written. Arguments: ``order``.
+order_created = Signal()
+
+# Sent after orders moved to a new status. Arguments: ``restaurant_id``,
+# ``order_ids``, ``status`` and ``updated_at``.
+order_status_changed = Signal()
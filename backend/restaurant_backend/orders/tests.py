@@ -1,3 +1,854 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import AsyncClient, Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from menu.models import Category, MenuItem
+from restaurant_backend.instrumentation import QueryBudgetTestMixin
+from restaurants import resolver
+from restaurants.models import Restaurant, Table
+from . import archive, eta, events, intake, kitchen, rollups, views
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, DailyItemSales, HourlySales, Order, OrderHistory, OrderIntake, OrderItem,
+)
+from .rendering import ORDER_VALUES, render_orders
+from .serializers import OrderSerializer
+
+
+class OrderFixtureMixin:
+    def setUp(self):
+        resolver.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.restaurant = Restaurant.objects.create(
+            owner=self.owner, name='Demo', address='Main St', phone='000', email='demo@example.com'
+        )
+        self.table = Table.objects.create(restaurant=self.restaurant, table_number='1', capacity=4)
+        self.category = Category.objects.create(restaurant=self.restaurant, name='Pizza')
+        self.items = [
+            MenuItem.objects.create(
+                restaurant=self.restaurant, category=self.category, name=f'Pizza {i}',
+                description='', price=Decimal('10.00') + i, preparation_time=10 + i
+            )
+            for i in range(10)
+        ]
+        self.order_url = reverse('create-order', args=[self.table.qr_code])
+
+    def order_payload(self, lines):
+        return {
+            'customer_name': 'Alice',
+            'items': [
+                {'menu_item_id': str(item.id), 'quantity': quantity}
+                for item, quantity in lines
+            ],
+        }
+
+    def place_order(self, lines):
+        return self.client.post(self.order_url, self.order_payload(lines), format='json')
+
+
+class CreateOrderTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def test_large_order_within_budget(self):
+        response = self.place_order([(item, 2) for item in self.items])
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinQueryBudget(response)
+
+    def test_status_update_within_budget(self):
+        order_id = self.place_order([(item, 1) for item in self.items]).json()['id']
+        self.client.force_authenticate(self.owner)
+        response = self.client.patch(
+            reverse('update-order-status', args=[order_id]), {'status': 'confirmed'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_order_without_items_is_rejected(self):
+        response = self.place_order([])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.json())
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_is_priced_from_menu(self):
+        response = self.place_order([(self.items[0], 2), (self.items[3], 1)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_amount'], '33.00')
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, Decimal('33.00'))
+        self.assertEqual(
+            sorted(order.items.values_list('unit_price', flat=True)),
+            [Decimal('10.00'), Decimal('13.00')]
+        )
+
+    def test_query_count_does_not_grow_with_lines(self):
+        self.place_order([(self.items[0], 1)])
+
+        with CaptureQueriesContext(connection) as one_line:
+            self.place_order([(self.items[0], 1)])
+        with CaptureQueriesContext(connection) as ten_lines:
+            self.place_order([(item, 1) for item in self.items])
+
+        self.assertEqual(len(one_line), len(ten_lines))
+
+    def test_unavailable_item_is_rejected(self):
+        self.items[1].is_available = False
+        self.items[1].save()
+
+        response = self.place_order([(self.items[0], 1), (self.items[1], 1)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.json())
+        self.assertFalse(Order.objects.exists())
+
+    def test_item_from_other_restaurant_is_rejected(self):
+        other = Restaurant.objects.create(
+            owner=self.owner, name='Other', address='x', phone='1', email='o@example.com'
+        )
+        foreign = MenuItem.objects.create(
+            restaurant=other,
+            category=Category.objects.create(restaurant=other, name='Misc'),
+            name='Foreign', description='', price=Decimal('1.00'), preparation_time=1
+        )
+
+        response = self.place_order([(foreign, 1)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class AsyncCreateOrderTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def post(self, lines, headers=None):
+        return async_to_sync(AsyncClient().post)(
+            self.order_url, self.order_payload(lines), content_type='application/json', headers=headers
+        )
+
+    def test_order_created_within_budget(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post([(self.items[0], 2)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_amount'], '20.00')
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(HourlySales.objects.get().orders, 1)
+
+    def test_validation_errors_and_unknown_tables(self):
+        self.items[0].is_available = False
+        self.items[0].save()
+        self.assertEqual(self.post([(self.items[0], 1)]).status_code, 400)
+
+        self.order_url = reverse('create-order', args=['00000000-0000-0000-0000-000000000000'])
+        self.assertEqual(self.post([(self.items[1], 1)]).status_code, 404)
+
+    def test_idempotent_replay(self):
+        first = self.post([(self.items[0], 1)], headers={'Idempotency-Key': 'async-1'})
+        again = self.post([(self.items[0], 1)], headers={'Idempotency-Key': 'async-1'})
+
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again['Idempotent-Replayed'], 'true')
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class OrderStatusTransitionTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order_ids = [self.place_order([(self.items[0], 1)]).json()['id'] for _ in range(3)]
+        self.client.force_authenticate(self.owner)
+        self.bulk_url = reverse('restaurant-order-status', args=[self.restaurant.id])
+
+    def patch(self, order_id, data):
+        return self.client.patch(reverse('update-order-status', args=[order_id]), data, format='json')
+
+    def test_update_writes_only_status(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch(self.order_ids[0], {'status': 'confirmed', 'expected_status': 'pending'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'confirmed')
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE'))
+        self.assertNotIn('total_amount', update)
+        self.assertNotIn('customer_name', update)
+
+    def test_disallowed_transition_is_rejected(self):
+        Order.objects.filter(id=self.order_ids[0]).update(status='served')
+
+        self.assertEqual(self.patch(self.order_ids[0], {'status': 'pending'}).status_code, 400)
+        response = self.patch(self.order_ids[0], {'status': 'cancelled'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'served')
+
+    def test_stale_expected_status_conflicts(self):
+        self.patch(self.order_ids[0], {'status': 'confirmed', 'expected_status': 'pending'})
+
+        response = self.patch(self.order_ids[0], {'status': 'cancelled', 'expected_status': 'pending'})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.get(id=self.order_ids[0]).status, 'confirmed')
+
+    def test_bulk_update_is_one_update(self):
+        Order.objects.filter(id__in=self.order_ids).update(status='ready')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.bulk_url, {'status': 'served', 'order_ids': self.order_ids}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        # Besides the sales rollup upkeep, the whole batch is a single statement.
+        self.assertEqual(
+            len([query for query in queries if query['sql'].startswith('UPDATE "orders_order"')]), 1
+        )
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "orders_order"."id"')])
+        self.assertEqual(len(response.json()['updated']), 3)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'served'})
+
+    def test_bulk_update_reports_conflicts(self):
+        Order.objects.filter(id__in=self.order_ids[:2]).update(status='ready')
+        unknown = '00000000-0000-4000-8000-000000000000'
+
+        response = self.client.post(
+            self.bulk_url, {'status': 'served', 'order_ids': self.order_ids + [unknown]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 409)
+        body = response.json()
+        self.assertEqual(body['updated'], self.order_ids[:2])
+        self.assertEqual(body['conflicts'], [{'id': self.order_ids[2], 'status': 'pending'}])
+        self.assertEqual(body['not_found'], [unknown])
+        self.assertWithinQueryBudget(response)
+
+
+class KitchenCookNowTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        kitchen.clear()
+        self.first = self.place_order([(self.items[0], 2), (self.items[1], 1)]).json()['id']
+        self.second = self.place_order([(self.items[0], 3)]).json()['id']
+        served = self.place_order([(self.items[2], 5)]).json()['id']
+        Order.objects.filter(id=served).update(status='served')
+        Order.objects.filter(id=self.second).update(status='preparing')
+        self.client.force_authenticate(self.owner)
+        self.url = reverse('restaurant-kitchen', args=[self.restaurant.id])
+
+    def test_totals_per_item(self):
+        response = self.client.get(self.url)
+        self.assertWithinQueryBudget(response)
+        data = response.json()
+        self.assertEqual([item['name'] for item in data['items']], ['Pizza 0', 'Pizza 1'])
+        pizza = data['items'][0]
+        self.assertEqual(pizza['quantity'], 5)
+        self.assertEqual(pizza['by_status'], {'pending': 2, 'confirmed': 0, 'preparing': 3})
+        self.assertEqual(pizza['tickets'], 2)
+        self.assertEqual(pizza['preparation_minutes'], 50)
+        self.assertEqual(data['totals']['quantity'], 6)
+        self.assertEqual(data['totals']['preparation_minutes'], 61)
+        self.assertGreaterEqual(data['totals']['oldest_ticket_age_seconds'], 0)
+
+    def test_cached_until_orders_change(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+        self.client.post(
+            reverse('restaurant-order-status', args=[self.restaurant.id]),
+            {'status': 'cancelled', 'order_ids': [self.first, self.second]}, format='json'
+        )
+        self.assertEqual(self.client.get(self.url).json()['items'], [])
+
+        self.place_order([(self.items[3], 4)])
+        self.assertEqual(self.client.get(self.url).json()['totals']['quantity'], 4)
+
+    def test_only_the_owner(self):
+        other = User.objects.create_user('other', password='pw')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+@override_settings(ORDER_ETA={'STATIONS': 1, 'RESYNC_SECONDS': 60})
+class OrderEtaTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        eta.clear()
+
+    def place_order(self, lines):
+        # Orders join the ETA queue on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().place_order(lines)
+
+    def ready_in(self, response):
+        created = Order.objects.get(id=response.json()['id'])
+        self.assertEqual(parse_datetime(response.json()['estimated_ready_at']), created.estimated_ready_at)
+        return (created.estimated_ready_at - created.created_at).total_seconds() / 60
+
+    def test_estimate_counts_the_queue_ahead(self):
+        # Pizza 0 takes 10 minutes, Pizza 1 11 and Pizza 2 12.
+        first = self.place_order([(self.items[0], 2)])
+        self.assertAlmostEqual(self.ready_in(first), 10, places=1)
+        second = self.place_order([(self.items[1], 1), (self.items[2], 1)])
+        self.assertAlmostEqual(self.ready_in(second), 20 + 12, places=1)
+
+        self.client.force_authenticate(self.owner)
+        self.client.post(
+            reverse('restaurant-order-status', args=[self.restaurant.id]),
+            {'status': 'cancelled', 'order_ids': [first.json()['id']]}, format='json'
+        )
+        self.client.logout()
+        self.assertAlmostEqual(self.ready_in(self.place_order([(self.items[0], 1)])), 23 + 10, places=1)
+
+    def test_queue_is_kept_incrementally(self):
+        self.place_order([(self.items[0], 1)])
+        now = timezone.now()
+        with self.assertNumQueries(0):
+            ready_at = eta.estimate(self.restaurant.id, [(5, 1)], now=now)
+        self.assertEqual(ready_at, now + timedelta(minutes=15))
+
+    def test_estimate_on_reads(self):
+        created = self.place_order([(self.items[0], 1)]).json()
+        self.client.force_authenticate(self.owner)
+        listed = self.client.get(reverse('restaurant-orders', args=[self.restaurant.id])).json()['results'][0]
+        self.assertEqual(listed['estimated_ready_at'], created['estimated_ready_at'])
+
+    @override_settings(ORDER_INTAKE={'MODE': 'queue', 'BATCH_SIZE': 10})
+    def test_drained_batch_queues_up(self):
+        self.place_order([(self.items[0], 1)])
+        self.place_order([(self.items[0], 1)])
+        intake.drain()
+
+        first, second = Order.objects.order_by('estimated_ready_at')
+        self.assertAlmostEqual((second.estimated_ready_at - first.estimated_ready_at).total_seconds(), 600, delta=5)
+
+    @override_settings(ORDER_INTAKE={'MODE': 'queue', 'BATCH_SIZE': 10})
+    def test_failed_batch_leaves_queue_alone(self):
+        self.place_order([(self.items[0], 3)])
+        with mock.patch('orders.intake.OrderItem.objects.bulk_create', side_effect=IntegrityError('lines')):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(intake.drain(), (0, 1))
+        self.assertEqual(eta.get_queue(self.restaurant.id).backlog, 0)
+
+class SalesRollupTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order_ids = [
+            self.place_order([(self.items[0], 2), (self.items[1], 1)]).json()['id'],
+            self.place_order([(self.items[0], 1)]).json()['id'],
+            self.place_order([(self.items[2], 3)]).json()['id'],
+        ]
+        self.client.force_authenticate(self.owner)
+
+    def place_order(self, lines):
+        # The rollups are bumped on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().place_order(lines)
+
+    def snapshot(self):
+        return (
+            sorted(HourlySales.objects.values_list('restaurant_id', 'hour', 'orders', 'served', 'cancelled', 'revenue')),
+            sorted(
+                DailyItemSales.objects.filter(quantity__gt=0)
+                .values_list('restaurant_id', 'date', 'menu_item_id', 'quantity', 'revenue')
+            ),
+        )
+
+    def test_rollups_follow_orders_and_match_rebuild(self):
+        Order.objects.filter(id=self.order_ids[0]).update(status='ready')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('restaurant-order-status', args=[self.restaurant.id]),
+                {'status': 'served', 'order_ids': [self.order_ids[0]]}, format='json'
+            )
+            self.client.patch(
+                reverse('update-order-status', args=[self.order_ids[2]]), {'status': 'cancelled'}, format='json'
+            )
+
+        hourly = HourlySales.objects.get()
+        self.assertEqual((hourly.orders, hourly.served, hourly.cancelled), (3, 1, 1))
+        self.assertEqual(hourly.revenue, Decimal('41.00'))
+        self.assertEqual(DailyItemSales.objects.get(menu_item=self.items[0]).quantity, 3)
+        self.assertEqual(DailyItemSales.objects.get(menu_item=self.items[2]).quantity, 0)
+
+        incremental = self.snapshot()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_failed_rollup_does_not_fail_the_order(self):
+        with mock.patch('orders.rollups.increment', side_effect=DatabaseError('deadlock detected')):
+            with self.assertLogs('orders.rollups', 'WARNING') as logs:
+                response = self.place_order([(self.items[3], 1)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Order.objects.filter(id=response.json()['id']).exists())
+        self.assertEqual(logs.records[0].getMessage(), 'sales_rollups.failed')
+        self.assertEqual(HourlySales.objects.get().orders, 3)
+
+        rollups.rebuild()
+        self.assertEqual(HourlySales.objects.get().orders, 4)
+
+    def test_sales_api_reads_rollups(self):
+        response = self.client.get(reverse('restaurant-sales', args=[self.restaurant.id]), {'top': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+        body = response.json()
+        self.assertEqual(body['days'][-1]['orders'], 3)
+        self.assertEqual(body['days'][-1]['revenue'], '77.00')
+        self.assertEqual(sum(hour['orders'] for hour in body['hours']), 3)
+        self.assertEqual(
+            [(item['name'], item['quantity']) for item in body['top_items']],
+            [('Pizza 2', 3), ('Pizza 0', 3)]
+        )
+
+    def test_budgets_hold_with_jwt_auth(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.owner)}')
+        for name in ('restaurant-sales', 'restaurant-kitchen'):
+            response = client.get(reverse(name, args=[self.restaurant.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinQueryBudget(response)
+
+    def test_sales_api_is_owner_only(self):
+        self.client.force_authenticate(User.objects.create_user('other', password='pw'))
+        response = self.client.get(reverse('restaurant-sales', args=[self.restaurant.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderArchiveTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        old = timezone.now() - timedelta(days=120)
+        self.order_ids = [
+            self.place_order([(self.items[0], 2), (self.items[1], 1)]).json()['id'],
+            self.place_order([(self.items[2], 1)]).json()['id'],
+            self.place_order([(self.items[3], 1)]).json()['id'],
+            self.place_order([(self.items[4], 1)]).json()['id'],
+        ]
+        # Old served, old cancelled, old but still open, recent served.
+        for order_id, status, created_at in zip(
+            self.order_ids, ['served', 'cancelled', 'preparing', 'served'], [old, old, old, timezone.now()]
+        ):
+            Order.objects.filter(id=order_id).update(status=status, created_at=created_at)
+        self.old_final = {str(order_id) for order_id in self.order_ids[:2]}
+
+    def test_archive_moves_only_old_finished_orders(self):
+        moved = archive.archive(size=1)
+
+        self.assertEqual(moved, (2, 3))
+        self.assertEqual({str(order.id) for order in ArchivedOrder.objects.all()}, self.old_final)
+        self.assertEqual({str(order_id) for order_id in Order.objects.values_list('id', flat=True)}, set(self.order_ids[2:]))
+        self.assertFalse(OrderItem.objects.filter(order_id__in=self.old_final).exists())
+        archived = ArchivedOrder.objects.get(id=self.order_ids[0])
+        self.assertEqual((archived.status, archived.total_amount, archived.items.count()), ('served', Decimal('31.00'), 2))
+        self.assertEqual(archive.archive(), (0, 0))
+
+    def test_history_reads_live_and_archived_orders(self):
+        call_command('archive_orders', '--chunk-size', '1', stdout=StringIO())
+
+        history = {str(order.id): order.archived for order in OrderHistory.objects.all()}
+        self.assertEqual(set(history), set(self.order_ids))
+        self.assertEqual({order_id for order_id, archived in history.items() if archived}, self.old_final)
+        order = OrderHistory.objects.get(id=self.order_ids[0])
+        self.assertEqual(sorted(order.items.values_list('quantity', flat=True)), [1, 2])
+        self.assertEqual(order.restaurant, self.restaurant)
+
+    def test_rollup_rebuild_includes_archived_orders(self):
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        before = sorted(HourlySales.objects.values_list('hour', 'orders', 'served', 'cancelled', 'revenue'))
+
+        archive.archive()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+        self.assertEqual(ArchivedOrderItem.objects.count(), 3)
+        self.assertEqual(sorted(HourlySales.objects.values_list('hour', 'orders', 'served', 'cancelled', 'revenue')), before)
+
+    def test_dry_run_moves_nothing(self):
+        out = StringIO()
+        call_command('archive_orders', '--dry-run', stdout=out)
+
+        self.assertIn('2 orders would be archived', out.getvalue())
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_admin_lists_archived_history(self):
+        archive.archive()
+        admin = User.objects.create_superuser('admin', password='pw')
+        client = Client()
+        client.force_login(admin)
+
+        listing = client.get(reverse('admin:orders_orderhistory_changelist'), {'archived__exact': '1'})
+        detail = client.get(reverse('admin:orders_orderhistory_change', args=[self.order_ids[0]]))
+
+        self.assertEqual(listing.status_code, 200)
+        self.assertEqual(listing.context['cl'].result_count, 2)
+        self.assertEqual(detail.status_code, 200)
+
+
+class IdempotencyKeyTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def place_with_key(self, lines, key='tap-1'):
+        return self.client.post(self.order_url, self.order_payload(lines), format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_original_without_queries(self):
+        first = self.place_with_key([(self.items[0], 1)])
+        with CaptureQueriesContext(connection) as queries:
+            second = self.place_with_key([(self.items[0], 1)])
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_other_order_is_rejected(self):
+        self.place_with_key([(self.items[0], 1)])
+        response = self.place_with_key([(self.items[1], 1)])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_duplicate_insert_replays_stored_order(self):
+        # Another worker (or an expired cache) has not seen the key.
+        first = self.place_with_key([(self.items[0], 1)])
+        cache.clear()
+        second = self.place_with_key([(self.items[0], 1)])
+
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.place_with_key([(self.items[0], 1)], key='tap-2').status_code, 201)
+
+    def test_key_reused_after_cache_expiry_is_rejected(self):
+        self.place_with_key([(self.items[0], 1)])
+        cache.clear()
+        response = self.place_with_key([(self.items[1], 1)])
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_other_integrity_errors_are_not_replays(self):
+        with mock.patch('orders.views.OrderCreateSerializer.save', side_effect=IntegrityError('other constraint')):
+            with self.assertRaisesMessage(IntegrityError, 'other constraint'):
+                self.place_with_key([(self.items[0], 1)])
+
+    @override_settings(ORDER_INTAKE={'MODE': 'queue'})
+    def test_queued_order_is_not_enqueued_twice(self):
+        first = self.place_with_key([(self.items[0], 1)])
+        cache.clear()
+        second = self.place_with_key([(self.items[0], 1)])
+
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second.json()['reference'], first.json()['reference'])
+        cache.clear()
+        self.assertEqual(self.place_with_key([(self.items[1], 1)]).status_code, 422)
+        intake.drain()
+        self.assertEqual(Order.objects.get().idempotency_key, 'tap-1')
+        cache.clear()
+        self.assertEqual(self.place_with_key([(self.items[1], 1)]).status_code, 422)
+
+
+@override_settings(ORDER_INTAKE={'MODE': 'queue', 'BATCH_SIZE': 2})
+class OrderIntakeTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def test_order_is_queued_then_drained(self):
+        response = self.place_order([(self.items[0], 2), (self.items[1], 1)])
+
+        self.assertEqual(response.status_code, 202)
+        self.assertWithinQueryBudget(response)
+        reference = response.json()['reference']
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(intake.stats()['depth'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(intake.drain(), (1, 0))
+
+        order = Order.objects.get(id=reference)
+        self.assertEqual(order.total_amount, Decimal('31.00'))
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(HourlySales.objects.get().orders, 1)
+        detail = self.client.get(reverse('order-intake-detail', args=[reference])).json()
+        self.assertEqual(detail['status'], 'processed')
+        self.assertEqual(detail['order']['total_amount'], '31.00')
+
+    def test_drain_writes_in_batches(self):
+        for _ in range(5):
+            self.place_order([(self.items[0], 1)])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(intake.drain(), (2, 0))
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "orders_order"')]
+        self.assertEqual(len(inserts), 1)
+
+        call_command('drain_order_intake', '--once', stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual(intake.stats()['depth'], 0)
+
+    def test_vanished_menu_item_fails_entry(self):
+        reference = self.place_order([(self.items[0], 1)]).json()['reference']
+        menu_item_id = str(self.items[0].id)
+        self.items[0].delete()
+
+        self.assertEqual(intake.drain(), (0, 1))
+
+        self.assertFalse(Order.objects.exists())
+        detail = self.client.get(reverse('order-intake-detail', args=[reference])).json()
+        self.assertEqual(detail['status'], 'failed')
+        self.assertIn(menu_item_id, detail['error'])
+
+    def test_unavailable_or_foreign_menu_item_fails_entry(self):
+        unavailable = self.place_order([(self.items[0], 1)]).json()['reference']
+        foreign = self.place_order([(self.items[1], 1)]).json()['reference']
+        MenuItem.objects.filter(pk=self.items[0].pk).update(is_available=False)
+        other = Restaurant.objects.create(
+            owner=self.owner, name='Other', address='Side St', phone='001', email='other@example.com'
+        )
+        MenuItem.objects.filter(pk=self.items[1].pk).update(restaurant=other)
+
+        self.assertEqual(intake.drain(), (0, 2))
+
+        self.assertFalse(Order.objects.exists())
+        self.assertIn('no longer available', OrderIntake.objects.get(pk=unavailable).error)
+        self.assertIn('no longer exist', OrderIntake.objects.get(pk=foreign).error)
+
+    def test_failed_insert_only_fails_its_entry(self):
+        first = self.place_order([(self.items[0], 1)]).json()['reference']
+        second = self.place_order([(self.items[1], 1)]).json()['reference']
+        # An order already stored under the first reference makes its insert fail.
+        Order.objects.create(id=first, restaurant=self.restaurant, table=self.table, customer_name='Bob')
+
+        self.assertEqual(intake.drain(), (1, 1))
+
+        self.assertTrue(Order.objects.filter(pk=second, items__isnull=False).exists())
+        self.assertEqual(OrderIntake.objects.get(pk=first).status, 'failed')
+        self.assertEqual(OrderIntake.objects.get(pk=second).status, 'processed')
+
+
+class OrderEventTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = events.InMemoryBroker(history=3)
+        patcher = mock.patch.object(events, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create_order_publishes_event_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place_order([(self.items[0], 1)])
+
+        [event] = self.broker._history[str(self.restaurant.id)]
+        self.assertEqual(event['type'], events.ORDER_CREATED)
+        self.assertEqual(event['data']['table_number'], '1')
+
+    def test_resume_from_last_event_id(self):
+        first = self.broker.publish(self.restaurant.id, events.ORDER_CREATED, {'n': 1})
+        self.broker.publish(self.restaurant.id, events.ORDER_CREATED, {'n': 2})
+
+        backlog = self.broker.subscribe(self.restaurant.id, first['id'], live=False).backlog
+        self.assertEqual([event['data'] for event in backlog], [{'n': 2}])
+
+    def test_trimmed_history_asks_client_to_reset(self):
+        first = self.broker.publish(self.restaurant.id, events.ORDER_CREATED, {})
+        for _ in range(4):
+            self.broker.publish(self.restaurant.id, events.ORDER_CREATED, {})
+
+        [event] = self.broker.subscribe(self.restaurant.id, first['id'], live=False).backlog
+        self.assertEqual(event['type'], events.STREAM_RESET)
+
+    def test_live_subscriber_receives_events(self):
+        async def consume():
+            stream = events.stream_events(self.restaurant.id)
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            pending = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+            await asyncio.to_thread(
+                self.broker.publish, self.restaurant.id, events.ORDER_STATUS_CHANGED, {'status': 'ready'}
+            )
+            message = await asyncio.wait_for(pending, 1)
+            await stream.aclose()
+            return message
+
+        message = asyncio.run(consume())
+        self.assertIn('event: order.status_changed', message)
+        self.assertIn('"status":"ready"', message)
+
+    def test_stream_endpoint_replays_missed_events(self):
+        first = self.broker.publish(self.restaurant.id, events.ORDER_CREATED, {'n': 1})
+        self.broker.publish(self.restaurant.id, events.ORDER_CREATED, {'n': 2})
+        self.client.force_authenticate(self.owner)
+
+        response = self.client.get(
+            reverse('restaurant-order-events', args=[self.restaurant.id]),
+            HTTP_ACCEPT='text/event-stream',
+            HTTP_LAST_EVENT_ID=str(first['id'])
+        )
+
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('data: {"n":2}', body)
+        self.assertNotIn('data: {"n":1}', body)
+
+
+class RestaurantOrdersPaginationTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(5):
+            self.place_order([(self.items[0], 1)])
+        self.client.force_authenticate(self.owner)
+        self.list_url = reverse('restaurant-orders', args=[self.restaurant.id])
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.json()['count'], 5)
+        self.assertWithinQueryBudget(response)
+
+    def test_cursor_pages_walk_history_without_counting(self):
+        expected = [str(pk) for pk in Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)]
+        seen = []
+        url = f'{self.list_url}?pagination=cursor&page_size=2'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                data = self.client.get(url).json()
+                seen += [order['id'] for order in data['results']]
+                url = data['next']
+
+        self.assertEqual(seen, expected)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(f'{self.list_url}?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class RestaurantOrderChangesTests(OrderFixtureMixin, QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.owner)
+        self.changes_url = reverse('restaurant-order-changes', args=[self.restaurant.id])
+        # Exact watermarks; test_recent_changes_are_sent_again covers the lag.
+        lag = mock.patch.object(views.RestaurantOrderChangesView, 'commit_lag', timedelta(0))
+        lag.start()
+        self.addCleanup(lag.stop)
+        self.first = self.place_order([(self.items[0], 1)]).json()
+        self.second = self.place_order([(self.items[1], 1)]).json()
+
+    def sync(self, **params):
+        return self.client.get(self.changes_url, params).json()
+
+    def test_snapshot_then_only_changes(self):
+        snapshot = self.sync(status='pending')
+        self.assertEqual({order['id'] for order in snapshot['orders']}, {self.first['id'], self.second['id']})
+
+        unchanged = self.sync(status='pending', since=snapshot['watermark'])
+        self.assertEqual(unchanged['orders'], [])
+        self.assertEqual(unchanged['watermark'], snapshot['watermark'])
+
+        third = self.place_order([(self.items[2], 1)]).json()
+        delta = self.sync(status='pending', since=snapshot['watermark'])
+        self.assertEqual([order['id'] for order in delta['orders']], [third['id']])
+
+    def test_orders_leaving_the_filter_become_tombstones(self):
+        watermark = self.sync(status='pending')['watermark']
+        order = Order.objects.get(id=self.first['id'])
+        order.status = 'served'
+        order.save()
+
+        delta = self.sync(status='pending,confirmed', since=watermark)
+        self.assertEqual(delta['orders'], [])
+        self.assertEqual(delta['removed'], [self.first['id']])
+
+    def test_batches_report_has_more(self):
+        watermark = self.sync()['watermark']
+        for _ in range(3):
+            self.place_order([(self.items[0], 1)])
+
+        with mock.patch.object(views.RestaurantOrderChangesView, 'batch_size', 2):
+            first = self.sync(since=watermark)
+            rest = self.sync(since=first['watermark'])
+
+        self.assertTrue(first['has_more'])
+        self.assertEqual(len(first['orders']), 2)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(len(rest['orders']), 1)
+
+    def test_partial_snapshot_continues_after_its_last_order(self):
+        for _ in range(3):
+            self.place_order([(self.items[0], 1)])
+        Order.objects.filter(id=self.second['id']).update(status='served')
+
+        received = []
+        with mock.patch.object(views.RestaurantOrderChangesView, 'batch_size', 2):
+            batch = self.sync(status='pending')
+            received += [order['id'] for order in batch['orders']]
+            while batch['has_more']:
+                batch = self.sync(status='pending', since=batch['watermark'])
+                received += [order['id'] for order in batch['orders']]
+
+        pending = Order.objects.filter(status='pending').values_list('id', flat=True)
+        self.assertEqual(len(received), 4)
+        self.assertEqual(set(received), {str(pk) for pk in pending})
+
+    def test_recent_changes_are_sent_again(self):
+        with mock.patch.object(views.RestaurantOrderChangesView, 'commit_lag', timedelta(seconds=5)):
+            snapshot = self.sync()
+            again = self.sync(since=snapshot['watermark'])
+        # Both orders are younger than the lag, so a late commit among them is not missed.
+        self.assertEqual({order['id'] for order in again['orders']}, {self.first['id'], self.second['id']})
+        self.assertFalse(again['has_more'])
+
+    def test_sync_within_budget(self):
+        self.assertWithinQueryBudget(self.client.get(self.changes_url, {'status': 'pending'}))
+
+    def test_bad_watermark(self):
+        self.assertEqual(self.client.get(self.changes_url, {'since': 'nope'}).status_code, 400)
+
+
+class LeanOrderRenderingTests(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.items[0].image = 'menu_items/margherita.jpg'
+        self.items[0].save()
+        for i in range(20):
+            response = self.place_order([(item, 1 + (i + n) % 3) for n, item in enumerate(self.items[:5])])
+            self.assertEqual(response.status_code, 201)
+        order = Order.objects.first()
+        order.special_instructions = 'No onions'
+        order.status = 'preparing'
+        order.save()
+        self.request = RequestFactory().get('/')
+
+    def serializer_output(self):
+        orders = Order.objects.select_related('table').prefetch_related('items__menu_item')
+        return OrderSerializer(orders, many=True, context={'request': self.request}).data
+
+    def lean_output(self):
+        return render_orders(Order.objects.values(*ORDER_VALUES), self.request)
+
+    def test_output_matches_order_serializer(self):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(self.lean_output()), renderer.render(self.serializer_output()))
+
+    def test_fixed_query_count(self):
+        with self.assertNumQueries(2):
+            self.lean_output()
+
+    def test_list_view_uses_lean_path(self):
+        self.client.force_authenticate(self.owner)
+        url = reverse('restaurant-orders', args=[self.restaurant.id])
+        # count + page rows + lines
+        with self.assertNumQueries(3):
+            data = self.client.get(url).json()
+        self.assertEqual(len(data['results']), 20)
@@ -1,9 +1,17 @@
 from django.urls import path
+from restaurant_backend.asyncviews import public_view
 from . import views
 
 urlpatterns = [
     path('restaurants/<uuid:restaurant_id>/orders/', views.RestaurantOrdersView.as_view(), name='restaurant-orders'),
+    path('restaurants/<uuid:restaurant_id>/orders/changes/', views.RestaurantOrderChangesView.as_view(), name='restaurant-order-changes'),
+    path('restaurants/<uuid:restaurant_id>/orders/status/', views.bulk_update_order_status, name='restaurant-order-status'),
+    path('restaurants/<uuid:restaurant_id>/sales/', views.restaurant_sales, name='restaurant-sales'),
+    path('restaurants/<uuid:restaurant_id>/kitchen/', views.kitchen_cook_now, name='restaurant-kitchen'),
+    path('restaurants/<uuid:restaurant_id>/orders/events/', views.order_events, name='restaurant-order-events'),
     path('orders/<uuid:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('orders/<uuid:order_id>/status/', views.update_order_status, name='update-order-status'),
-    path('qr/<uuid:qr_code>/order/', views.create_order, name='create-order'),
+    path('orders/intake/stats/', views.order_intake_stats, name='order-intake-stats'),
+    path('orders/intake/<uuid:reference>/', views.order_intake_detail, name='order-intake-detail'),
+    path('qr/<uuid:qr_code>/order/', public_view(views.create_order, views.CreateOrderView.as_view()), name='create-order'),
 ]
\ No newline at end of file
@@ -1,52 +1,206 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from rest_framework import generics, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django.shortcuts import get_object_or_404
+from django.db import IntegrityError
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from restaurants.models import Restaurant, Table
-from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderCreateSerializer
+from restaurants.resolver import aresolve_table, resolve_table
+from restaurant_backend.asyncviews import AsyncAPIView
+from restaurant_backend.instrumentation import query_budget
+from restaurant_backend.routing import read_replica
+from . import idempotency, intake, kitchen
+from .models import Order, OrderIntake, OrderItem
+from .serializers import OrderSerializer, OrderCreateSerializer, OrderStatusBulkSerializer, OrderStatusSerializer
+from .pagination import OrderPagination, decode_position, encode_position
+from .renderers import EventStreamRenderer
+from .rendering import ORDER_VALUES, render_orders
+from .events import replay_events, stream_events
+from .rollups import sales_summary
+from .signals import order_created, order_status_changed
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def create_order(request, qr_code):
-    """Create order from customer using QR code"""
-    print(f"[Django][orders.views] create_order called with qr_code={qr_code}, REMOTE_ADDR={request.META.get('REMOTE_ADDR')}, payload={request.data}")
-    
-    try:
-        table = Table.objects.select_related('restaurant').get(
-            qr_code=qr_code,
-            is_active=True,
-            restaurant__is_active=True
-        )
-    except Table.DoesNotExist:
+logger = logging.getLogger(__name__)
+
+def _replay(remembered, request_fingerprint):
+    status_code, data, original_fingerprint = remembered
+    if original_fingerprint is not None and original_fingerprint != request_fingerprint:
         return Response(
-            {'error': 'Invalid QR code'}, 
-            status=status.HTTP_404_NOT_FOUND
+            {'error': 'Idempotency-Key was already used for a different order'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
         )
+    return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'})
+
+def _stored_response(table, key):
+    """``(status_code, data, fingerprint)`` of the original response for ``key``, rebuilt from
+    the database, or None when nothing was stored under it."""
+    order = Order.objects.filter(table=table, idempotency_key=key).select_related('table').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+    ).first()
+    if order is not None:
+        return status.HTTP_201_CREATED, OrderSerializer(order).data, order.idempotency_fingerprint or None
+    entry = OrderIntake.objects.filter(table=table, idempotency_key=key).first()
+    if entry is None:
+        return None
+    return status.HTTP_202_ACCEPTED, {'reference': entry.id, 'status': 'queued'}, entry.idempotency_fingerprint or None
+
+def _log_order(request, qr_code):
+    # Never log the payload: it carries customer names and instructions.
+    logger.info('order.create', extra={'fields': {
+        'qr_code': str(qr_code),
+        'lines': len(request.data.get('items') or []) if hasattr(request.data, 'get') else None,
+    }})
+
+def _invalid_key():
+    return Response(
+        {'error': 'Invalid Idempotency-Key'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
 
+def _invalid_qr_code():
+    return Response(
+        {'error': 'Invalid QR code'}, 
+        status=status.HTTP_404_NOT_FOUND
+    )
+
+def _place_order(qr_code, table, data, key, request_fingerprint):
+    """Validate ``data`` and write (or queue) the order; the database half of create_order."""
     serializer = OrderCreateSerializer(
-        data=request.data,
+        data=data,
         context={'table': table}
     )
     
-    if serializer.is_valid():
-        order = serializer.save()
-        response_serializer = OrderSerializer(order)
+    if not serializer.is_valid():
         return Response(
-            response_serializer.data, 
-            status=status.HTTP_201_CREATED
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
         )
-    
-    return Response(
-        serializer.errors, 
-        status=status.HTTP_400_BAD_REQUEST
-    )
+
+    try:
+        if intake.is_enabled():
+            entry = intake.enqueue(
+                serializer, idempotency_key=key or None, idempotency_fingerprint=request_fingerprint or ''
+            )
+            status_code, data = status.HTTP_202_ACCEPTED, {'reference': entry.id, 'status': entry.status}
+        else:
+            order = serializer.save(idempotency_key=key or None, idempotency_fingerprint=request_fingerprint or '')
+            # Prefetch before signalling so receivers can read the lines for free.
+            prefetch_related_objects(
+                [order],
+                Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+            )
+            order_created.send(sender=Order, order=order)
+            status_code, data = status.HTTP_201_CREATED, OrderSerializer(order).data
+    except IntegrityError:
+        stored = _stored_response(table, key) if key else None
+        if stored is None:
+            # Not the (table, idempotency_key) constraint.
+            raise
+        # A concurrent or earlier request with the same key won the insert.
+        idempotency.remember(qr_code, key, *stored)
+        return _replay(stored, request_fingerprint)
+
+    if key:
+        idempotency.remember(qr_code, key, status_code, data, request_fingerprint)
+    return Response(data, status=status_code)
+
+# One more than a warm order when the restaurant's ETA queue (re)loads (orders.eta).
+@query_budget(10)
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def create_order(request, qr_code):
+    """Create order from customer using QR code
+
+    In intake queue mode the order is only validated and queued; the response
+    is 202 with the reference to poll at ``order-intake-detail``. Retries that
+    repeat an ``Idempotency-Key`` header get the original response back.
+    """
+    _log_order(request, qr_code)
+
+    key = idempotency.get_key(request)
+    if key is None:
+        return _invalid_key()
+    request_fingerprint = idempotency.fingerprint(request.data) if key else None
+    if key:
+        remembered = idempotency.lookup(qr_code, key)
+        if remembered is not None:
+            return _replay(remembered, request_fingerprint)
+
+    try:
+        table = resolve_table(qr_code)
+    except Table.DoesNotExist:
+        return _invalid_qr_code()
+
+    return _place_order(qr_code, table, request.data, key, request_fingerprint)
+
+class CreateOrderView(AsyncAPIView):
+    """Async ``create_order``.
+
+    Parsing, replays and the table lookup stay on the event loop; validation
+    and the write run in one ``sync_to_async`` call, inside which the
+    transaction and the ``order_created`` receivers work as before.
+    """
+    permission_classes = [AllowAny]
+    query_budget = 10
+
+    async def post(self, request, qr_code):
+        _log_order(request, qr_code)
+
+        key = idempotency.get_key(request)
+        if key is None:
+            return _invalid_key()
+        request_fingerprint = idempotency.fingerprint(request.data) if key else None
+        if key:
+            remembered = await idempotency.alookup(qr_code, key)
+            if remembered is not None:
+                return _replay(remembered, request_fingerprint)
+
+        try:
+            table = await aresolve_table(qr_code)
+        except Table.DoesNotExist:
+            return _invalid_qr_code()
+
+        return await sync_to_async(_place_order)(qr_code, table, request.data, key, request_fingerprint)
+
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def order_intake_detail(request, reference):
+    """Status of a queued order; includes the order once it has been written."""
+    entry = get_object_or_404(OrderIntake, id=reference)
+    data = {'reference': entry.id, 'status': entry.status, 'order': None}
+    if entry.status == 'failed':
+        data['error'] = entry.error
+    elif entry.status == 'processed':
+        order = Order.objects.filter(id=entry.id).select_related('table').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+        ).first()
+        data['order'] = OrderSerializer(order).data if order is not None else None
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def order_intake_stats(request):
+    """Intake queue depth and drain rate."""
+    return Response(dict(intake.stats(), mode='queue' if intake.is_enabled() else 'direct'))
 
 class RestaurantOrdersView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+    pagination_class = OrderPagination
+    query_budget = 3
 
     def get_queryset(self):
         restaurant_id = self.kwargs['restaurant_id']
@@ -62,6 +216,102 @@ class RestaurantOrdersView(generics.ListAPIView):
             
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Pages are rendered from values() rows by orders.rendering, which
+        # produces the same JSON as OrderSerializer in a fixed number of queries.
+        rows = self.get_queryset().prefetch_related(None).values(*ORDER_VALUES)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(render_orders(page, request))
+        return Response(render_orders(rows, request))
+
+class RestaurantOrderChangesView(generics.GenericAPIView):
+    """Orders created or modified after a watermark.
+
+    ``?since=<watermark>`` returns, oldest change first, the orders that match
+    the ``status`` filter (comma separated) in ``orders`` and the ids of orders
+    that changed but no longer match in ``removed``, plus the watermark to send
+    next time. Without ``since`` the current matching orders are returned as a
+    starting snapshot, oldest change first. ``has_more`` asks the client to
+    call again right away with the new watermark.
+
+    ``updated_at`` is set before the row commits, so an order saved just
+    before another but committed after it could land behind a watermark.
+    Once a client has caught up, its watermark therefore never passes
+    ``now - commit_lag``: the last few seconds of changes are sent again
+    rather than risk losing one.
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+    batch_size = 200
+    commit_lag = timedelta(seconds=5)
+    query_budget = 4
+
+    def get_queryset(self):
+        return Order.objects.filter(
+            restaurant_id=self.kwargs['restaurant_id'],
+            restaurant__owner=self.request.user
+        )
+
+    def watermark(self, updated_at, pk, caught_up):
+        if caught_up:
+            horizon = timezone.now() - self.commit_lag
+            if updated_at > horizon:
+                updated_at, pk = horizon, uuid.UUID(int=0)
+        return encode_position(updated_at, pk)
+
+    def get(self, request, *args, **kwargs):
+        statuses = [value for value in request.query_params.get('status', '').split(',') if value]
+        since = request.query_params.get('since')
+        queryset = self.get_queryset()
+
+        if since:
+            try:
+                updated_at, pk = decode_position(since)
+            except ValueError:
+                return Response(
+                    {'error': 'Invalid watermark'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            changed = list(
+                queryset.filter(
+                    Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+                ).order_by('updated_at', 'id').values_list('id', 'updated_at', 'status')[:self.batch_size + 1]
+            )
+            has_more = len(changed) > self.batch_size
+            changed = changed[:self.batch_size]
+            watermark = self.watermark(changed[-1][1], changed[-1][0], not has_more) if changed else since
+            matching = [pk for pk, _, order_status in changed if not statuses or order_status in statuses]
+            removed = [pk for pk, _, order_status in changed if statuses and order_status not in statuses]
+        else:
+            # Read the watermark first: anything that changes meanwhile is sent
+            # again on the next call rather than lost.
+            latest = queryset.order_by('-updated_at', '-id').values_list('updated_at', 'id').first()
+            snapshot = queryset.filter(status__in=statuses) if statuses else queryset
+            page = list(snapshot.order_by('updated_at', 'id').values_list('id', 'updated_at')[:self.batch_size + 1])
+            has_more = len(page) > self.batch_size
+            page = page[:self.batch_size]
+            # A partial snapshot continues, through ``since``, after its last order.
+            if has_more:
+                watermark = self.watermark(page[-1][1], page[-1][0], caught_up=False)
+            else:
+                watermark = self.watermark(*latest, caught_up=True) if latest else None
+            matching = [pk for pk, _ in page]
+            removed = []
+
+        rows = []
+        if matching:
+            rows = Order.objects.filter(id__in=matching).values(*ORDER_VALUES)
+            rows = sorted(rows, key=lambda row: (row['updated_at'], row['id']))
+
+        return Response({
+            'orders': render_orders(rows, request),
+            'removed': removed,
+            'watermark': watermark,
+            'has_more': has_more,
+        })
+
 class OrderDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -71,30 +321,178 @@ class OrderDetailView(generics.RetrieveUpdateAPIView):
             restaurant__owner=self.request.user
         ).select_related('table').prefetch_related('items__menu_item')
 
+@query_budget(6)
 @api_view(['PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def update_order_status(request, order_id):
-    """Update order status"""
-    try:
-        order = Order.objects.get(
-            id=order_id,
-            restaurant__owner=request.user
-        )
-    except Order.DoesNotExist:
+    """Update order status
+
+    Only moves allowed by ``Order.TRANSITIONS`` are applied, with a single
+    conditional UPDATE. Send ``expected_status`` to have the update apply only
+    if nobody changed the order since it was read; a lost race answers 409
+    with the current status.
+    """
+    serializer = OrderStatusSerializer(data=request.data)
+    if not serializer.is_valid():
         return Response(
-            {'error': 'Order not found'}, 
-            status=status.HTTP_404_NOT_FOUND
+            {'error': 'Invalid status', 'details': serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST
         )
+    new_status = serializer.validated_data['status']
 
-    new_status = request.data.get('status')
-    if new_status not in dict(Order.STATUS_CHOICES):
+    orders = Order.objects.filter(id=order_id, restaurant__owner=request.user)
+    updated_at = timezone.now()
+    if not orders.transition(new_status, serializer.validated_data.get('expected_status'), updated_at):
+        current = orders.values_list('status', flat=True).first()
+        if current is None:
+            return Response(
+                {'error': 'Order not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         return Response(
-            {'error': 'Invalid status'}, 
-            status=status.HTTP_400_BAD_REQUEST
+            {'error': 'Status conflict', 'status': current},
+            status=status.HTTP_409_CONFLICT
         )
 
-    order.status = new_status
-    order.save()
+    order = orders.select_related('table').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+    ).get()
+    order_status_changed.send(
+        sender=Order,
+        restaurant_id=order.restaurant_id,
+        order_ids=[order.id],
+        status=new_status,
+        updated_at=updated_at
+    )
 
     serializer = OrderSerializer(order)
     return Response(serializer.data)
+
+@query_budget(5)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_update_order_status(request, restaurant_id):
+    """Move several orders of a restaurant to one status with a single UPDATE.
+
+    Orders that could not move (wrong status or changed concurrently) are
+    listed in ``conflicts`` with their current status and unknown ids in
+    ``not_found``; the others are updated anyway and the response is 409.
+    """
+    serializer = OrderStatusBulkSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(
+            {'error': 'Invalid status', 'details': serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    new_status = serializer.validated_data['status']
+    order_ids = list(dict.fromkeys(serializer.validated_data['order_ids']))
+
+    orders = Order.objects.filter(
+        id__in=order_ids,
+        restaurant_id=restaurant_id,
+        restaurant__owner=request.user
+    )
+    updated_at = timezone.now()
+    count = orders.transition(new_status, serializer.validated_data.get('expected_status'), updated_at)
+
+    updated, conflicts, not_found = order_ids, [], []
+    if count < len(order_ids):
+        # Only read the rows back when something did not move.
+        current = {pk: (order_status, changed_at) for pk, order_status, changed_at in
+                   orders.values_list('id', 'status', 'updated_at')}
+        updated = [pk for pk in order_ids if current.get(pk) == (new_status, updated_at)]
+        conflicts = [
+            {'id': pk, 'status': current[pk][0]}
+            for pk in order_ids if pk in current and current[pk] != (new_status, updated_at)
+        ]
+        not_found = [pk for pk in order_ids if pk not in current]
+        if not current:
+            return Response(
+                {'error': 'Orders not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+    if updated:
+        order_status_changed.send(
+            sender=Order,
+            restaurant_id=restaurant_id,
+            order_ids=updated,
+            status=new_status,
+            updated_at=updated_at
+        )
+
+    return Response(
+        {
+            'status': new_status,
+            'updated_at': updated_at,
+            'updated': updated,
+            'conflicts': conflicts,
+            'not_found': not_found,
+        },
+        status=status.HTTP_409_CONFLICT if conflicts or not_found else status.HTTP_200_OK
+    )
+
+@read_replica
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def restaurant_sales(request, restaurant_id):
+    """Sales dashboard figures, answered from the rollup tables only.
+
+    ``?from=`` and ``?to=`` are inclusive dates (default: the last 30 days),
+    ``?top=`` limits the best sellers (default 10).
+    """
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id, owner=request.user)
+
+    try:
+        end = parse_date(request.query_params.get('to', '')) or timezone.localdate()
+        start = parse_date(request.query_params.get('from', '')) or end - timedelta(days=29)
+        top = min(max(int(request.query_params.get('top', 10)), 1), 100)
+    except ValueError:
+        start = end = None
+    if start is None or start > end:
+        return Response(
+            {'error': 'Invalid date range'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(sales_summary(restaurant, start, end, top=top))
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def kitchen_cook_now(request, restaurant_id):
+    """What the kitchen has to cook: open order lines summed per menu item (orders.kitchen)."""
+    restaurant = get_object_or_404(Restaurant, id=restaurant_id, owner=request.user)
+    return Response(kitchen.cook_now(restaurant.id))
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def order_events(request, restaurant_id):
+    """Stream order events for a restaurant as server-sent events.
+
+    Under ASGI the connection stays open and events are pushed as they happen.
+    Under WSGI the missed events are sent and the client is told to reconnect.
+    """
+    restaurant = get_object_or_404(
+        Restaurant,
+        id=restaurant_id,
+        owner=request.user
+    )
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    if isinstance(request._request, ASGIRequest):
+        events = stream_events(restaurant.id, last_event_id)
+    else:
+        events = replay_events(restaurant.id, last_event_id)
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,6 +2,11 @@
 ASGI config for restaurant_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the project through it (e.g. ``uvicorn restaurant_backend.asgi:application``)
+to keep kitchen event streams (``orders.events``) open without tying up a
+worker thread per screen. The public QR endpoints are native async views
+there (``ASYNC_PUBLIC_VIEWS``), so slow customer connections do not hold
+threads either; ``manage.py load_test`` compares this with WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -11,6 +16,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from restaurant_backend.db import configure_for_asgi
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_backend.settings')
 
 application = get_asgi_application()
+# Requests get a new thread each under ASGI; only pooled connections may persist.
+configure_for_asgi()
@@ -0,0 +1,66 @@
+"""
+Native async DRF views.
+
+DRF's ``APIView`` is synchronous, so under ASGI Django runs it in a worker
+thread for the whole request. ``AsyncAPIView`` keeps DRF's request parsing,
+content negotiation, permissions and exception handling (all in-memory work)
+but awaits ``async def`` handlers, so a request only occupies a thread while
+it actually runs synchronous ORM code through the async ORM or
+``sync_to_async``. Under WSGI Django still serves these views, through
+``async_to_sync``.
+
+The public customer endpoints have an async twin each, routed in when
+``ASYNC_PUBLIC_VIEWS`` is on (see ``public_view``).
+"""
+from inspect import isawaitable
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """``APIView`` whose handlers are coroutines.
+
+    Handlers must not touch the database synchronously. Authentication is off
+    by default because the built-in classes load users synchronously; these
+    views are meant for anonymous, ``AllowAny`` endpoints.
+    """
+    authentication_classes = ()
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            self.initial(request, *args, **kwargs)
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            response = handler(request, *args, **kwargs)
+            if isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return rendered(self.response)
+
+
+def rendered(response):
+    """Render a DRF ``Response`` into a plain ``HttpResponse``.
+
+    Django's async handler would otherwise render it in a worker thread.
+    """
+    if not hasattr(response, 'render'):
+        return response
+    response.render()
+    plain = HttpResponse(response.content, status=response.status_code, headers=response.headers)
+    plain.data = response.data
+    return plain
+
+
+def public_view(sync_view, async_view):
+    """``async_view`` when ``ASYNC_PUBLIC_VIEWS`` is on, else ``sync_view``."""
+    return async_view if getattr(settings, 'ASYNC_PUBLIC_VIEWS', True) else sync_view
@@ -0,0 +1,79 @@
+"""
+Database connection pooling.
+
+``pooled`` turns the ``DB_POOL_*`` environment settings into a PostgreSQL
+``DATABASES`` entry using Django's native pool (psycopg 3 with
+``psycopg_pool``): requests borrow an open connection and give it back when
+Django closes it at the end of the request, under WSGI and ASGI alike.
+Without ``psycopg_pool`` (or with ``DB_POOL=False``) connections are kept per
+thread for ``DB_CONN_MAX_AGE`` seconds instead, with health checks.
+
+Under ASGI every request runs its ORM work in a fresh thread, so per-thread
+persistent connections would only pile up; ``configure_for_asgi`` turns them
+off there. ``pool_stats`` reports on every database for monitoring.
+"""
+from django.conf import settings
+from django.db import connections
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:  # optional dependency, comes with psycopg[pool]
+    ConnectionPool = None
+
+
+def pooled(database, enabled=True, min_size=2, max_size=10, max_lifetime=1800, max_idle=300,
+           timeout=10, pre_ping=True, conn_max_age=60):
+    """Return ``database`` with pooling (or persistent connections) configured.
+
+    ``max_lifetime`` and ``max_idle`` are in seconds; ``timeout`` is how long a
+    request waits for a free connection before failing. ``pre_ping`` checks
+    each connection before handing it out.
+    """
+    database = dict(database)
+    if enabled and ConnectionPool is not None:
+        pool = {
+            'min_size': min_size,
+            'max_size': max_size,
+            'max_lifetime': max_lifetime,
+            'max_idle': max_idle,
+            'timeout': timeout,
+        }
+        if pre_ping:
+            pool['check'] = ConnectionPool.check_connection
+        database['OPTIONS'] = dict(database.get('OPTIONS', {}), pool=pool)
+        # The pool owns connection lifetimes; Django rejects persistent ones on top.
+        database['CONN_MAX_AGE'] = 0
+    else:
+        database['CONN_MAX_AGE'] = conn_max_age
+        database['CONN_HEALTH_CHECKS'] = pre_ping
+    return database
+
+
+def is_pooled(alias):
+    return bool(connections[alias].settings_dict.get('OPTIONS', {}).get('pool'))
+
+
+def configure_for_asgi():
+    """Stop unpooled connections from persisting; call before the first query."""
+    for alias, database in settings.DATABASES.items():
+        if not is_pooled(alias):
+            database['CONN_MAX_AGE'] = 0
+            connections[alias].settings_dict['CONN_MAX_AGE'] = 0
+
+
+def pool_stats():
+    """Per-database pool counters, or the persistent connection settings."""
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        entry = {'vendor': connection.vendor, 'pooled': is_pooled(alias)}
+        if entry['pooled']:
+            # pool_min/max/size/available, requests_waiting plus non-zero counters.
+            entry.update(connection.pool.get_stats())
+        else:
+            entry.update(
+                conn_max_age=connection.settings_dict['CONN_MAX_AGE'],
+                health_checks=connection.settings_dict['CONN_HEALTH_CHECKS'],
+            )
+        stats[alias] = entry
+    return stats
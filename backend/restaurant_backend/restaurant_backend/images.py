@@ -0,0 +1,322 @@
+"""
+Resized variants of uploaded images.
+
+Each size in ``IMAGE_VARIANTS['SIZES']`` is rendered as WebP and JPEG in a
+process pool (Pillow work is CPU bound and would hold the GIL in a web
+worker), saved next to the original under a content-hashed name that can be
+cached forever, and recorded in a JSON field on the model::
+
+    {'source': 'menu_items/pizza.jpg',
+     'card': {'width': 480, 'height': 320,
+              'webp': 'menu_items/variants/3f2a...-card.webp', 'jpeg': '...'}, ...}
+
+The pool only ever sees bytes; storage and database access stay in the parent
+process. ``source`` is the image the variants were made from, so a new upload
+is detected and a stale result from a slow worker is never recorded. An image
+that cannot be read or rendered is recorded as ``{'source': ..., 'failed':
+True}`` and not tried again until it changes. Recording new variants deletes
+the files of the ones they replace, unless another row still uses them.
+
+Renders still running when a worker exits are given
+``IMAGE_VARIANTS['SHUTDOWN_TIMEOUT']`` seconds to finish; any that don't are
+lost, and their ``source`` stays behind the image until
+``backfill_image_variants`` renders them again (run it after deploys).
+"""
+import atexit
+import hashlib
+import io
+import logging
+import multiprocessing
+import posixpath
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = {'thumb': 160, 'card': 480, 'full': 1280}
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Background renders by (model label, pk, field name).
+_in_flight = {}
+
+
+def _settings():
+    return getattr(settings, 'IMAGE_VARIANTS', {})
+
+
+def render(data, sizes, quality=80):
+    """Return ``{name: {'width', 'height', 'webp': bytes, 'jpeg': bytes}}`` for image ``data``.
+
+    Runs in the pool, so it must not touch Django.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        source = source.convert('RGBA' if 'A' in source.getbands() or 'transparency' in source.info else 'RGB')
+
+    variants = {}
+    for name, size in sizes.items():
+        image = source.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        flat = image
+        if image.mode == 'RGBA':
+            flat = Image.new('RGB', image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel('A'))
+        variant = {'width': image.width, 'height': image.height}
+        for extension, pil_format in FORMATS.items():
+            out = io.BytesIO()
+            if pil_format == 'JPEG':
+                flat.save(out, pil_format, quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(out, pil_format, quality=quality, method=4)
+            variant[extension] = out.getvalue()
+        variants[name] = variant
+    return variants
+
+
+def new_executor(workers=None):
+    # spawn: children must not inherit the parent's DB connections or threads.
+    return ProcessPoolExecutor(
+        max_workers=workers or _settings().get('WORKERS', 2) or 1,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = new_executor()
+    return _executor
+
+
+def shutdown(timeout=None):
+    """Wait up to ``timeout`` seconds for background renders, then stop the pool.
+
+    Unfinished renders are not recorded and get scheduled again later.
+    """
+    global _executor
+    timeout = _settings().get('SHUTDOWN_TIMEOUT', 10) if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    with _executor_lock:
+        threads = list(_in_flight.values())
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown)
+
+
+def store(field_file, rendered):
+    """Save ``rendered`` variants of ``field_file`` and return the JSON to record."""
+    storage = field_file.storage
+    directory = posixpath.join(posixpath.dirname(field_file.name), 'variants')
+    variants = {'source': field_file.name}
+    for name, variant in rendered.items():
+        stored = {'width': variant['width'], 'height': variant['height']}
+        for extension in FORMATS:
+            content = variant[extension]
+            digest = hashlib.sha256(content).hexdigest()[:20]
+            path = posixpath.join(directory, f'{digest}-{name}.{extension}')
+            # Same content, same name: an existing file is already correct.
+            if not storage.exists(path):
+                path = storage.save(path, ContentFile(content))
+            stored[extension] = path
+        variants[name] = stored
+    return variants
+
+
+def variant_urls(variants, storage, request=None):
+    """Map each variant to its dimensions and absolute (with ``request``) URLs."""
+    urls = {}
+    for name, variant in (variants or {}).items():
+        if not isinstance(variant, dict):
+            # The 'source' and 'failed' markers.
+            continue
+        urls[name] = {'width': variant['width'], 'height': variant['height']}
+        for extension in FORMATS:
+            url = storage.url(variant[extension])
+            urls[name][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def _paths(variants):
+    return {
+        variant[extension]
+        for variant in (variants or {}).values() if isinstance(variant, dict)
+        for extension in FORMATS if extension in variant
+    }
+
+
+def _delete_superseded(model, field_name, variants_field, previous, current):
+    """Delete the files of ``previous`` that neither ``current`` nor another row uses."""
+    superseded = _paths(previous) - _paths(current)
+    if not superseded:
+        return
+    # Identical images share files, so look for other rows still pointing at them.
+    shared = Q()
+    for name, variant in previous.items():
+        if isinstance(variant, dict):
+            for extension in FORMATS:
+                shared |= Q(**{f'{variants_field}__{name}__{extension}__in': superseded})
+    for variants in model.objects.filter(shared).values_list(variants_field, flat=True):
+        superseded -= _paths(variants)
+    storage = model._meta.get_field(field_name).storage
+    for path in superseded:
+        try:
+            storage.delete(path)
+        except OSError:
+            logger.warning('image_variants.delete_failed', exc_info=True, extra={'fields': {'path': path}})
+
+
+def _record(model, pk, field_name, variants_field, variants, on_update):
+    previous = model.objects.filter(pk=pk).values_list(variants_field, flat=True).first()
+    updated = model.objects.filter(pk=pk, **{field_name: variants['source']}).update(**{variants_field: variants})
+    if updated:
+        _delete_superseded(model, field_name, variants_field, previous or {}, variants)
+        if on_update is not None:
+            on_update()
+    return bool(updated)
+
+
+def _read(field_file):
+    with field_file.open('rb') as handle:
+        return handle.read()
+
+
+def _failed(instance, field_name, variants_field, source, on_update=None):
+    """Log the error and record ``source`` as failed, so it is not retried until it changes."""
+    logger.warning('image_variants.failed', exc_info=True, extra={'fields': {
+        'model': instance._meta.label, 'pk': str(instance.pk), 'source': source,
+    }})
+    _record(type(instance), instance.pk, field_name, variants_field, {'source': source, 'failed': True}, on_update)
+
+
+def generate(instance, field_name, variants_field, on_update=None, executor=None):
+    """Render, store and record the variants of ``instance.<field_name>``.
+
+    Renders in ``executor`` (or the calling thread) and blocks until done.
+    Returns False when the image changed meanwhile or could not be rendered.
+    """
+    field_file = getattr(instance, field_name)
+    sizes = _settings().get('SIZES', DEFAULT_SIZES)
+    quality = _settings().get('QUALITY', 80)
+    try:
+        data = _read(field_file)
+        if executor is not None:
+            rendered = executor.submit(render, data, sizes, quality).result()
+        else:
+            rendered = render(data, sizes, quality)
+    except Exception:
+        _failed(instance, field_name, variants_field, field_file.name, on_update)
+        return False
+    variants = store(field_file, rendered)
+    return _record(type(instance), instance.pk, field_name, variants_field, variants, on_update)
+
+
+def generate_many(instances, field_name, variants_field, executor, window=8):
+    """``generate`` for many instances, keeping up to ``window`` renders in flight.
+
+    Yields ``(instance, recorded)`` as renders finish.
+    """
+    sizes = _settings().get('SIZES', DEFAULT_SIZES)
+    quality = _settings().get('QUALITY', 80)
+    pending = {}
+    instances = iter(instances)
+    while True:
+        for instance in instances:
+            try:
+                future = executor.submit(render, _read(getattr(instance, field_name)), sizes, quality)
+            except Exception:
+                _failed(instance, field_name, variants_field, getattr(instance, field_name).name)
+                yield instance, False
+                continue
+            pending[future] = instance
+            if len(pending) >= window:
+                break
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            instance = pending.pop(future)
+            field_file = getattr(instance, field_name)
+            try:
+                variants = store(field_file, future.result())
+            except Exception:
+                _failed(instance, field_name, variants_field, field_file.name)
+                yield instance, False
+                continue
+            yield instance, _record(type(instance), instance.pk, field_name, variants_field, variants, None)
+
+
+def _generate_in_background(key, instance, field_name, variants_field, on_update):
+    try:
+        generate(instance, field_name, variants_field, on_update, executor=_get_executor())
+    finally:
+        with _executor_lock:
+            _in_flight.pop(key, None)
+        close_old_connections()
+
+
+def is_stale(instance, field_name, variants_field, retry_failed=False):
+    """Whether ``instance`` has an image without variants made from it.
+
+    An image that failed to render only counts with ``retry_failed``.
+    """
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_field) or {}
+    if not field_file:
+        return False
+    return variants.get('source') != field_file.name or (retry_failed and bool(variants.get('failed')))
+
+
+def schedule(instance, field_name, variants_field, on_update=None):
+    """Bring the variants of ``instance`` up to date once the current transaction commits.
+
+    Does nothing when they are current or already being rendered. With
+    ``IMAGE_VARIANTS['WORKERS'] = 0`` the variants are rendered inline.
+    """
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_field) or {}
+    if not field_file:
+        if variants:
+            type(instance).objects.filter(pk=instance.pk).update(**{variants_field: {}})
+            _delete_superseded(type(instance), field_name, variants_field, variants, {})
+            setattr(instance, variants_field, {})
+            if on_update is not None:
+                on_update()
+        return
+    if variants.get('source') == field_file.name:
+        return
+
+    def start():
+        if not _settings().get('WORKERS', 2):
+            generate(instance, field_name, variants_field, on_update)
+            return
+        key = (instance._meta.label, instance.pk, field_name)
+        with _executor_lock:
+            if key in _in_flight:
+                return
+            thread = _in_flight[key] = threading.Thread(
+                target=_generate_in_background,
+                args=(key, instance, field_name, variants_field, on_update),
+                daemon=True,
+            )
+        thread.start()
+
+    transaction.on_commit(start)
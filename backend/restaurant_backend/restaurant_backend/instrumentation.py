@@ -0,0 +1,251 @@
+"""
+Request instrumentation: structured hot-path logging and per-view query budgets.
+
+* ``BackgroundHandler`` and ``JSONFormatter`` give one JSON line per record,
+  written by a background thread so a slow stdout never stalls a request.
+  ``SamplingFilter`` keeps only a fraction of INFO/DEBUG records on busy loggers.
+* ``QueryMetricsMiddleware`` counts and times every query a request runs,
+  adds a ``Server-Timing`` header, keeps per-view totals in ``VIEW_STATS`` and
+  warns when a view exceeds the budget declared with ``query_budget``. It
+  works in both handler modes; queries are attributed through a context
+  variable, so those an async view runs in ``sync_to_async`` threads count too.
+  Queries on the user and session tables are counted apart as well: they
+  depend on the auth method, not on the view, so the budget leaves them out.
+* ``QueryBudgetTestMixin`` turns those budgets into test assertions.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('restaurant_backend.queries')
+
+
+class JSONFormatter(logging.Formatter):
+    """Render a record as one JSON object; ``extra={'fields': {...}}`` adds keys."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through ``rate`` of the records below WARNING; warnings always pass."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class BackgroundHandler(QueueHandler):
+    """Queue records for a writer thread, dropping them when the queue is full."""
+
+    def __init__(self, maxsize=10000):
+        super().__init__(Queue(maxsize))
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, logging.StreamHandler())
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+def query_budget(limit):
+    """Declare the most queries a function-based view may run per request.
+
+    Class-based views set a ``query_budget`` class attribute instead.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def get_query_budget(view_func):
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view_func, 'view_class', None), 'query_budget', None)
+    return budget
+
+
+# Loading the user: a JWT user lookup, or the session then the user.
+_AUTH_QUERY = re.compile(r'\bFROM [`"]?(auth_user|django_session)\b')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.auth = 0
+
+    def add(self, seconds, sql=''):
+        self.duration += seconds
+        self.count += 1
+        if _AUTH_QUERY.search(sql):
+            self.auth += 1
+
+    @property
+    def budgeted(self):
+        """Queries that count against a view's budget."""
+        return self.count - self.auth
+
+
+# The counters of every count_queries() block the current context is in.
+_counters = contextvars.ContextVar('query_counters', default=())
+
+
+def _count(execute, sql, params, many, context):
+    counters = _counters.get()
+    if not counters:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for counter in counters:
+            counter.add(elapsed, sql)
+
+
+def _install(connection):
+    if _count not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='restaurant_backend.instrumentation')
+
+
+@contextmanager
+def count_queries():
+    """Count queries on every configured database while the block runs.
+
+    Queries run from other threads are included when they run in a copy of
+    this context, as ``sync_to_async`` calls do.
+    """
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    counter = QueryCounter()
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+
+class ViewStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, queries, db_seconds):
+        with self._lock:
+            stats = self._views.setdefault(view_name, {'requests': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0})
+            stats['requests'] += 1
+            stats['queries'] += queries
+            stats['db_ms'] += db_seconds * 1000
+            stats['max_queries'] = max(stats['max_queries'], queries)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+VIEW_STATS = ViewStats()
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with count_queries() as counter:
+            response = self.get_response(request)
+        return self.record(request, response, counter)
+
+    async def __acall__(self, request):
+        with count_queries() as counter:
+            response = await self.get_response(request)
+        return self.record(request, response, counter)
+
+    def record(self, request, response, counter):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        budget = get_query_budget(match.func) if match else None
+        response.query_count = counter.count
+        response.budgeted_query_count = counter.budgeted
+        response.query_budget = budget
+        response['Server-Timing'] = f'db;dur={counter.duration * 1000:.1f};desc="{counter.count} queries"'
+
+        if view_name:
+            VIEW_STATS.record(view_name, counter.count, counter.duration)
+            fields = {
+                'view': view_name,
+                'status': response.status_code,
+                'queries': counter.count,
+                'auth_queries': counter.auth,
+                'db_ms': round(counter.duration * 1000, 2),
+            }
+            if budget is not None and counter.budgeted > budget:
+                logger.warning('query_budget.exceeded', extra={'fields': dict(fields, budget=budget)})
+            else:
+                logger.info('request.queries', extra={'fields': fields})
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Assertions for ``TestCase`` classes exercising budgeted views."""
+
+    def assertWithinQueryBudget(self, response):
+        budget = getattr(response, 'query_budget', None)
+        self.assertIsNotNone(budget, 'The view has no declared query budget.')
+        self.assertLessEqual(
+            response.budgeted_query_count, budget,
+            f'{response.budgeted_query_count} queries executed, budget is {budget}.'
+        )
+
+    @contextmanager
+    def assertQueryBudget(self, limit):
+        with count_queries() as counter:
+            yield counter
+        self.assertLessEqual(counter.count, limit, f'{counter.count} queries executed, budget is {limit}.')
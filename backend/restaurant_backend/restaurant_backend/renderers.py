@@ -0,0 +1,76 @@
+"""
+Compact encodings for public payloads.
+
+``MessagePackRenderer`` is offered to clients that send
+``Accept: application/msgpack`` (or ``?format=msgpack``) and needs the
+optional ``msgpack`` package; ``compress`` produces gzip or, with the optional
+``brotli`` package, br bodies for views that cache their encoded output
+instead of leaving compression to every request.
+"""
+import gzip
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+_encoder = JSONEncoder()
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Decimals, UUIDs and datetimes become the same strings as in JSON.
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
+
+
+def compact_renderers():
+    """The optional renderers whose dependencies are installed."""
+    return [MessagePackRenderer] if msgpack is not None else []
+
+
+def encodings():
+    """Content codings ``compress`` supports here, best first."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def accepted_encoding(request):
+    """The best supported coding the client accepts, or None."""
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    for coding in encodings():
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def compress(body, coding):
+    """Compress ``body`` at the highest level; the result is meant to be cached."""
+    if coding == 'br':
+        return brotli.compress(body, quality=11)
+    if coding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    raise ValueError(f'Unsupported content coding: {coding}')
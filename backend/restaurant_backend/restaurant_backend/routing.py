@@ -0,0 +1,170 @@
+"""
+Read-replica routing.
+
+``ReplicaRouter`` sends reads to one of the ``DATABASE_REPLICAS`` aliases, but
+only while ``ReplicaRoutingMiddleware`` is handling a GET, HEAD or OPTIONS
+request for a view that opted in with ``@read_replica`` (class-based views set
+``read_replica = True``). Everything else goes to ``default``: writes, reads
+inside a transaction, reads of objects loaded from the primary, and:
+
+* the rest of a request once it has written anything;
+* every request from a client that wrote recently. A successful unsafe
+  request sets a cookie that keeps the client on the primary for
+  ``REPLICA_ROUTING['PIN_SECONDS']``, which should exceed the replication lag;
+* ``use_primary()`` blocks. Data that is cached until the next write (menu
+  snapshots, resolved tables) is read there, since a lagging replica would
+  put pre-write rows into the fresh cache entry.
+
+A request sticks to one replica so its reads are consistent with each other.
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    def __init__(self, choose):
+        self._choose = choose
+        self._replica = None
+        self._chosen = False
+        self.pinned = False
+
+    @property
+    def replica(self):
+        # Chosen on the first read, once the view is known.
+        if not self._chosen:
+            self._replica, self._chosen = self._choose(), True
+        return self._replica
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+_primary = contextvars.ContextVar('db_primary', default=False)
+
+
+def _settings():
+    return getattr(settings, 'REPLICA_ROUTING', {})
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def read_replica(view):
+    """Let a function-based view read from a replica."""
+    view.read_replica = True
+    return view
+
+
+def uses_replica(view_func):
+    if getattr(view_func, 'read_replica', False):
+        return True
+    return getattr(getattr(view_func, 'view_class', None), 'read_replica', False)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block."""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+@contextmanager
+def routing(choose):
+    """Send the block's reads to the alias ``choose()`` returns (None: the primary) until it writes."""
+    token = _state.set(RoutingState(choose))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+def use_replica(alias=None):
+    """Read from ``alias`` (default: any replica) inside the block, e.g. in reporting jobs."""
+    return routing(lambda: alias or (random.choice(replicas()) if replicas() else None))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = _state.get()
+        if (
+            state is None or state.pinned or _primary.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return state.replica or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in replicas() else None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing(lambda: self.choose(request)):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        with routing(lambda: self.choose(request)):
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+    def choose(self, request):
+        available = replicas()
+        match = getattr(request, 'resolver_match', None)
+        if (
+            available and request.method in SAFE_METHODS and match is not None
+            and uses_replica(match.func) and not self.is_pinned(request)
+        ):
+            return random.choice(available)
+        return None
+
+    def is_pinned(self, request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replicas():
+            seconds = _settings().get('PIN_SECONDS', 5)
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
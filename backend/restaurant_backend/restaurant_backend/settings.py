@@ -12,8 +12,11 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
+
+from restaurant_backend.db import pooled
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,6 +53,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware", 
     'django.middleware.security.SecurityMiddleware',
+    'restaurant_backend.routing.ReplicaRoutingMiddleware',
+    'restaurant_backend.instrumentation.QueryMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,22 +93,197 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'restaurant_backend.wsgi.application'
 
+# Serve the public QR endpoints (table, menu, order) from native async views
+# (restaurant_backend.asyncviews). Meant for ASGI; WSGI-only deployments can
+# turn it off to skip the async_to_sync round trip.
+ASYNC_PUBLIC_VIEWS = config('ASYNC_PUBLIC_VIEWS', default=True, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections come from a pool (restaurant_backend.db); size it to at least the
+# worker threads of one process. Times are in seconds.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME', default='restaurant_db'),
-        'USER': config('DB_USER', default='postgres'),
-        'PASSWORD': config('DB_PASSWORD', default='Police*'),
-        'HOST': config('DB_HOST', default='localhost'),
-        'PORT': config('DB_PORT', default='5432'),
-    }
+    'default': pooled(
+        {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='restaurant_db'),
+            'USER': config('DB_USER', default='postgres'),
+            'PASSWORD': config('DB_PASSWORD', default='Police*'),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+        },
+        enabled=config('DB_POOL', default=True, cast=bool),
+        min_size=config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        max_size=config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        max_lifetime=config('DB_POOL_MAX_LIFETIME', default=1800, cast=float),
+        max_idle=config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        timeout=config('DB_POOL_TIMEOUT', default=10, cast=float),
+        pre_ping=config('DB_POOL_PRE_PING', default=True, cast=bool),
+        # Only used without psycopg_pool (or with DB_POOL=False) under WSGI.
+        conn_max_age=config('DB_CONN_MAX_AGE', default=60, cast=int),
+    )
+}
+
+# Read replicas (restaurant_backend.routing): one alias per host in
+# DB_REPLICA_HOSTS, same database and credentials as the primary. Views opt in
+# with @read_replica / read_replica = True. Tests read the primary through them,
+# so pointing DB_REPLICA_HOSTS at the primary's host exercises two aliases locally.
+for number, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'],
+        HOST=host,
+        PORT=config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['restaurant_backend.routing.ReplicaRouter']
+REPLICA_ROUTING = {
+    # Seconds a client stays on the primary after a write; above the replication lag.
+    'PIN_SECONDS': config('DB_REPLICA_PIN_SECONDS', default=5, cast=float),
+}
+
+
+# Rendered public menu snapshots (menu.cache). Set MENU_CACHE_SHARED_ALIAS to a
+# cache in CACHES when running more than one worker process; without it each
+# worker only sees its own edits, and serves other workers' within LOCAL_TTL seconds.
+MENU_CACHE = {
+    'MAX_BYTES': config('MENU_CACHE_MAX_BYTES', default=32 * 1024 * 1024, cast=int),
+    'SHARED_CACHE_ALIAS': config('MENU_CACHE_SHARED_ALIAS', default=''),
+    'LOCAL_TTL': config('MENU_CACHE_LOCAL_TTL', default=30, cast=float),
+    'TIMEOUT': config('MENU_CACHE_TIMEOUT', default=3600, cast=int),
+}
+
+
+# Public menu search (menu.search). BACKEND 'auto' uses the PostgreSQL full-text
+# index on PostgreSQL and an in-memory index elsewhere ('database'/'memory' force one).
+MENU_SEARCH = {
+    'BACKEND': config('MENU_SEARCH_BACKEND', default='auto'),
+    # Edges of the price facet's ranges.
+    'PRICE_BUCKETS': config('MENU_SEARCH_PRICE_BUCKETS', default='10,20,30', cast=Csv()),
+}
+
+
+# QR code -> table resolution shared by the public endpoints (restaurants.resolver).
+# With a shared cache (by default the menu cache's) every worker sees table and
+# restaurant edits at once and entries live TTL seconds; without one, LOCAL_TTL.
+QR_RESOLVER = {
+    'MAX_ENTRIES': config('QR_RESOLVER_MAX_ENTRIES', default=10000, cast=int),
+    'SHARED_CACHE_ALIAS': config('QR_RESOLVER_SHARED_ALIAS', default=MENU_CACHE['SHARED_CACHE_ALIAS']),
+    'TTL': config('QR_RESOLVER_TTL', default=300, cast=int),
+    'LOCAL_TTL': config('QR_RESOLVER_LOCAL_TTL', default=30, cast=int),
+    'NEGATIVE_TTL': config('QR_RESOLVER_NEGATIVE_TTL', default=30, cast=int),
+}
+
+
+# "Cook now" totals for kitchen screens (orders.kitchen), cached per restaurant.
+KITCHEN = {
+    'CACHE_SECONDS': config('KITCHEN_CACHE_SECONDS', default=2, cast=float),
+    'MAX_ENTRIES': config('KITCHEN_CACHE_MAX_ENTRIES', default=1000, cast=int),
+}
+
+
+# Order ready-time estimates (orders.eta): the kitchen works through STATIONS
+# orders' preparation minutes at once; each process reloads its queue every RESYNC_SECONDS.
+ORDER_ETA = {
+    'STATIONS': config('ORDER_ETA_STATIONS', default=3, cast=int),
+    'RESYNC_SECONDS': config('ORDER_ETA_RESYNC_SECONDS', default=60, cast=int),
+}
+
+
+# Owner overview across restaurants (restaurants.overview), cached per owner.
+OWNER_OVERVIEW = {
+    'CACHE_SECONDS': config('OWNER_OVERVIEW_CACHE_SECONDS', default=10, cast=float),
+    'MAX_ENTRIES': config('OWNER_OVERVIEW_CACHE_MAX_ENTRIES', default=1000, cast=int),
 }
 
 
+# Order history archival (orders.archive, ``archive_orders``): served and cancelled
+# orders older than AFTER_DAYS move to the archive tables CHUNK_SIZE orders per transaction.
+ORDER_ARCHIVE = {
+    'AFTER_DAYS': config('ORDER_ARCHIVE_AFTER_DAYS', default=90, cast=int),
+    'CHUNK_SIZE': config('ORDER_ARCHIVE_CHUNK_SIZE', default=500, cast=int),
+}
+
+
+# Kitchen order event stream (orders.events). The in-memory broker only fans out
+# within one process; point BROKER at a shared implementation for more workers.
+ORDER_EVENTS = {
+    'BROKER': config('ORDER_EVENTS_BROKER', default='orders.events.InMemoryBroker'),
+    'HISTORY': config('ORDER_EVENTS_HISTORY', default=500, cast=int),
+    'KEEPALIVE': config('ORDER_EVENTS_KEEPALIVE', default=15, cast=int),
+    'RETRY_MS': config('ORDER_EVENTS_RETRY_MS', default=3000, cast=int),
+}
+
+
+# Idempotency-Key replays for create_order (orders.idempotency). The default
+# cache is per process; the unique (table, key) constraint still stops
+# duplicates across workers, the shared cache only makes replays cheaper.
+IDEMPOTENCY = {
+    'CACHE_ALIAS': config('IDEMPOTENCY_CACHE_ALIAS', default='default'),
+    'TTL': config('IDEMPOTENCY_TTL', default=86400, cast=int),
+}
+
+# Resized WebP/JPEG copies of uploaded images (restaurant_backend.images),
+# rendered by a pool of WORKERS processes; 0 renders inline.
+IMAGE_VARIANTS = {
+    'SIZES': {'thumb': 160, 'card': 480, 'full': 1280},
+    'QUALITY': config('IMAGE_VARIANTS_QUALITY', default=80, cast=int),
+    'WORKERS': config('IMAGE_VARIANTS_WORKERS', default=2, cast=int),
+    # Seconds an exiting worker waits for renders in flight; unfinished ones are redone later.
+    'SHUTDOWN_TIMEOUT': config('IMAGE_VARIANTS_SHUTDOWN_TIMEOUT', default=10, cast=float),
+}
+
+# Order intake (orders.intake). In 'queue' mode create_order only validates and
+# appends to the OrderIntake table; `manage.py drain_order_intake` writes the
+# orders in batches. 'direct' writes them inside the request.
+ORDER_INTAKE = {
+    'MODE': config('ORDER_INTAKE_MODE', default='direct'),
+    'BATCH_SIZE': config('ORDER_INTAKE_BATCH_SIZE', default=100, cast=int),
+    'POLL_INTERVAL': config('ORDER_INTAKE_POLL_INTERVAL', default=0.5, cast=float),
+    # Seconds processed entries are kept so customers can still look them up.
+    'RETENTION': config('ORDER_INTAKE_RETENTION', default=86400, cast=int),
+}
+
+
+# Structured logging (restaurant_backend.instrumentation). Records are JSON lines
+# written from a background thread; INFO records are sampled. The test runner
+# (restaurant_backend.test_runner) discards them; tests that check logging
+# capture them with assertLogs.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'restaurant_backend.instrumentation.JSONFormatter'},
+    },
+    'filters': {
+        'sampled': {
+            '()': 'restaurant_backend.instrumentation.SamplingFilter',
+            'rate': config('LOG_SAMPLE_RATE', default=0.05, cast=float),
+        },
+    },
+    'handlers': {
+        'structured': {
+            '()': 'restaurant_backend.instrumentation.BackgroundHandler',
+            'formatter': 'json',
+            'filters': ['sampled'],
+        },
+    },
+    'loggers': {
+        app: {
+            'handlers': ['structured'],
+            'level': config('LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        }
+        for app in ('restaurant_backend', 'restaurants', 'menu', 'orders')
+    },
+}
+
+TEST_RUNNER = 'restaurant_backend.test_runner.QuietLogsTestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
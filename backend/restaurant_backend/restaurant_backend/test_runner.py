@@ -0,0 +1,26 @@
+"""
+Test runner that keeps structured logs out of test output.
+
+The app loggers write to a background handler that prints every record;
+under the runner they get a ``NullHandler`` instead. Tests that check logging
+still see the records through ``assertLogs``.
+"""
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QuietLogsTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._log_handlers = {}
+        for name in settings.LOGGING.get('loggers', {}):
+            logger = logging.getLogger(name)
+            self._log_handlers[name] = logger.handlers
+            logger.handlers = [logging.NullHandler()]
+
+    def teardown_test_environment(self, **kwargs):
+        for name, handlers in self._log_handlers.items():
+            logging.getLogger(name).handlers = handlers
+        super().teardown_test_environment(**kwargs)
@@ -19,12 +19,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from . import views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('rest_framework.urls')),
     path('api/menu/', include('menu.urls')),
     path('api/orders/', include('orders.urls')),
     path('api/restaurants/', include('restaurants.urls')),
+    path('api/monitoring/db-pool/', views.database_pool_stats, name='database-pool-stats'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,12 @@
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .db import pool_stats
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def database_pool_stats(request):
+    """Connection pool counters per database, for monitoring."""
+    return Response(pool_stats())
@@ -0,0 +1,261 @@
+"""
+Latency and query-count benchmarks for the hot endpoints.
+
+``run_suite`` drives the real URLs through DRF's test client against whatever
+database is active, so it is meant to run on a throwaway database filled by
+``restaurants.seeding`` (the ``run_benchmarks`` command takes care of both).
+Results are plain dicts so they can be written as JSON and diffed between
+commits with ``compare``.
+"""
+import math
+import random
+import time
+
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from menu import cache as menu_cache
+from orders.models import Order, OrderItem
+from orders.pagination import encode_position
+from orders.rendering import ORDER_VALUES, render_orders
+from orders.serializers import OrderSerializer
+from restaurant_backend.renderers import compact_renderers, compress, encodings
+from . import overview, resolver
+
+
+FIRST_SCREEN_FIELDS = 'name,price,image_variants.thumb'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(timings, queries, sizes=None):
+    summary = {
+        'iterations': len(timings),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': percentile(queries, 50),
+        'max_queries': max(queries),
+    }
+    if sizes:
+        summary['bytes'] = percentile(sizes, 50)
+    return summary
+
+
+def _size(response):
+    if isinstance(response, bytes):
+        return len(response)
+    content = getattr(response, 'content', None)
+    return len(content) if content is not None else None
+
+
+def measure(request, iterations, setup=None, check=None):
+    timings, queries, sizes = [], [], []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+        if check is not None:
+            check(response)
+        timings.append(elapsed * 1000)
+        queries.append(len(captured))
+        size = _size(response)
+        if size is not None:
+            sizes.append(size)
+    return summarize(timings, queries, sizes)
+
+
+def _expect(status_code):
+    def check(response):
+        if response.status_code != status_code:
+            raise AssertionError(
+                f'{response.request["PATH_INFO"]} returned {response.status_code}, expected {status_code}'
+            )
+    return check
+
+
+def scenarios(dataset, seed=1234):
+    """Yield ``(name, request, setup, check)`` for every benchmarked call."""
+    rng = random.Random(seed)
+    client = APIClient()
+    owner_client = APIClient()
+    owner_client.force_authenticate(dataset['owner'])
+
+    tables = dataset['tables']
+    restaurant = dataset['restaurants'][0]
+    items_by_restaurant = {}
+    for item in dataset['menu_items']:
+        items_by_restaurant.setdefault(item.restaurant_id, []).append(item)
+
+    def menu():
+        table = rng.choice(tables)
+        return client.get(reverse('menu-by-qr', args=[table.qr_code]))
+
+    def cold():
+        menu_cache.clear()
+        resolver.clear()
+
+    yield 'menu_by_qr_cold', menu, cold, _expect(200)
+    yield 'menu_by_qr_warm', menu, None, _expect(200)
+
+    # Payload variants of the warm menu: sparse first screen, binary, compressed.
+    def menu_variant(params=None, **headers):
+        def request():
+            table = rng.choice(tables)
+            return client.get(reverse('menu-by-qr', args=[table.qr_code]), params, **headers)
+        return request
+
+    yield 'menu_by_qr_sparse', menu_variant({'fields': FIRST_SCREEN_FIELDS}), None, _expect(200)
+    for coding in encodings():
+        yield f'menu_by_qr_{coding}', menu_variant(HTTP_ACCEPT_ENCODING=coding), None, _expect(200)
+    if compact_renderers():
+        yield 'menu_by_qr_msgpack', menu_variant(HTTP_ACCEPT='application/msgpack'), None, _expect(200)
+
+    # Encoding cost alone, on one full menu (no cache, no HTTP).
+    snapshot = menu_cache.build_menu_snapshot(restaurant)
+    renderers = [('json', JSONRenderer())] + [(renderer.format, renderer()) for renderer in compact_renderers()]
+    for name, renderer in renderers:
+        yield f'encode_menu_{name}', lambda renderer=renderer: renderer.render(snapshot), None, None
+    json_body = JSONRenderer().render(snapshot)
+    for coding in encodings():
+        yield f'encode_menu_json_{coding}', lambda coding=coding: compress(json_body, coding), None, None
+
+    # Menu search: a prefix, two words, a typo and a facet-only query.
+    def search(params):
+        def request():
+            restaurant_id = rng.choice(dataset['restaurants']).id
+            return client.get(reverse('menu-search', args=[restaurant_id]), params)
+        return request
+
+    for name, params in (
+        ('prefix', {'q': 'sal'}), ('words', {'q': 'chicken curry'}), ('typo', {'q': 'margarita'}),
+        ('facets', {'vegetarian': 'true', 'max_price': '20'}),
+    ):
+        yield f'menu_search_{name}', search(params), None, _expect(200)
+
+    for lines in (1, 10, 50):
+        def create_order(lines=lines):
+            table = rng.choice(tables)
+            menu_items = items_by_restaurant[table.restaurant_id]
+            return client.post(
+                reverse('create-order', args=[table.qr_code]),
+                {
+                    'customer_name': 'Bench',
+                    'items': [
+                        {'menu_item_id': str(item.id), 'quantity': 1}
+                        for item in rng.choices(menu_items, k=lines)
+                    ],
+                },
+                format='json'
+            )
+        yield f'create_order_{lines}_lines', create_order, None, _expect(201)
+
+    orders_url = reverse('restaurant-orders', args=[restaurant.id])
+    history = Order.objects.filter(restaurant=restaurant)
+    total = history.count()
+    middle = history.order_by('-created_at', '-id').values_list('created_at', 'id')[total // 2]
+
+    yield 'restaurant_orders_first_page', lambda: owner_client.get(orders_url), None, _expect(200)
+    yield 'restaurant_orders_pending', lambda: owner_client.get(orders_url, {'status': 'pending'}), None, _expect(200)
+    yield (
+        'restaurant_orders_deep_page',
+        lambda: owner_client.get(orders_url, {'page': max(1, total // 2 // 20)}),
+        None,
+        _expect(200),
+    )
+    yield (
+        'restaurant_orders_deep_cursor',
+        lambda: owner_client.get(orders_url, {'cursor': encode_position(*middle)}),
+        None,
+        _expect(200),
+    )
+
+    # Rendering one 20-order page: OrderSerializer against the lean renderer (no HTTP).
+    page = history.order_by('-created_at', '-id')
+    yield (
+        'render_orders_serializer_20',
+        lambda: OrderSerializer(
+            page.select_related('table').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+            )[:20],
+            many=True,
+        ).data,
+        None,
+        None,
+    )
+    yield 'render_orders_lean_20', lambda: render_orders(page.values(*ORDER_VALUES)[:20]), None, None
+
+    # Every location of the owner; the cache is dropped so each call runs the query.
+    overview_url = reverse('restaurant-overview')
+    yield 'owner_overview_cold', lambda: owner_client.get(overview_url), overview.clear, _expect(200)
+
+    order_ids = list(history.values_list('id', flat=True)[:1000])
+    picked = []
+
+    def reopen(count):
+        # Untimed: put a few orders back where the measured transition starts.
+        def setup():
+            picked[:] = rng.sample(order_ids, count)
+            Order.objects.filter(id__in=picked).update(status='ready')
+        return setup
+
+    def update_status():
+        return owner_client.patch(
+            reverse('update-order-status', args=[picked[0]]),
+            {'status': 'served', 'expected_status': 'ready'},
+            format='json'
+        )
+
+    def bulk_update_status():
+        return owner_client.post(
+            reverse('restaurant-order-status', args=[restaurant.id]),
+            {'status': 'served', 'order_ids': [str(pk) for pk in picked]},
+            format='json'
+        )
+
+    yield 'update_order_status', update_status, reopen(1), _expect(200)
+    yield 'bulk_update_order_status_30', bulk_update_status, reopen(min(30, len(order_ids))), _expect(200)
+
+
+def run_suite(dataset, iterations=50, only=None, seed=1234, log=None):
+    results = {}
+    for name, request, setup, check in scenarios(dataset, seed=seed):
+        if only and name not in only:
+            continue
+        # One untimed call warms up imports, URL resolution and caches.
+        if setup is not None:
+            setup()
+        response = request()
+        if check is not None:
+            check(response)
+        results[name] = measure(request, iterations, setup=setup, check=check)
+        if log is not None:
+            log(name, results[name])
+    return results
+
+
+def compare(current, baseline):
+    """Yield ``(name, metric, before, after, change)`` for scenarios present in both runs."""
+    for name, after in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'queries', 'bytes'):
+            if metric not in before or metric not in after:
+                continue
+            old, new = before[metric], after[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            yield name, metric, old, new, change
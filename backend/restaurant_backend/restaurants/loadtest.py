@@ -0,0 +1,204 @@
+"""
+In-process load test of the public endpoints under WSGI and ASGI.
+
+``run_wsgi`` drives Django's ``WSGIHandler`` from a fixed pool of worker
+threads, as a threaded WSGI server would; ``run_asgi`` drives ``ASGIHandler``
+from a single event loop. Both simulate slow clients: every request takes
+``latency`` seconds to arrive and again to be sent back. A WSGI worker is
+blocked for all of that, an ASGI server only while the view runs, so with
+slow clients WSGI throughput is capped at about ``threads / (2 * latency)``.
+
+No sockets or web server are involved: the numbers compare the handler modes
+(and sync vs async views, see ``ASYNC_PUBLIC_VIEWS``), not servers. The
+``load_test`` command seeds a throwaway database and prints both.
+"""
+import asyncio
+import io
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import reverse
+
+from .benchmarks import percentile
+
+SCENARIOS = ('table', 'menu', 'order')
+
+
+def request_factory(dataset, scenario, seed=1234):
+    """Return a callable producing ``(method, path, body)`` for ``scenario``."""
+    rng = random.Random(seed)
+    tables = dataset['tables']
+    items_by_restaurant = {}
+    for item in dataset['menu_items']:
+        items_by_restaurant.setdefault(item.restaurant_id, []).append(item)
+
+    def make():
+        table = rng.choice(tables)
+        if scenario == 'table':
+            return 'GET', reverse('table-by-qr', args=[table.qr_code]), b''
+        if scenario == 'menu':
+            return 'GET', reverse('menu-by-qr', args=[table.qr_code]), b''
+        body = {
+            'customer_name': 'Load',
+            'items': [
+                {'menu_item_id': str(item.id), 'quantity': 1}
+                for item in rng.sample(items_by_restaurant[table.restaurant_id], k=2)
+            ],
+        }
+        return 'POST', reverse('create-order', args=[table.qr_code]), json.dumps(body).encode()
+
+    return make
+
+
+def summarize(latencies, errors, elapsed):
+    timings = [seconds * 1000 for seconds in latencies]
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'max_ms': round(max(timings), 2),
+    }
+
+
+def _environ(method, path, body):
+    return {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def run_wsgi(make_request, total, concurrency, threads, latency):
+    """``total`` requests from ``concurrency`` clients served by ``threads`` workers."""
+    handler = WSGIHandler()
+    pool = ThreadPoolExecutor(max_workers=threads)
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+    lock = threading.Lock()
+
+    def serve(method, path, body):
+        # The worker reads the request off the slow client...
+        time.sleep(latency)
+        statuses = []
+        response = handler(_environ(method, path, body), lambda status, headers: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        # ...and is blocked again while the client takes the response.
+        time.sleep(latency)
+        return int(statuses[0].split()[0])
+
+    def client():
+        nonlocal errors
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+                request = make_request()
+            started = time.perf_counter()
+            status = pool.submit(serve, *request).result()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                errors += status >= 400
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return summarize(latencies, errors, elapsed)
+
+
+def _scope(method, path, body):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+
+
+async def _run_asgi(make_request, total, concurrency, latency):
+    application = ASGIHandler()
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def serve(method, path, body):
+        received = False
+        statuses = []
+
+        async def receive():
+            nonlocal received
+            if received:
+                # Nothing else is coming; Django listens for a disconnect.
+                await asyncio.Event().wait()
+            received = True
+            await asyncio.sleep(latency)
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif not message.get('more_body'):
+                await asyncio.sleep(latency)
+
+        await application(_scope(method, path, body), receive, send)
+        return statuses[0]
+
+    async def client():
+        nonlocal errors
+        while next(remaining, None) is not None:
+            started = time.perf_counter()
+            status = await serve(*make_request())
+            latencies.append(time.perf_counter() - started)
+            errors += status >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def run_asgi(make_request, total, concurrency, latency):
+    """``total`` requests from ``concurrency`` clients served by one event loop."""
+    return asyncio.run(_run_asgi(make_request, total, concurrency, latency))
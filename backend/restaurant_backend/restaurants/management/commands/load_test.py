@@ -0,0 +1,79 @@
+# restaurants/management/commands/load_test.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from restaurant_backend.db import pool_stats
+from restaurants import loadtest
+from restaurants.seeding import build_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and load-test a public endpoint through "
+        "Django's WSGI and ASGI handlers with simulated slow clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', choices=loadtest.SCENARIOS, default='menu',
+            help='Endpoint to load (order needs PostgreSQL; SQLite serializes writers)'
+        )
+        parser.add_argument('--modes', nargs='+', choices=('wsgi', 'asgi'), default=['wsgi', 'asgi'])
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=100, help='Simultaneous clients')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds a slow client takes each way')
+        parser.add_argument('--restaurants', type=int, default=5, help='Restaurants to generate')
+        parser.add_argument('--tables', type=int, default=20, help='Tables per restaurant')
+        parser.add_argument('--items', type=int, default=60, help='Menu items per restaurant')
+        parser.add_argument('--seed', type=int, default=1234, help='Random seed for data and requests')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            dataset = build_dataset(
+                restaurants=options['restaurants'],
+                tables=options['tables'],
+                categories=5,
+                items=options['items'],
+                orders=0,
+                seed=options['seed'],
+            )
+            views = 'async' if getattr(settings, 'ASYNC_PUBLIC_VIEWS', True) else 'sync'
+            self.stdout.write(self.style.NOTICE(
+                f"{options['scenario']}: {options['requests']} requests, {options['concurrency']} clients, "
+                f"{options['latency'] * 1000:.0f} ms client latency, {views} views on {connection.vendor}"
+            ))
+            for mode in options['modes']:
+                make_request = loadtest.request_factory(dataset, options['scenario'], options['seed'])
+                if mode == 'wsgi':
+                    label = f"wsgi ({options['threads']} threads)"
+                    result = loadtest.run_wsgi(
+                        make_request, options['requests'], options['concurrency'],
+                        options['threads'], options['latency'],
+                    )
+                else:
+                    label = 'asgi'
+                    result = loadtest.run_asgi(
+                        make_request, options['requests'], options['concurrency'], options['latency'],
+                    )
+                self.log_result(label, result)
+                pool = pool_stats()['default']
+                if pool['pooled']:
+                    self.stdout.write(
+                        f"{'':20} pool {pool['pool_size']}/{pool['pool_max']} connections, "
+                        f"{pool.get('requests_queued', 0)} requests queued, "
+                        f"{pool.get('connections_errors', 0)} connection errors"
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def log_result(self, label, result):
+        self.stdout.write(
+            f"{label:20} {result['rps']:8.1f} req/s  p50 {result['p50_ms']:8.2f} ms  "
+            f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}"
+        )
@@ -0,0 +1,109 @@
+# restaurants/management/commands/run_benchmarks.py
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from restaurants.benchmarks import compare, run_suite
+from restaurants.seeding import build_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and benchmark the hot endpoints "
+        "(latency percentiles and query counts). Optionally write JSON results "
+        "and compare them with an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=20, help='Restaurants to generate')
+        parser.add_argument('--tables', type=int, default=25, help='Tables per restaurant')
+        parser.add_argument('--categories', type=int, default=10, help='Categories per restaurant')
+        parser.add_argument('--items', type=int, default=200, help='Menu items per restaurant')
+        parser.add_argument('--orders', type=int, default=100000, help='Historical orders across all restaurants')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed calls per scenario')
+        parser.add_argument('--seed', type=int, default=1234, help='Random seed for data and requests')
+        parser.add_argument('--only', nargs='*', default=None, help='Run only these scenarios')
+        parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this path')
+        parser.add_argument('--compare', type=str, default=None, help='Baseline JSON file to diff against')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            path = Path(options['compare'])
+            if not path.exists():
+                raise CommandError(f"Baseline file not found: {path}")
+            baseline = json.loads(path.read_text(encoding='utf-8'))
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self.stdout.write(self.style.NOTICE(
+                f"Seeding {options['restaurants']} restaurants, {options['items']} items each, "
+                f"{options['orders']} orders on {connection.vendor}..."
+            ))
+            dataset = build_dataset(
+                restaurants=options['restaurants'],
+                tables=options['tables'],
+                categories=options['categories'],
+                items=options['items'],
+                orders=options['orders'],
+                seed=options['seed'],
+            )
+            results = run_suite(
+                dataset,
+                iterations=options['iterations'],
+                only=options['only'],
+                seed=options['seed'],
+                log=self.log_result,
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': self.metadata(options),
+            'results': results,
+        }
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if baseline is not None:
+            self.stdout.write(self.style.NOTICE(f"Compared with {options['compare']}:"))
+            for name, metric, before, after, change in compare(results, baseline['results']):
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+                self.stdout.write(style(f"  {name:32} {metric:8} {before:>10} -> {after:<10} ({change:+.1f}%)"))
+
+    def log_result(self, name, result):
+        size = f"  {result['bytes']:>9} B" if 'bytes' in result else ''
+        self.stdout.write(
+            f"{name:32} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+            f"p99 {result['p99_ms']:8.2f} ms  queries {result['queries']}{size}"
+        )
+
+    def metadata(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'dataset': {
+                key: options[key] for key in ('restaurants', 'tables', 'categories', 'items', 'orders', 'seed')
+            },
+            'iterations': options['iterations'],
+        }
@@ -3,8 +3,12 @@ from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
 from restaurants.models import Restaurant, Table
 from menu.models import Category, MenuItem
+from django.db import IntegrityError
+from restaurants.seeding import build_dataset
+from orders import rollups
 from decimal import Decimal
 import json
+import time
 from pathlib import Path
 
 # Default items (based on your static front-end)
@@ -18,13 +22,25 @@ DEFAULT_ITEMS = [
 ]
 
 class Command(BaseCommand):
-    help = "Seed a restaurant, tables, categories and menu items. Optionally read items JSON."
+    help = (
+        "Seed a restaurant, tables, categories and menu items. Optionally read items JSON. "
+        "With --bulk, generate N restaurants x M tables x K categories/items plus an order history."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('--restaurant', type=str, default='Demo Restaurant', help='Restaurant name')
         parser.add_argument('--owner', type=str, default=None, help='Owner username (must exist)')
         parser.add_argument('--tables', type=int, default=10, help='Number of tables to create')
         parser.add_argument('--items-file', type=str, default=None, help='Optional path to JSON file with items')
+        # bulk / synthetic mode
+        parser.add_argument('--bulk', action='store_true', help='Generate a synthetic load-test dataset')
+        parser.add_argument('--restaurants', type=int, default=100, help='[bulk] Number of restaurants')
+        parser.add_argument('--categories', type=int, default=8, help='[bulk] Categories per restaurant')
+        parser.add_argument('--items', type=int, default=60, help='[bulk] Menu items per restaurant')
+        parser.add_argument('--orders', type=int, default=0, help='[bulk] Historical orders across all restaurants')
+        parser.add_argument('--days', type=int, default=30, help='[bulk] Days of order history')
+        parser.add_argument('--seed', type=int, default=1234, help='[bulk] Random seed; same seed, same rows')
+        parser.add_argument('--batch-size', type=int, default=2000, help='[bulk] Rows per INSERT')
 
     def handle(self, *args, **options):
         User = get_user_model()
@@ -48,6 +64,9 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.NOTICE(f"Using owner: {owner.username}"))
 
+        if options.get('bulk'):
+            return self.handle_bulk(owner, options)
+
         # create restaurant (or get existing)
         restaurant, created = Restaurant.objects.get_or_create(name=restaurant_name, defaults={"owner": owner, "address": "Unknown", "phone": "000", "email": "demo@example.com"})
         if created:
@@ -110,3 +129,51 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.WARNING(f"  MenuItem already exists: {menu_item.name}"))
 
         self.stdout.write(self.style.SUCCESS("Seeding complete."))
+
+    def handle_bulk(self, owner, options):
+        for name in ('restaurants', 'tables', 'categories', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f"Invalid --{name.replace('_', '-')}: {options[name]} (must be at least 1)")
+        for name in ('items', 'orders', 'days'):
+            if options[name] < 0:
+                raise CommandError(f"Invalid --{name}: {options[name]}")
+        if options['orders'] and not options['items']:
+            raise CommandError("--orders needs menu items to order; pass --items.")
+
+        started = time.monotonic()
+
+        def progress(stage, done, total):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {stage}: {done}/{total} ({elapsed:.1f}s)")
+
+        self.stdout.write(self.style.NOTICE(
+            f"Generating {options['restaurants']} restaurants x {options['tables']} tables, "
+            f"{options['categories']} categories / {options['items']} items each, "
+            f"{options['orders']} orders over {options['days']} days (seed={options['seed']})"
+        ))
+        try:
+            dataset = build_dataset(
+                restaurants=options['restaurants'],
+                tables=options['tables'],
+                categories=options['categories'],
+                items=options['items'],
+                orders=options['orders'],
+                days=options['days'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                owner=owner,
+                progress=progress,
+            )
+        except IntegrityError as exc:
+            raise CommandError(f"Bulk seeding failed ({exc}). This seed was probably loaded already; pass another --seed.")
+
+        if options['orders']:
+            # bulk_create skips the signals that maintain the sales rollups.
+            hours, items = rollups.rebuild(restaurant_ids=[restaurant.id for restaurant in dataset['restaurants']])
+            progress('rollups', hours + items, hours + items)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeding complete: {len(dataset['restaurants'])} restaurants, {len(dataset['tables'])} tables, "
+            f"{len(dataset['menu_items'])} menu items, {options['orders']} orders "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
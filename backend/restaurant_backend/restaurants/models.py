@@ -11,6 +11,8 @@ class Restaurant(models.Model):
     phone = models.CharField(max_length=20)
     email = models.EmailField()
     logo = models.ImageField(upload_to='restaurant_logos/', blank=True, null=True)
+    # Resized copies of ``logo`` (restaurant_backend.images), filled in after upload.
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,116 @@
+"""
+Per-location counters for owners of several restaurants.
+
+``owner_overview`` answers with one query: every restaurant row of the owner
+is annotated with correlated subqueries for its open orders per status, its
+active tables and today's orders and revenue. The order counts seek on
+``order_rest_status_recent_idx`` and only ever touch open orders; today's
+figures come from the ``HourlySales`` rollup (at most 24 rows per location),
+so neither grows with order history.
+
+Results are cached per owner and local day for
+``OWNER_OVERVIEW['CACHE_SECONDS']`` (0 turns caching off); the overview is a
+dashboard, a few seconds behind is fine, and it is not invalidated on writes.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import serializers
+
+from orders.models import HourlySales, Order
+from orders.rollups import day_range
+from restaurant_backend.caching import LRUCache
+from .models import Restaurant, Table
+
+OPEN_STATUSES = ('pending', 'confirmed', 'preparing', 'ready')
+
+_money = serializers.DecimalField(max_digits=12, decimal_places=2)
+_cache = None
+
+
+def _settings():
+    return getattr(settings, 'OWNER_OVERVIEW', {})
+
+
+def _overview_cache():
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(max_entries=_settings().get('MAX_ENTRIES', 1000), ttl=_settings().get('CACHE_SECONDS', 10))
+    return _cache
+
+
+def _per_restaurant(queryset, aggregate, default=0, output_field=None):
+    """``aggregate`` over the rows of ``queryset`` belonging to the outer restaurant."""
+    output_field = output_field or IntegerField()
+    values = (
+        queryset.filter(restaurant=OuterRef('pk'))
+        .order_by()
+        .values('restaurant')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(values, output_field=output_field), Value(default, output_field=output_field))
+
+
+def annotated_restaurants(owner, today):
+    start, end = day_range(today, today)
+    money = DecimalField(max_digits=12, decimal_places=2)
+    today_sales = HourlySales.objects.filter(hour__gte=start, hour__lt=end)
+    return Restaurant.objects.filter(owner=owner).only('id', 'name', 'is_active').annotate(
+        **{
+            f'{status}_orders': _per_restaurant(Order.objects.filter(status=status), Count('pk'))
+            for status in OPEN_STATUSES
+        },
+        active_tables=_per_restaurant(Table.objects.filter(is_active=True), Count('pk')),
+        today_orders=_per_restaurant(today_sales, Sum('orders')),
+        today_revenue=_per_restaurant(today_sales, Sum('revenue'), Decimal('0'), money),
+    ).order_by('name', 'id')
+
+
+def build_overview(owner, today):
+    restaurants = []
+    for restaurant in annotated_restaurants(owner, today):
+        open_orders = {status: getattr(restaurant, f'{status}_orders') for status in OPEN_STATUSES}
+        restaurants.append({
+            'id': str(restaurant.id),
+            'name': restaurant.name,
+            'is_active': restaurant.is_active,
+            'open_orders': open_orders,
+            'open_orders_total': sum(open_orders.values()),
+            'active_tables': restaurant.active_tables,
+            'today_orders': restaurant.today_orders,
+            'today_revenue': restaurant.today_revenue,
+        })
+    return {
+        'date': today,
+        'restaurants': [
+            dict(entry, today_revenue=_money.to_representation(entry['today_revenue'])) for entry in restaurants
+        ],
+        'totals': {
+            'open_orders_total': sum(entry['open_orders_total'] for entry in restaurants),
+            'active_tables': sum(entry['active_tables'] for entry in restaurants),
+            'today_orders': sum(entry['today_orders'] for entry in restaurants),
+            'today_revenue': _money.to_representation(sum(entry['today_revenue'] for entry in restaurants)),
+        },
+    }
+
+
+def owner_overview(owner):
+    """Counters for every restaurant of ``owner``, cached briefly."""
+    today = timezone.localdate()
+    if not _settings().get('CACHE_SECONDS', 10):
+        return build_overview(owner, today)
+    key = (owner.pk, today)
+    cache = _overview_cache()
+    overview = cache.get(key)
+    if overview is None:
+        overview = build_overview(owner, today)
+        cache.set(key, overview)
+    return overview
+
+
+def clear():
+    _overview_cache().clear()
@@ -0,0 +1,193 @@
+"""
+QR code -> (table, restaurant) resolution shared by the public endpoints.
+
+Every customer request starts with the same ``Table``/``Restaurant`` join, so
+the result is kept in a bounded in-process LRU. Unknown or inactive codes are
+cached too (for ``NEGATIVE_TTL``) so scanners hammering a bad code do not
+reach the database. Saves and deletes of tables and restaurants evict the
+affected entries (see ``restaurants.signals``).
+
+With ``QR_RESOLVER['SHARED_CACHE_ALIAS']`` naming a Django cache, those saves
+also replace a generation token in it, and entries cached under an older
+generation are read again: every worker drops a deactivated table on its next
+request, and entries can live for ``TTL``. Without it, evictions only reach
+the worker that handled the save, so entries live for ``LOCAL_TTL``, which
+bounds how long other workers keep serving a table that was just deactivated.
+
+Cached ``Table`` instances are shared between requests and must be treated as
+read-only. Misses are read from the primary database, never a replica.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from restaurant_backend.caching import LRUCache
+from restaurant_backend.routing import use_primary
+from .models import Table
+
+_NOT_FOUND = object()
+_MISSING = object()
+_GENERATION_KEY = 'qr_resolver:generation'
+_cache = None
+
+
+def _settings():
+    return getattr(settings, 'QR_RESOLVER', {})
+
+
+def _table_cache():
+    global _cache
+    if _cache is None:
+        _cache = LRUCache(max_entries=_settings().get('MAX_ENTRIES', 10000))
+    return _cache
+
+
+def _shared_cache():
+    alias = _settings().get('SHARED_CACHE_ALIAS')
+    return caches[alias] if alias else None
+
+
+def _ttl():
+    """Lifetime of found tables: ``TTL`` when evictions are shared, else ``LOCAL_TTL``."""
+    if _shared_cache() is None:
+        return _settings().get('LOCAL_TTL', 30)
+    return _settings().get('TTL', 300)
+
+
+def _generation():
+    shared = _shared_cache()
+    if shared is None:
+        return None
+    generation = shared.get(_GENERATION_KEY)
+    if generation is None:
+        shared.add(_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = shared.get(_GENERATION_KEY)
+    return generation
+
+
+async def _ageneration():
+    shared = _shared_cache()
+    if shared is None:
+        return None
+    generation = await shared.aget(_GENERATION_KEY)
+    if generation is None:
+        await shared.aadd(_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = await shared.aget(_GENERATION_KEY)
+    return generation
+
+
+def _bump_generation():
+    shared = _shared_cache()
+    if shared is not None:
+        shared.set(_GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def _normalize(qr_code):
+    return qr_code if isinstance(qr_code, uuid.UUID) else uuid.UUID(str(qr_code))
+
+
+def _key(qr_code):
+    try:
+        return _normalize(qr_code)
+    except ValueError:
+        raise Table.DoesNotExist(f'Invalid QR code: {qr_code}')
+
+
+def _cached(key, generation):
+    """The table cached for ``key`` under ``generation``, or ``_MISSING``."""
+    entry = _table_cache().get(key)
+    if entry is None or entry[1] != generation:
+        return _MISSING
+    if entry[0] is _NOT_FOUND:
+        raise Table.DoesNotExist(f'Invalid QR code: {key}')
+    return entry[0]
+
+
+def _active_tables(key):
+    return Table.objects.select_related('restaurant').filter(
+        qr_code=key,
+        is_active=True,
+        restaurant__is_active=True
+    )
+
+
+def _found(key, table, generation):
+    _table_cache().set(key, (table, generation), ttl=_ttl())
+
+
+def _not_found(key, generation):
+    _table_cache().set(key, (_NOT_FOUND, generation), ttl=_settings().get('NEGATIVE_TTL', 30))
+
+
+def resolve_table(qr_code):
+    """Return the active table for ``qr_code`` or raise ``Table.DoesNotExist``.
+
+    The table's restaurant is loaded alongside it and is guaranteed active.
+    """
+    key = _key(qr_code)
+    # Read before the database, so a save committed meanwhile leaves this entry behind.
+    generation = _generation()
+    table = _cached(key, generation)
+    if table is not _MISSING:
+        return table
+
+    try:
+        with use_primary():
+            table = _active_tables(key).get()
+    except Table.DoesNotExist:
+        _not_found(key, generation)
+        raise
+
+    _found(key, table, generation)
+    return table
+
+
+async def aresolve_table(qr_code):
+    """``resolve_table`` for async views; local cache hits never leave the event loop."""
+    key = _key(qr_code)
+    generation = await _ageneration()
+    table = _cached(key, generation)
+    if table is not _MISSING:
+        return table
+
+    try:
+        with use_primary():
+            table = await _active_tables(key).aget()
+    except Table.DoesNotExist:
+        _not_found(key, generation)
+        raise
+
+    _found(key, table, generation)
+    return table
+
+
+def _evict_table(table_id, qr_code):
+    _table_cache().delete_many(
+        lambda key, entry: key == qr_code or (entry[0] is not _NOT_FOUND and entry[0].pk == table_id)
+    )
+    _bump_generation()
+
+
+def _evict_restaurant(restaurant_id):
+    # A reactivated restaurant may own codes we cached as unknown, so the
+    # negative entries go as well.
+    _table_cache().delete_many(
+        lambda key, entry: entry[0] is _NOT_FOUND or entry[0].restaurant_id == restaurant_id
+    )
+    _bump_generation()
+
+
+def invalidate_table(table):
+    _evict_table(table.pk, table.qr_code)
+    transaction.on_commit(lambda: _evict_table(table.pk, table.qr_code))
+
+
+def invalidate_restaurant(restaurant_id):
+    _evict_restaurant(restaurant_id)
+    transaction.on_commit(lambda: _evict_restaurant(restaurant_id))
+
+
+def clear():
+    _table_cache().clear()
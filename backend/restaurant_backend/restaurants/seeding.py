@@ -0,0 +1,232 @@
+"""
+Synthetic datasets for load tests and benchmarks.
+
+Everything is generated from one ``random.Random(seed)`` (ids included), so
+the same arguments always produce the same rows, and written with batched
+``bulk_create`` calls inside a transaction. Order history is spread over the
+last ``days`` days with lunch and dinner peaks; old orders are served or
+cancelled, only the last couple of hours still have open tickets.
+"""
+import random
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from menu.allergens import parse as parse_allergens
+from menu.models import Category, MenuItem
+from orders.models import Order, OrderItem
+from .models import Restaurant, Table
+
+DISHES = [
+    'Margherita Pizza', 'Sushi Bowl', 'Gourmet Burger', 'Pasta Alfredo', 'Mediterranean Salad',
+    'Berry Pancakes', 'Chicken Curry', 'Falafel Wrap', 'Ramen', 'Fish Tacos', 'Caesar Salad',
+    'Lasagna', 'Pad Thai', 'Tiramisu', 'Club Sandwich', 'Mushroom Risotto',
+]
+
+ALLERGEN_TEXTS = ['', 'Milk, gluten', 'Tree nuts', 'Eggs, milk', 'Fish, soy', 'Sesame']
+
+CATEGORIES = [
+    'Starters', 'Soups', 'Salads', 'Pizza', 'Pasta', 'Burgers', 'Bowls', 'Grill',
+    'Seafood', 'Vegan', 'Sides', 'Desserts', 'Drinks', 'Kids', 'Specials', 'Breakfast',
+]
+
+# Relative order volume per hour of the day.
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 1, 3, 5, 4, 3, 6, 14, 16, 9, 4, 3, 5, 10, 15, 14, 8, 3, 1]
+
+OPEN_WINDOW = timedelta(hours=2)
+RECENT_STATUSES = ['pending', 'confirmed', 'preparing', 'ready', 'served', 'cancelled']
+RECENT_WEIGHTS = [25, 15, 20, 10, 25, 5]
+HISTORY_STATUSES = ['served', 'cancelled']
+HISTORY_WEIGHTS = [93, 7]
+
+
+_timestamps_lock = threading.RLock()
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk inserts keep the created_at/updated_at values we generate.
+
+    This switches ``auto_now``/``auto_now_add`` off on the model fields
+    themselves, which are shared by the whole process. Only use it from
+    commands and tests, never in a process that is also serving requests:
+    their saves would keep whatever timestamps they carry meanwhile.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    # Held throughout, so overlapping seeders cannot restore each other's switched-off flags.
+    with _timestamps_lock:
+        saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        try:
+            yield
+        finally:
+            for field, auto_now, auto_now_add in saved:
+                field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DatasetBuilder:
+    def __init__(self, seed=1234, batch_size=2000, progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress
+        self.now = timezone.now()
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def owner(self, username='bench-owner'):
+        User = get_user_model()
+        owner, _ = User.objects.get_or_create(username=username)
+        return owner
+
+    def menu(self, restaurants, categories, items):
+        """Create ``categories`` categories per restaurant with ``items`` items spread across them."""
+        if items and categories < 1:
+            raise ValueError('Menu items need at least one category.')
+        category_rows, item_rows = [], []
+        for restaurant in restaurants:
+            restaurant_categories = [
+                Category(
+                    id=self.uuid(),
+                    restaurant=restaurant,
+                    name=CATEGORIES[index % len(CATEGORIES)] + ('' if index < len(CATEGORIES) else f' {index}'),
+                    order_index=index,
+                )
+                for index in range(categories)
+            ]
+            category_rows += restaurant_categories
+            for index in range(items):
+                allergens = ALLERGEN_TEXTS[index % len(ALLERGEN_TEXTS)]
+                item_rows.append(MenuItem(
+                    id=self.uuid(),
+                    restaurant=restaurant,
+                    category=restaurant_categories[index % categories],
+                    name=f'{self.rng.choice(DISHES)} #{index + 1}',
+                    description='Chef special with seasonal ingredients.',
+                    price=Decimal(self.rng.randrange(450, 3000)) / 100,
+                    ingredients='tomato, basil, olive oil',
+                    # bulk_create skips MenuItem.save(), which derives the mask.
+                    allergens=allergens,
+                    allergen_mask=parse_allergens(allergens),
+                    is_vegetarian=self.rng.random() < 0.3,
+                    is_vegan=self.rng.random() < 0.1,
+                    preparation_time=self.rng.randrange(3, 30),
+                    order_index=index,
+                ))
+        Category.objects.bulk_create(category_rows, batch_size=self.batch_size)
+        MenuItem.objects.bulk_create(item_rows, batch_size=self.batch_size)
+        return item_rows
+
+    def restaurants(self, owner, count, tables):
+        restaurants = [
+            Restaurant(
+                id=self.uuid(),
+                owner=owner,
+                name=f'Bench Restaurant {index + 1}',
+                address=f'{index + 1} Benchmark Street',
+                phone='000',
+                email=f'bench{index + 1}@example.com',
+            )
+            for index in range(count)
+        ]
+        Restaurant.objects.bulk_create(restaurants, batch_size=self.batch_size)
+        table_rows = [
+            Table(id=self.uuid(), restaurant=restaurant, table_number=str(number), capacity=4, qr_code=self.uuid())
+            for restaurant in restaurants
+            for number in range(1, tables + 1)
+        ]
+        Table.objects.bulk_create(table_rows, batch_size=self.batch_size)
+        return restaurants, table_rows
+
+    def placed_at(self, days):
+        placed_at = (self.now - timedelta(days=self.rng.randrange(max(days, 1)))).replace(
+            hour=self.rng.choices(range(24), weights=HOUR_WEIGHTS)[0],
+            minute=self.rng.randrange(60),
+            second=self.rng.randrange(60),
+            microsecond=self.rng.randrange(1000000),
+        )
+        return placed_at - timedelta(days=1) if placed_at > self.now else placed_at
+
+    def status(self, placed_at):
+        if self.now - placed_at < OPEN_WINDOW:
+            return self.rng.choices(RECENT_STATUSES, weights=RECENT_WEIGHTS)[0]
+        return self.rng.choices(HISTORY_STATUSES, weights=HISTORY_WEIGHTS)[0]
+
+    def orders(self, tables, menu_items, count, max_lines=5, days=30):
+        """Create ``count`` orders spread over ``tables``, using the tables' own menus."""
+        items_by_restaurant = {}
+        for item in menu_items:
+            items_by_restaurant.setdefault(item.restaurant_id, []).append(item)
+
+        created = 0
+        with explicit_timestamps(Order, OrderItem):
+            while created < count:
+                orders, lines = [], []
+                for _ in range(min(self.batch_size, count - created)):
+                    table = self.rng.choice(tables)
+                    placed_at = self.placed_at(days)
+                    status = self.status(placed_at)
+                    order = Order(
+                        id=self.uuid(),
+                        restaurant_id=table.restaurant_id,
+                        table=table,
+                        customer_name=f'Guest {self.rng.randrange(1, 10000)}',
+                        status=status,
+                        created_at=placed_at,
+                        updated_at=min(self.now, placed_at + timedelta(
+                            minutes=self.rng.randrange(1, 10) if status == 'pending' else self.rng.randrange(5, 60)
+                        )),
+                    )
+                    total = Decimal('0')
+                    menu = items_by_restaurant[table.restaurant_id]
+                    for menu_item in self.rng.sample(menu, min(len(menu), self.rng.randint(1, max_lines))):
+                        line = OrderItem(
+                            id=self.uuid(),
+                            order=order,
+                            menu_item=menu_item,
+                            quantity=self.rng.randint(1, 3),
+                            unit_price=menu_item.price,
+                            created_at=placed_at,
+                        )
+                        total += line.subtotal
+                        lines.append(line)
+                    order.total_amount = total
+                    orders.append(order)
+                Order.objects.bulk_create(orders, batch_size=self.batch_size)
+                OrderItem.objects.bulk_create(lines, batch_size=self.batch_size)
+                created += len(orders)
+                if self.progress is not None:
+                    self.progress('orders', created, count)
+        return created
+
+
+def build_dataset(restaurants=20, tables=25, categories=10, items=200, orders=100000, days=30,
+                  seed=1234, batch_size=2000, owner=None, progress=None):
+    """Generate a complete dataset and return the created rows.
+
+    ``progress(stage, done, total)`` is called after every batch of orders.
+    """
+    builder = DatasetBuilder(seed=seed, batch_size=batch_size, progress=progress)
+    with transaction.atomic():
+        owner = owner or builder.owner()
+        restaurant_rows, table_rows = builder.restaurants(owner, restaurants, tables)
+        menu_items = builder.menu(restaurant_rows, categories, items)
+        if progress is not None:
+            progress('menus', len(menu_items), len(menu_items))
+        builder.orders(table_rows, menu_items, orders, days=days)
+    return {
+        'owner': owner,
+        'restaurants': restaurant_rows,
+        'tables': table_rows,
+        'menu_items': menu_items,
+    }
@@ -1,12 +1,18 @@
 from rest_framework import serializers
+from restaurant_backend.images import variant_urls
 from .models import Restaurant, Table
 
 class RestaurantSerializer(serializers.ModelSerializer):
+    logo_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Restaurant
-        fields = ['id', 'name', 'description', 'address', 'phone', 'email', 'logo', 'is_active']
+        fields = ['id', 'name', 'description', 'address', 'phone', 'email', 'logo', 'logo_variants', 'is_active']
         read_only_fields = ['id']
 
+    def get_logo_variants(self, obj):
+        return variant_urls(obj.logo_variants, obj.logo.storage, self.context.get('request'))
+
 class TableSerializer(serializers.ModelSerializer):
     qr_url = serializers.ReadOnlyField()
     
@@ -1,3 +1,362 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import resolve, reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from restaurant_backend import db, routing
+from restaurant_backend.caching import LRUCache
+from restaurant_backend.instrumentation import VIEW_STATS, QueryBudgetTestMixin
+
+from menu.models import Category, MenuItem
+from orders.models import Order
+from . import benchmarks, loadtest, overview, resolver, seeding, views
+from .models import Restaurant, Table
+
+
+class QRResolverTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        resolver.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.restaurant = Restaurant.objects.create(
+            owner=self.owner, name='Demo', address='Main St', phone='000', email='demo@example.com'
+        )
+        self.table = Table.objects.create(restaurant=self.restaurant, table_number='1', capacity=4)
+
+    def test_resolution_is_cached(self):
+        resolver.resolve_table(self.table.qr_code)
+        with self.assertNumQueries(0):
+            table = resolver.resolve_table(str(self.table.qr_code))
+        self.assertEqual(table.restaurant.name, 'Demo')
+
+    def test_unknown_code_is_negatively_cached(self):
+        code = uuid.uuid4()
+        with self.assertRaises(Table.DoesNotExist):
+            resolver.resolve_table(code)
+        with self.assertNumQueries(0), self.assertRaises(Table.DoesNotExist):
+            resolver.resolve_table(code)
+
+    def test_deactivated_table_is_evicted(self):
+        resolver.resolve_table(self.table.qr_code)
+        self.table.is_active = False
+        self.table.save()
+        with self.assertRaises(Table.DoesNotExist):
+            resolver.resolve_table(self.table.qr_code)
+
+    @override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'qr-resolver'},
+        },
+        QR_RESOLVER={'SHARED_CACHE_ALIAS': 'shared'},
+    )
+    def test_shared_tier_evicts_in_every_worker(self):
+        resolver.resolve_table(self.table.qr_code)
+        # The save is handled by another worker: this one's entries stay put.
+        with mock.patch.object(resolver, '_table_cache', return_value=LRUCache()):
+            self.table.is_active = False
+            self.table.save()
+        with self.assertRaises(Table.DoesNotExist):
+            resolver.resolve_table(self.table.qr_code)
+
+    def test_table_by_qr_within_budget_and_recorded(self):
+        VIEW_STATS.reset()
+        response = self.client.get(reverse('table-by-qr', args=[self.table.qr_code]))
+        self.assertWithinQueryBudget(response)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertEqual(VIEW_STATS.snapshot()['table-by-qr']['requests'], 1)
+
+    def test_deactivated_restaurant_is_evicted(self):
+        url = reverse('table-by-qr', args=[self.table.qr_code])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.restaurant.is_active = False
+        self.restaurant.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.restaurant.is_active = True
+        self.restaurant.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class OwnerOverviewTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        resolver.clear()
+        overview.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.downtown, self.harbour = [
+            Restaurant.objects.create(
+                owner=self.owner, name=name, address='Main St', phone='000', email='demo@example.com'
+            )
+            for name in ('Downtown', 'Harbour')
+        ]
+        other = User.objects.create_user('other', password='pw')
+        Restaurant.objects.create(owner=other, name='Elsewhere', address='-', phone='0', email='x@example.com')
+
+        table = Table.objects.create(restaurant=self.downtown, table_number='1', capacity=4)
+        Table.objects.create(restaurant=self.downtown, table_number='2', capacity=4)
+        Table.objects.create(restaurant=self.downtown, table_number='3', capacity=4, is_active=False)
+        category = Category.objects.create(restaurant=self.downtown, name='Pizza')
+        item = MenuItem.objects.create(
+            restaurant=self.downtown, category=category, name='Margherita', description='',
+            price=Decimal('10.00'), preparation_time=10,
+        )
+        url = reverse('create-order', args=[table.qr_code])
+        # The sales rollups behind today's revenue are bumped on commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = [
+                self.client.post(
+                    url, {'customer_name': 'A', 'items': [{'menu_item_id': str(item.id), 'quantity': quantity}]},
+                    format='json'
+                ).json()['id']
+                for quantity in (1, 2, 3)
+            ]
+            self.client.force_authenticate(self.owner)
+            self.client.post(
+                reverse('restaurant-order-status', args=[self.downtown.id]),
+                {'status': 'confirmed', 'order_ids': ids[1:]}, format='json'
+            )
+            self.client.post(
+                reverse('restaurant-order-status', args=[self.downtown.id]),
+                {'status': 'cancelled', 'order_ids': ids[2:]}, format='json'
+            )
+        self.url = reverse('restaurant-overview')
+
+    def test_counters_per_restaurant(self):
+        response = self.client.get(self.url)
+        self.assertWithinQueryBudget(response)
+        data = response.json()
+        self.assertEqual([entry['name'] for entry in data['restaurants']], ['Downtown', 'Harbour'])
+        downtown, harbour = data['restaurants']
+        self.assertEqual(downtown['open_orders'], {'pending': 1, 'confirmed': 1, 'preparing': 0, 'ready': 0})
+        self.assertEqual(downtown['active_tables'], 2)
+        self.assertEqual(downtown['today_orders'], 3)
+        self.assertEqual(downtown['today_revenue'], '30.00')
+        self.assertEqual(harbour['open_orders_total'], 0)
+        self.assertEqual(harbour['today_revenue'], '0.00')
+        self.assertEqual(data['totals']['open_orders_total'], 2)
+
+    def test_budget_excludes_authentication(self):
+        jwt = APIClient()
+        jwt.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.owner)}')
+        session = APIClient()
+        session.force_login(self.owner)
+
+        for client, auth_queries in ((jwt, 1), (session, 2)):
+            overview.clear()
+            response = client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinQueryBudget(response)
+            # Counted and logged, but not against the budget.
+            self.assertEqual(response.query_count, response.budgeted_query_count + auth_queries)
+
+    def test_exceeded_budget_is_logged(self):
+        with mock.patch.object(views.restaurant_overview, 'query_budget', 0):
+            with self.assertLogs('restaurant_backend.queries', 'WARNING') as logs:
+                self.client.get(self.url)
+        self.assertEqual(logs.records[0].getMessage(), 'query_budget.exceeded')
+        self.assertEqual(logs.records[0].fields['view'], 'restaurant-overview')
+
+    def test_cached_briefly(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        with override_settings(OWNER_OVERVIEW={'CACHE_SECONDS': 0}):
+            with self.assertNumQueries(1):
+                overview.owner_overview(self.owner)
+
+class AsyncTableViewTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        resolver.clear()
+        self.owner = User.objects.create_user('owner', password='pw')
+        self.restaurant = Restaurant.objects.create(
+            owner=self.owner, name='Demo', address='Main St', phone='000', email='demo@example.com'
+        )
+        self.table = Table.objects.create(restaurant=self.restaurant, table_number='1', capacity=4)
+
+    def test_matches_sync_view(self):
+        factory = APIRequestFactory()
+        expected = views.get_table_by_qr(factory.get('/'), qr_code=self.table.qr_code).render()
+        response = async_to_sync(views.TableByQRView.as_view())(factory.get('/'), qr_code=self.table.qr_code)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected.content)
+        missing = async_to_sync(views.TableByQRView.as_view())(factory.get('/'), qr_code=uuid.uuid4())
+        self.assertEqual(missing.status_code, 404)
+
+    def test_queries_counted_under_asgi(self):
+        url = reverse('table-by-qr', args=[self.table.qr_code])
+        cold = async_to_sync(AsyncClient().get)(url)
+        self.assertEqual(cold.query_count, 1)
+        self.assertWithinQueryBudget(cold)
+        self.assertEqual(async_to_sync(AsyncClient().get)(url).query_count, 0)
+
+
+class LoadTestTests(TransactionTestCase):
+    def test_both_modes_serve_every_request(self):
+        dataset = seeding.build_dataset(restaurants=1, tables=3, categories=1, items=4, orders=0, seed=5)
+        make_request = loadtest.request_factory(dataset, 'menu')
+
+        for result in (
+            loadtest.run_wsgi(make_request, 12, concurrency=4, threads=2, latency=0),
+            loadtest.run_asgi(make_request, 12, concurrency=4, latency=0),
+        ):
+            self.assertEqual(result['requests'], 12)
+            self.assertEqual(result['errors'], 0)
+
+
+class DatabasePoolTests(TestCase):
+    database = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'restaurant_db'}
+
+    def test_native_pool_when_available(self):
+        pool_class = mock.Mock(check_connection=object())
+        with mock.patch.object(db, 'ConnectionPool', pool_class):
+            database = db.pooled(self.database, max_size=20, max_idle=60)
+            unchecked = db.pooled(self.database, pre_ping=False)
+
+        pool = database['OPTIONS']['pool']
+        self.assertEqual((pool['max_size'], pool['max_idle']), (20, 60))
+        self.assertIs(pool['check'], pool_class.check_connection)
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertNotIn('check', unchecked['OPTIONS']['pool'])
+        self.assertNotIn('OPTIONS', self.database)
+
+    def test_persistent_connections_without_pool(self):
+        with mock.patch.object(db, 'ConnectionPool', None):
+            database = db.pooled(self.database, conn_max_age=30)
+        self.assertNotIn('OPTIONS', database)
+        self.assertEqual((database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS']), (30, True))
+
+    def test_stats_endpoint_is_admin_only(self):
+        client = APIClient()
+        url = reverse('database-pool-stats')
+        client.force_authenticate(User.objects.create_user('owner', password='pw'))
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client.force_authenticate(User.objects.create_user('ops', password='pw', is_staff=True))
+        stats = client.get(url).json()
+        self.assertFalse(stats['default']['pooled'])
+        self.assertIn('conn_max_age', stats['default'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routing.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.restaurant_id = uuid.uuid4()
+
+    def handle(self, method, url, status=200, write=False, **extra):
+        """Run ``url`` through the middleware; return where reads went and the response."""
+        def view(request):
+            if write:
+                self.router.db_for_write(Order)
+            view.read_from = self.router.db_for_read(Order)
+            return HttpResponse(status=status)
+
+        request = getattr(self.factory, method)(url, **extra)
+        request.resolver_match = resolve(url)
+        response = routing.ReplicaRoutingMiddleware(view)(request)
+        return view.read_from, response
+
+    def test_only_opted_in_reads_use_a_replica(self):
+        orders_url = reverse('restaurant-orders', args=[self.restaurant_id])
+        self.assertEqual(self.handle('get', orders_url)[0], 'replica1')
+        self.assertEqual(self.handle('get', reverse('restaurant-sales', args=[self.restaurant_id]))[0], 'replica1')
+        self.assertEqual(self.handle('get', reverse('order-detail', args=[uuid.uuid4()]))[0], 'default')
+        self.assertEqual(self.handle('post', orders_url)[0], 'default')
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+
+    def test_request_stays_on_primary_after_writing(self):
+        url = reverse('table-list', args=[self.restaurant_id])
+        self.assertEqual(self.handle('get', url, write=True)[0], 'default')
+
+    def test_recent_writers_are_pinned_to_primary(self):
+        url = reverse('restaurant-orders', args=[self.restaurant_id])
+        _, response = self.handle('post', url, status=201)
+        cookie = response.cookies[routing.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+
+        self.factory.cookies[routing.PIN_COOKIE] = cookie.value
+        self.assertEqual(self.handle('get', url)[0], 'default')
+        self.factory.cookies[routing.PIN_COOKIE] = '1'
+        self.assertEqual(self.handle('get', url)[0], 'replica1')
+
+        _, failed = self.handle('post', url, status=400)
+        self.assertNotIn(routing.PIN_COOKIE, failed.cookies)
+
+    def test_primary_blocks_and_transactions(self):
+        with routing.use_replica():
+            self.assertEqual(self.router.db_for_read(Order), 'replica1')
+            with routing.use_primary():
+                self.assertEqual(self.router.db_for_read(Order), 'default')
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                self.assertEqual(self.router.db_for_read(Order), 'default')
+            loaded = Order()
+            loaded._state.db = 'default'
+            self.assertEqual(self.router.db_for_read(Order, instance=loaded), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica1', 'orders'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'orders'))
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_suite_runs_on_small_dataset(self):
+        dataset = seeding.build_dataset(restaurants=2, tables=2, categories=2, items=6, orders=40, seed=7)
+        results = benchmarks.run_suite(dataset, iterations=2)
+
+        self.assertIn('create_order_50_lines', results)
+        self.assertEqual(results['render_orders_lean_20']['queries'], 2)
+        self.assertEqual(
+            results['create_order_1_lines']['queries'],
+            results['create_order_50_lines']['queries']
+        )
+        for result in results.values():
+            self.assertEqual(result['iterations'], 2)
+            self.assertLessEqual(result['p50_ms'], result['max_ms'])
+
+    def test_dataset_is_reproducible(self):
+        first = seeding.build_dataset(restaurants=1, tables=1, categories=1, items=3, orders=0, seed=3)
+        qr_codes = [table.qr_code for table in first['tables']]
+        Restaurant.objects.all().delete()
+        second = seeding.build_dataset(restaurants=1, tables=1, categories=1, items=3, orders=0, seed=3)
+        self.assertEqual([table.qr_code for table in second['tables']], qr_codes)
+
+    def test_bulk_seed_command(self):
+        owner = User.objects.create_user(username='bulk-owner', password='x')
+        call_command(
+            'seed_restaurant', '--bulk', '--owner', 'bulk-owner', '--restaurants', '3', '--tables', '2',
+            '--categories', '2', '--items', '5', '--orders', '300', '--days', '7', '--batch-size', '100',
+            stdout=StringIO(),
+        )
+        self.assertEqual(Restaurant.objects.filter(owner=owner).count(), 3)
+        self.assertEqual(Table.objects.filter(restaurant__owner=owner).count(), 6)
+        orders = Order.objects.filter(restaurant__owner=owner)
+        self.assertEqual(orders.count(), 300)
+        cutoff = timezone.now() - seeding.OPEN_WINDOW
+        self.assertGreater(orders.filter(created_at__lt=timezone.now() - timedelta(days=1)).count(), 0)
+        self.assertFalse(
+            orders.filter(created_at__lt=cutoff).exclude(status__in=seeding.HISTORY_STATUSES).exists()
+        )
+
+    def test_bulk_seed_rejects_empty_dimensions(self):
+        User.objects.create_user(username='bulk-owner', password='x')
+        for option in ('--restaurants', '--tables', '--categories'):
+            with self.subTest(option=option), self.assertRaisesMessage(CommandError, f'Invalid {option}: 0'):
+                call_command('seed_restaurant', '--bulk', '--owner', 'bulk-owner', option, '0', stdout=StringIO())
+        self.assertFalse(Restaurant.objects.exists())
+        with self.assertRaises(ValueError):
+            seeding.build_dataset(restaurants=1, tables=1, categories=0, items=3, orders=0)
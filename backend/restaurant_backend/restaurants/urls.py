@@ -1,9 +1,11 @@
 from django.urls import path
+from restaurant_backend.asyncviews import public_view
 from . import views
 
 urlpatterns = [
     path('restaurants/', views.RestaurantListCreateView.as_view(), name='restaurant-list'),
+    path('restaurants/overview/', views.restaurant_overview, name='restaurant-overview'),
     path('restaurants/<uuid:pk>/', views.RestaurantDetailView.as_view(), name='restaurant-detail'),
     path('restaurants/<uuid:restaurant_id>/tables/', views.TableListCreateView.as_view(), name='table-list'),
-    path('qr/<uuid:qr_code>/table/', views.get_table_by_qr, name='table-by-qr'),
+    path('qr/<uuid:qr_code>/table/', public_view(views.get_table_by_qr, views.TableByQRView.as_view()), name='table-by-qr'),
 ]
\ No newline at end of file
@@ -5,11 +5,17 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django.shortcuts import get_object_or_404
 from .models import Restaurant, Table
+from restaurant_backend.asyncviews import AsyncAPIView
+from restaurant_backend.instrumentation import query_budget
+from restaurant_backend.routing import read_replica
+from .overview import owner_overview
+from .resolver import aresolve_table, resolve_table
 from .serializers import RestaurantSerializer, TableSerializer
 
 class RestaurantListCreateView(generics.ListCreateAPIView):
     serializer_class = RestaurantSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
         return Restaurant.objects.filter(owner=self.request.user)
@@ -17,6 +23,14 @@ class RestaurantListCreateView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+@read_replica
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def restaurant_overview(request):
+    """Open orders, active tables and today's sales for each of the owner's restaurants."""
+    return Response(owner_overview(request.user))
+
 class RestaurantDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = RestaurantSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -27,6 +41,7 @@ class RestaurantDetailView(generics.RetrieveUpdateDestroyAPIView):
 class TableListCreateView(generics.ListCreateAPIView):
     serializer_class = TableSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
         restaurant_id = self.kwargs['restaurant_id']
@@ -44,23 +59,37 @@ class TableListCreateView(generics.ListCreateAPIView):
         )
         serializer.save(restaurant=restaurant)
 
+def _table_payload(table):
+    return {
+        'table': TableSerializer(table).data,
+        'restaurant': RestaurantSerializer(table.restaurant).data
+    }
+
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_table_by_qr(request, qr_code):
     """Get table information by QR code for customers"""
     try:
-        table = Table.objects.select_related('restaurant').get(
-            qr_code=qr_code,
-            is_active=True,
-            restaurant__is_active=True
-        )
-        serializer = TableSerializer(table)
-        return Response({
-            'table': serializer.data,
-            'restaurant': RestaurantSerializer(table.restaurant).data
-        })
+        table = resolve_table(qr_code)
+        return Response(_table_payload(table))
     except Table.DoesNotExist:
         return Response(
             {'error': 'Invalid QR code'}, 
             status=status.HTTP_404_NOT_FOUND
-        )
\ No newline at end of file
+        )
+
+class TableByQRView(AsyncAPIView):
+    """Async ``get_table_by_qr``."""
+    permission_classes = [AllowAny]
+    query_budget = 1
+
+    async def get(self, request, qr_code):
+        try:
+            table = await aresolve_table(qr_code)
+        except Table.DoesNotExist:
+            return Response(
+                {'error': 'Invalid QR code'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(_table_payload(table))